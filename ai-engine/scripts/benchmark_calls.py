@@ -0,0 +1,358 @@
+"""End-to-end call benchmark that runs fully offline.
+
+Starts a fake OpenAI server (scripts/fake_openai.py), a Redis (fakeredis,
+unless --redis-url is given), the engine and ai-freeswitch, then plays
+concurrent calls into ai-freeswitch's audio WebSocket the way FreeSWITCH
+does: 20 ms binary L16 frames at 16 kHz, sent in real time. Each call speaks
+--turns utterances and waits for each reply to finish playing before the
+next. For each call count it reports p50/p95/p99 turn latency (end of the
+caller's speech to the reply being announced), time to the first reply audio
+frame, time from call_start to the first greeting frame, turns per second and
+resident memory per call for each service. The services are restarted for
+every call count, and the exit status is 1 if greeting p95 exceeds
+--greeting-budget-ms. Run from the ai-engine directory:
+
+    python scripts/benchmark_calls.py --calls 1,10,50 --turns 3 [--json]
+
+Turn latency starts at the caller's last speech frame, so it includes the
+engine's VAD hangover (VAD_HANGOVER_MS, default 600 ms).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+import websockets.exceptions
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FREESWITCH_DIR = os.path.join(os.path.dirname(ENGINE_DIR), "ai-freeswitch")
+sys.path.insert(0, ENGINE_DIR)
+
+from src.main import encode_audio_frame
+from scripts.fake_openai import add_arguments as add_fake_openai_arguments
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+FAKE_REDIS_SERVER = (
+    "import sys; from fakeredis import TcpFakeServer; "
+    "TcpFakeServer(('127.0.0.1', int(sys.argv[1]))).serve_forever()"
+)
+
+def utterance_frames(seconds: float, seed: int) -> List[bytes]:
+    """Voiced-speech-like audio, loud enough for the engine's VAD, as 20 ms frames"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * (0.5 + seed % 5 * 0.1) * t)
+    voiced = sum(np.sin(2 * np.pi * harmonic * np.cumsum(pitch) / SAMPLE_RATE) / harmonic for harmonic in range(1, 6))
+    pcm = (voiced * 4000).astype("<i2")
+    return [pcm[start:start + FRAME_SAMPLES].tobytes() for start in range(0, len(pcm) - FRAME_SAMPLES + 1, FRAME_SAMPLES)]
+
+# Line noise far below the VAD and barge-in thresholds
+SILENCE_FRAME = np.random.default_rng(0).normal(0, 20, FRAME_SAMPLES).astype("<i2").tobytes()
+
+class SimulatedCall:
+    """One FreeSWITCH call leg on its own WebSocket connection"""
+    
+    def __init__(self, call_id: str, url: str):
+        self.call_id = call_id
+        self.url = url
+        self.sequence = 0
+        self.next_frame_at = 0.0
+        self.reply_at: Optional[float] = None
+        self.first_frame_at: Optional[float] = None
+        self.expected_frames = 0
+        self.received_frames = 0
+        self.reply_done = asyncio.Event()
+        self.lag: List[float] = []
+    
+    async def send_frame(self, websocket, payload: bytes):
+        """Send one frame on the 20 ms schedule; lateness is recorded as client lag"""
+        delay = self.next_frame_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.lag.append(-delay)
+        self.next_frame_at += FRAME_MS / 1000
+        await websocket.send(encode_audio_frame(self.call_id, self.sequence, "l16", SAMPLE_RATE, payload))
+        self.sequence += 1
+    
+    async def receive(self, websocket):
+        async for message in websocket:
+            now = time.perf_counter()
+            if isinstance(message, bytes):
+                self.received_frames += 1
+                if self.first_frame_at is None:
+                    self.first_frame_at = now
+                if self.received_frames >= self.expected_frames:
+                    self.reply_done.set()
+                continue
+            data = json.loads(message)
+            if data.get("type") == "audio_response" and data.get("call_id") == self.call_id:
+                self.reply_at = now
+                self.expected_frames = data["frames"]
+                self.received_frames = 0
+                if not self.expected_frames:
+                    self.reply_done.set()
+    
+    def expect_reply(self):
+        self.reply_at = self.first_frame_at = None
+        self.expected_frames = 1 << 30
+        self.reply_done.clear()
+    
+    async def wait_for_reply(self, websocket, timeout: float) -> bool:
+        """Keep the line open with silence until the reply has played"""
+        deadline = time.perf_counter() + timeout
+        while not self.reply_done.is_set():
+            if time.perf_counter() > deadline:
+                return False
+            await self.send_frame(websocket, SILENCE_FRAME)
+        return True
+    
+    async def run(self, args, results: Dict):
+        async with websockets.connect(self.url, max_size=None) as websocket:
+            receiver = asyncio.create_task(self.receive(websocket))
+            try:
+                await websocket.send(json.dumps({"type": "hello", "audio_transport": ["binary", "json"]}))
+                self.expect_reply()
+                call_start = time.perf_counter()
+                await websocket.send(json.dumps({
+                    "type": "call_start", "call_id": self.call_id, "phone_number": "+15550000000", "codec": "l16"
+                }))
+                self.next_frame_at = time.perf_counter()
+                
+                # The greeting is played before the caller speaks
+                if not await self.wait_for_reply(websocket, args.turn_timeout):
+                    results["errors"] += 1
+                    return
+                results["greeting"].append(self.first_frame_at - call_start)
+                
+                for turn in range(args.turns):
+                    self.expect_reply()
+                    for frame in utterance_frames(args.speech_seconds, turn):
+                        await self.send_frame(websocket, frame)
+                    speech_end = time.perf_counter()
+                    
+                    if not await self.wait_for_reply(websocket, args.turn_timeout):
+                        results["errors"] += 1
+                        continue
+                    results["turn_latency"].append(self.reply_at - speech_end)
+                    if self.first_frame_at is not None:
+                        results["first_audio"].append(self.first_frame_at - speech_end)
+                    results["turns"] += 1
+                
+                await websocket.send(json.dumps({"type": "call_end", "call_id": self.call_id}))
+                results["calls"] += 1
+            finally:
+                receiver.cancel()
+                await asyncio.gather(receiver, return_exceptions=True)
+                results["lag"].extend(self.lag)
+
+def process_tree_rss(pid: int) -> int:
+    """Resident memory in bytes of a process and its descendants (Linux)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+async def sample_memory(processes: Dict[str, subprocess.Popen], peaks: Dict[str, int], interval: float = 0.5):
+    while True:
+        for name, process in processes.items():
+            peaks[name] = max(peaks.get(name, 0), process_tree_rss(process.pid))
+        await asyncio.sleep(interval)
+
+def percentile_ms(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+class Services:
+    """The fake upstreams, Redis, engine and ai-freeswitch as child processes"""
+    
+    def __init__(self, args):
+        self.args = args
+        port = args.base_port
+        self.openai_port, self.redis_port, self.engine_port, self.freeswitch_port = port, port + 1, port + 2, port + 3
+        self.processes: Dict[str, subprocess.Popen] = {}
+    
+    def spawn(self, name: str, command: List[str], cwd: str, env: Optional[Dict] = None):
+        output = None if self.args.verbose else subprocess.DEVNULL
+        self.processes[name] = subprocess.Popen(
+            command, cwd=cwd, env={**os.environ, **(env or {})}, stdout=output, stderr=output
+        )
+    
+    async def start(self):
+        args = self.args
+        fake_openai = [
+            "--stt", args.stt, "--chat", args.chat, "--chat-token-ms", str(args.chat_token_ms),
+            "--tts", args.tts, "--reply-words", str(args.reply_words),
+            "--speech-chars-per-s", str(args.speech_chars_per_s)
+        ]
+        self.spawn("fake_openai", [sys.executable, "scripts/fake_openai.py", "--port", str(self.openai_port), *fake_openai], ENGINE_DIR)
+        redis_url = args.redis_url
+        if not redis_url:
+            self.spawn("redis", [sys.executable, "-c", FAKE_REDIS_SERVER, str(self.redis_port)], ENGINE_DIR)
+            redis_url = f"redis://127.0.0.1:{self.redis_port}"
+        
+        fake_url = f"http://127.0.0.1:{self.openai_port}"
+        self.spawn("ai_engine", [sys.executable, "src/main.py"], ENGINE_DIR, {
+            "HOST": "127.0.0.1",
+            "PORT": str(self.engine_port),
+            "WORKERS": str(args.engine_workers),
+            "REDIS_URL": redis_url,
+            "OPENAI_BASE_URL": f"{fake_url}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "VAD_ENABLED": "true",
+            "TTS_CACHE_PREWARM": "false"
+        })
+        self.spawn("ai_freeswitch", [sys.executable, "src/main.py"], FREESWITCH_DIR, {
+            "SERVER_HOST": "127.0.0.1",
+            "SERVER_PORT": str(self.freeswitch_port),
+            "AI_ENGINE_URL": f"http://127.0.0.1:{self.engine_port}",
+            "BACKEND_API_URL": fake_url,
+            "REDIS_URL": redis_url
+        })
+        await self.wait_until_ready(f"http://127.0.0.1:{self.freeswitch_port}/ready")
+    
+    async def wait_until_ready(self, url: str, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(timeout=5) as client:
+            while time.monotonic() < deadline:
+                for name, process in self.processes.items():
+                    if process.poll() is not None:
+                        raise RuntimeError(f"{name} exited with code {process.returncode}")
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.5)
+        raise RuntimeError("services did not become ready")
+    
+    @property
+    def audio_url(self) -> str:
+        return f"ws://127.0.0.1:{self.freeswitch_port + 1}"
+    
+    def stop(self):
+        """Stop in reverse start order, so nothing loses a dependency while shutting down"""
+        for process in reversed(list(self.processes.values())):
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+async def run_level(calls: int, args) -> dict:
+    services = Services(args)
+    try:
+        await services.start()
+        # Let background startup work settle before taking the idle baseline
+        await asyncio.sleep(2)
+        measured = {name: services.processes[name] for name in ("ai_engine", "ai_freeswitch")}
+        baseline = {name: process_tree_rss(process.pid) for name, process in measured.items()}
+        peaks: Dict[str, int] = {}
+        sampler = asyncio.create_task(sample_memory(measured, peaks))
+        
+        results = {"calls": 0, "turns": 0, "errors": 0, "turn_latency": [], "first_audio": [], "greeting": [], "lag": []}
+        
+        async def start_call(index: int):
+            await asyncio.sleep(args.ramp * index / calls)
+            try:
+                await SimulatedCall(f"bench-{calls}-{index}", services.audio_url).run(args, results)
+            except (OSError, websockets.exceptions.WebSocketException):
+                results["errors"] += 1
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(start_call(index) for index in range(calls)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+    finally:
+        services.stop()
+    
+    return {
+        "calls": calls,
+        "completed_calls": results["calls"],
+        "turns": results["turns"],
+        "errors": results["errors"],
+        "turn_p50_ms": percentile_ms(results["turn_latency"], 50),
+        "turn_p95_ms": percentile_ms(results["turn_latency"], 95),
+        "turn_p99_ms": percentile_ms(results["turn_latency"], 99),
+        "first_audio_p50_ms": percentile_ms(results["first_audio"], 50),
+        "first_audio_p95_ms": percentile_ms(results["first_audio"], 95),
+        "first_audio_p99_ms": percentile_ms(results["first_audio"], 99),
+        "greeting_p50_ms": percentile_ms(results["greeting"], 50),
+        "greeting_p95_ms": percentile_ms(results["greeting"], 95),
+        "greeting_p99_ms": percentile_ms(results["greeting"], 99),
+        "turns_per_s": round(results["turns"] / elapsed, 2),
+        "memory_per_call_mb": {
+            name: round(max(0, peaks.get(name, 0) - baseline[name]) / calls / 2 ** 20, 2) for name in baseline
+        },
+        "peak_rss_mb": {name: round(peak / 2 ** 20, 1) for name, peak in peaks.items()},
+        # How late the simulated FreeSWITCH sent frames; large values mean the client was the bottleneck
+        "client_lag_p99_ms": percentile_ms(results["lag"], 99) or 0.0
+    }
+
+async def run(args) -> list:
+    results = []
+    for calls in (int(count) for count in args.calls.split(",")):
+        results.append(await run_level(calls, args))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", default="1,10,50", help="comma-separated concurrent call counts")
+    parser.add_argument("--turns", type=int, default=3, help="caller utterances per call")
+    parser.add_argument("--speech-seconds", type=float, default=1.5, help="length of each utterance")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which calls are started")
+    parser.add_argument("--turn-timeout", type=float, default=20.0, help="seconds to wait for a reply")
+    parser.add_argument("--engine-workers", type=int, default=1)
+    parser.add_argument("--greeting-budget-ms", type=float, default=50, help="greeting p95 to stay under")
+    parser.add_argument("--redis-url", help="use this Redis instead of starting fakeredis")
+    parser.add_argument("--base-port", type=int, default=18900, help="first of five consecutive local ports")
+    parser.add_argument("--verbose", action="store_true", help="show service logs")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    add_fake_openai_arguments(parser)
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    over_budget = [row["calls"] for row in results if (row["greeting_p95_ms"] or 0) > args.greeting_budget_ms]
+    if args.json:
+        settings = {key: value for key, value in vars(args).items() if key not in ("json", "verbose", "base_port")}
+        print(json.dumps({"settings": settings, "results": results}, indent=2))
+    else:
+        print(f"{'calls':>6}{'turns':>7}{'errors':>8}{'turn p50':>10}{'p95':>8}{'p99':>8}"
+              f"{'1st audio p50':>15}{'p95':>8}{'p99':>8}{'greeting p95':>14}{'turns/s':>9}"
+              f"{'engine MB/call':>16}{'fs MB/call':>12}")
+        for row in results:
+            memory = row["memory_per_call_mb"]
+            print(f"{row['calls']:>6}{row['turns']:>7}{row['errors']:>8}{row['turn_p50_ms']!s:>10}{row['turn_p95_ms']!s:>8}"
+                  f"{row['turn_p99_ms']!s:>8}{row['first_audio_p50_ms']!s:>15}{row['first_audio_p95_ms']!s:>8}"
+                  f"{row['first_audio_p99_ms']!s:>8}{row['greeting_p95_ms']!s:>14}{row['turns_per_s']:>9}"
+                  f"{memory['ai_engine']:>16}{memory['ai_freeswitch']:>12}")
+    if over_budget:
+        print(f"Greeting p95 over {args.greeting_budget_ms:g} ms at {over_budget} calls", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmark for session codecs.
+
+Compares encode/decode time and payload size of a session as it is stored
+(the metadata hash plus one entry per message) for each codec, plus the
+legacy asdict + json.dumps snapshot, at several history lengths. Run from the
+ai-engine directory:
+
+    python scripts/benchmark_session_codec.py [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from dataclasses import asdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import ConversationSession, SESSION_CODECS, get_session_codec, session_from_storage, session_to_metadata
+
+MESSAGE_COUNTS = (10, 100, 1000)
+
+def build_session(message_count: int) -> ConversationSession:
+    session = ConversationSession(
+        session_id="5f0c8f9e-0d7c-4a59-9b8e-1f2a3b4c5d6e",
+        call_id="call-1234567890",
+        phone_number="+15551234567",
+        context="receptionist",
+        language="en-US",
+        created_at=datetime.now(),
+        last_activity=datetime.now(),
+        user_profile={"name": "Alex", "preferred_language": "en"},
+        summary="Caller asked about opening hours and parking.",
+        summary_through=datetime.now().isoformat()
+    )
+    for index in range(message_count):
+        session.messages.append({
+            "role": "user" if index % 2 == 0 else "assistant",
+            "content": "I'd like to book an appointment for next Tuesday afternoon, please.",
+            "timestamp": datetime.now().isoformat()
+        })
+    return session
+
+def encode_stored(session: ConversationSession, codec) -> tuple:
+    """What write_session sends to Redis: the metadata hash and the message entries"""
+    return session_to_metadata(session, codec), [codec.dumps(message) for message in session.messages]
+
+def stored_size(stored: tuple) -> int:
+    metadata, messages = stored
+    values = [value.encode() if isinstance(value, str) else value for value in metadata.values()]
+    return sum(len(value) for value in values + messages)
+
+def measure(encode, decode, number: int, size=len) -> dict:
+    payload = encode()
+    encode_us = min(timeit.repeat(encode, number=number, repeat=5)) / number * 1e6
+    decode_us = min(timeit.repeat(lambda: decode(payload), number=number, repeat=5)) / number * 1e6
+    return {"encode_us": round(encode_us, 2), "decode_us": round(decode_us, 2), "bytes": size(payload)}
+
+def run() -> list:
+    results = []
+    for message_count in MESSAGE_COUNTS:
+        session = build_session(message_count)
+        number = max(10, 20000 // message_count)
+        
+        legacy = measure(
+            lambda: json.dumps(asdict(session), default=str),
+            lambda data: ConversationSession(**json.loads(data)),
+            number
+        )
+        results.append({"codec": "legacy-asdict-json", "messages": message_count, **legacy})
+        
+        for name in SESSION_CODECS:
+            codec = get_session_codec(name)
+            if codec.name != name:
+                continue  # optional dependency missing
+            result = measure(
+                lambda: encode_stored(session, codec),
+                lambda stored: session_from_storage(*stored, codec),
+                number,
+                stored_size
+            )
+            results.append({"codec": name, "messages": message_count, **result})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    
+    results = run()
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+        
+    print(f"{'codec':<20}{'messages':>10}{'encode us':>12}{'decode us':>12}{'bytes':>10}")
+    for row in results:
+        print(f"{row['codec']:<20}{row['messages']:>10}{row['encode_us']:>12}{row['decode_us']:>12}{row['bytes']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Latency/throughput benchmark for STT backends.
+
+Sends the same utterance to the configured backend at several concurrency
+levels and reports p50/p95 latency, utterances per second and real-time factor
+(seconds of audio transcribed per wall-clock second). Uses the same config keys
+as the server (STT_BACKEND, STT_LOCAL_*, STT_BATCH_*, OPENAI_API_KEY). Run from
+the ai-engine directory:
+
+    python scripts/benchmark_stt.py --backend faster-whisper --audio sample.wav [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import UpstreamScheduler, create_stt_backend, pcm_to_wav, wav_to_pcm
+import openai
+
+CONCURRENCY_LEVELS = (1, 4, 16)
+
+def synthetic_utterance(seconds: float = 3.0, sample_rate: int = 16000) -> bytes:
+    """Voiced-speech-like test signal, for when no recording is given"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    voiced = sum(np.sin(2 * np.pi * harmonic * np.cumsum(pitch) / sample_rate) / harmonic for harmonic in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    return pcm_to_wav((voiced * envelope * 4000).astype(np.int16), sample_rate)
+
+async def run_level(backend, audio: bytes, concurrency: int, requests: int) -> dict:
+    latencies = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+    
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            await backend.transcribe(audio, "en-US")
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    pcm, sample_rate = wav_to_pcm(audio)
+    audio_seconds = len(pcm) / sample_rate
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        "utterances_per_s": round(requests / elapsed, 2),
+        "realtime_factor": round(requests * audio_seconds / elapsed, 2)
+    }
+
+async def run(args) -> list:
+    config = {
+        "STT_BACKEND": args.backend,
+        "STT_LOCAL_MODEL": os.getenv("STT_LOCAL_MODEL", "base.en"),
+        "STT_LOCAL_COMPUTE_TYPE": os.getenv("STT_LOCAL_COMPUTE_TYPE", "int8"),
+        "STT_LOCAL_WORKERS": int(os.getenv("STT_LOCAL_WORKERS", 2)),
+        "STT_LOCAL_THREADS": int(os.getenv("STT_LOCAL_THREADS", 0)),
+        "STT_BATCH_SIZE": int(os.getenv("STT_BATCH_SIZE", 8)),
+        "STT_BATCH_WINDOW_MS": float(os.getenv("STT_BATCH_WINDOW_MS", 20))
+    }
+    client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    backend = create_stt_backend(config, client, UpstreamScheduler("stt", max_concurrency=max(CONCURRENCY_LEVELS)))
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    else:
+        audio = synthetic_utterance()
+    
+    await backend.start()
+    try:
+        # The first call includes model load in every worker; keep it out of the numbers
+        await asyncio.gather(*(backend.transcribe(audio, "en-US") for _ in range(config["STT_LOCAL_WORKERS"])))
+        results = []
+        for concurrency in CONCURRENCY_LEVELS:
+            result = await run_level(backend, audio, concurrency, max(args.requests, concurrency))
+            results.append({"backend": backend.name, **result})
+        return results
+    finally:
+        await backend.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default=os.getenv("STT_BACKEND", "openai"), help="openai or faster-whisper")
+    parser.add_argument("--audio", help="16-bit WAV utterance (default: synthetic 3 s signal)")
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    print(f"{'backend':<16}{'concurrency':>12}{'p50 ms':>10}{'p95 ms':>10}{'utt/s':>10}{'RTF':>8}")
+    for row in results:
+        print(f"{row['backend']:<16}{row['concurrency']:>12}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['utterances_per_s']:>10}{row['realtime_factor']:>8}")
+
+if __name__ == "__main__":
+    main()
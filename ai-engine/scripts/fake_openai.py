@@ -0,0 +1,154 @@
+"""Local stand-in for the OpenAI API, for offline benchmarks.
+
+Serves the three endpoints the engine calls (transcriptions, chat completions
+with and without streaming, speech) with latencies drawn from configurable
+distributions, plus the Rails backend's call event endpoint so ai-freeswitch
+has somewhere to report to. Transcripts and replies are varied so the TTS and
+response caches do not turn the benchmark into a cache benchmark. Point the
+engine at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Run from the
+ai-engine directory:
+
+    python scripts/fake_openai.py --port 18900 --stt lognormal:300:0.3 --chat lognormal:450:0.4
+
+Latency specs are in milliseconds: fixed:MS, uniform:LO:HI or
+lognormal:MEDIAN:SIGMA.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import pcm_to_wav
+
+# OpenAI's "pcm" speech format
+SPEECH_SAMPLE_RATE = 24000
+WORDS = (
+    "appointment schedule tuesday morning billing question account address delivery order "
+    "office hours manager support refund invoice callback pricing availability location "
+    "service contract renewal technician visit weekend holiday directions parking"
+).split()
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Turn a latency spec (milliseconds) into a sampler returning seconds"""
+    kind, *values = spec.split(":")
+    values = [float(value) for value in values]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Bad latency spec {spec!r}; use fixed:MS, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+
+def create_app(args) -> FastAPI:
+    app = FastAPI()
+    stt_latency = parse_latency(args.stt)
+    chat_latency = parse_latency(args.chat)
+    tts_latency = parse_latency(args.tts)
+    counter = itertools.count()
+    
+    def sentence(words: int) -> str:
+        index = next(counter)
+        return " ".join(random.choice(WORDS) for _ in range(words)).capitalize() + f" number {index}."
+    
+    def reply_text() -> str:
+        per_sentence = max(1, args.reply_words // 3)
+        return " ".join(sentence(per_sentence) for _ in range(3))
+    
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+    
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        await request.form()
+        await asyncio.sleep(stt_latency())
+        return {"text": sentence(8)}
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        first_token = chat_latency()
+        tokens = reply_text().split(" ")
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + len(tokens) * args.chat_token_ms / 1000)
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            }
+        
+        async def events():
+            await asyncio.sleep(first_token)
+            for index, token in enumerate(tokens):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": token if index == 0 else f" {token}"}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(args.chat_token_ms / 1000)
+            yield "data: [DONE]\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        body = await request.json()
+        await asyncio.sleep(tts_latency())
+        
+        # A quiet tone as long as the text would take to say
+        seconds = max(0.2, len(body.get("input", "")) / args.speech_chars_per_s)
+        t = np.arange(int(seconds * SPEECH_SAMPLE_RATE)) / SPEECH_SAMPLE_RATE
+        pcm = (np.sin(2 * np.pi * 220 * t) * 3000).astype("<i2")
+        if body.get("response_format") == "pcm":
+            return Response(pcm.tobytes(), media_type="audio/pcm")
+        # Everything else is served as WAV, which the engine and ai-freeswitch both decode
+        return Response(pcm_to_wav(pcm, SPEECH_SAMPLE_RATE), media_type="audio/wav")
+    
+    @app.post("/api/calls/events")
+    async def call_events():
+        return JSONResponse({"status": "ok"})
+    
+    return app
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--stt", default="lognormal:300:0.3", help="transcription latency")
+    parser.add_argument("--chat", default="lognormal:450:0.4", help="chat latency to the first token")
+    parser.add_argument("--chat-token-ms", type=float, default=15, help="delay per generated token")
+    parser.add_argument("--tts", default="lognormal:250:0.3", help="speech latency")
+    parser.add_argument("--reply-words", type=int, default=24, help="words per chat reply")
+    parser.add_argument("--speech-chars-per-s", type=float, default=15, help="length of the synthesized audio")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
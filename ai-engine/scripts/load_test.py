@@ -0,0 +1,139 @@
+"""Throughput load test for the multi-worker engine.
+
+Starts the server with each worker count in turn, opens one session per
+client, and has every client post 1 s binary audio frames to
+/process/frame for a fixed time. VAD is on and the audio is quiet, so each
+request does the per-frame CPU work (decode, endpointing) without calling
+OpenAI, which is the work that extra workers spread across cores. Reports
+requests per second, p50/p95 latency and speed-up over the first worker count.
+Needs Redis at REDIS_URL, like the server. Run from the ai-engine directory:
+
+    python scripts/load_test.py --workers 1,2,4 --clients 32 --duration 10 [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import AUDIO_FRAME_CONTENT_TYPE, encode_audio_frame
+
+SAMPLE_RATE = 16000
+
+def quiet_frame(session_id: str, sequence: int) -> bytes:
+    """One second of low-level noise, below the VAD threshold"""
+    noise = np.random.default_rng(sequence).normal(0, 20, SAMPLE_RATE).astype(np.int16)
+    return encode_audio_frame(session_id, sequence, "l16", SAMPLE_RATE, noise.tobytes())
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WORKERS": str(workers),
+        "PORT": str(port),
+        "VAD_ENABLED": "true",
+        "TTS_CACHE_PREWARM": "false",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "load-test")
+    }
+    return subprocess.Popen([sys.executable, "src/main.py"], env=env)
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+async def run_level(workers: int, args) -> dict:
+    server = start_server(workers, args.port)
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://localhost:{args.port}", limits=limits, timeout=30) as client:
+            await wait_until_ready(client)
+            # Let every worker finish starting before measuring
+            await asyncio.sleep(2)
+            
+            session_ids = []
+            for index in range(args.clients):
+                response = await client.post("/session/create", json={"call_id": f"load-{index}", "phone_number": "+10000000000"})
+                response.raise_for_status()
+                session_ids.append(response.json()["session_id"])
+            
+            latencies = []
+            errors = 0
+            deadline = time.monotonic() + args.duration
+            
+            async def run_client(session_id: str):
+                nonlocal errors
+                sequence = 0
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/process/frame",
+                        content=quiet_frame(session_id, sequence),
+                        headers={"Content-Type": AUDIO_FRAME_CONTENT_TYPE}
+                    )
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+                    sequence += 1
+            
+            started = time.perf_counter()
+            await asyncio.gather(*(run_client(session_id) for session_id in session_ids))
+            elapsed = time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    
+    return {
+        "workers": workers,
+        "clients": args.clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None
+    }
+
+async def run(args) -> list:
+    results = []
+    for workers in (int(count) for count in args.workers.split(",")):
+        results.append(await run_level(workers, args))
+    baseline = results[0]["requests_per_s"] or 1
+    for result in results:
+        result["speedup"] = round(result["requests_per_s"] / baseline, 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients (one session each)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per worker count")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}{'speedup':>9}")
+    for row in results:
+        print(f"{row['workers']:>8}{row['requests_per_s']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['errors']:>8}{row['speedup']:>9}")
+
+if __name__ == "__main__":
+    main()
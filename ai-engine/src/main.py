@@ -2,28 +2,706 @@ import asyncio
 import logging
 import json
 import base64
+import functools
+import hashlib
+import heapq
 import io
+import multiprocessing
+import os
+import re
+import signal as process_signal
+import socket
+import struct
+import textwrap
+import threading
+import time
+import traceback
 import wave
-from typing import Dict, Optional, List
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, List, Union, AsyncIterator, Awaitable, Callable
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 from uuid import uuid4
 
+import httpx
 import redis.asyncio as aioredis
 import openai
-from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks
+from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import speech_recognition as sr
-from gtts import gTTS
 import numpy as np
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE
+from prometheus_client.openmetrics.exposition import generate_latest as generate_openmetrics
 from scipy.io import wavfile
+from scipy import signal
 import uvicorn
+import websockets
+
+# Optional faster session codecs
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import faster_whisper
+except ImportError:
+    faster_whisper = None
+
+try:
+    import piper
+except ImportError:
+    piper = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Optional exact token counts for the context budget
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fixed phrases the receptionist says; their audio is pre-rendered at startup
+WELCOME_MESSAGE = "Hello! How can I help you today?"
+REPEAT_PROMPT = "I didn't catch that. Could you please repeat?"
+PROCESSING_ERROR_MESSAGE = "I'm having trouble processing your request. Please try again."
+RESPONSE_FALLBACK_MESSAGE = "I apologize, but I'm having difficulty processing your request right now."
+TRANSFER_PROMPT = "Please hold while I transfer your call."
+STATIC_PHRASES = (WELCOME_MESSAGE, REPEAT_PROMPT, PROCESSING_ERROR_MESSAGE, RESPONSE_FALLBACK_MESSAGE, TRANSFER_PROMPT)
+
+# Bump whenever build_system_prompt changes so cached replies and rendered
+# prompts are not reused
+PROMPT_VERSION = "2"
+
+# Sentence boundary used to cut streamed LLM output into TTS-sized segments
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def split_sentences(buffer: str, min_length: int = 12) -> tuple:
+    """Split complete sentences off the front of a streaming text buffer.
+    
+    Returns (sentences, remainder). Fragments shorter than min_length are
+    merged with the following sentence so TTS is not called on "Mr." or "Hi!".
+    """
+    parts = SENTENCE_BOUNDARY.split(buffer)
+    remainder = parts.pop()
+    
+    sentences = []
+    pending = ""
+    for part in parts:
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_length:
+            sentences.append(pending.strip())
+            pending = ""
+            
+    if pending:
+        remainder = f"{pending} {remainder}" if remainder else pending
+        
+    return sentences, remainder
+
+# Per-turn latency. Every stage of a turn is timed into one histogram labelled
+# by stage; the turn's trace id, sent by ai-freeswitch in TRACE_HEADER, is
+# attached as an exemplar and logged with the per-stage breakdown.
+TRACE_HEADER = "X-Trace-Id"
+TURN_STAGES = ("decode", "redis_get", "stt", "llm_first_token", "llm_total", "tts", "redis_save", "ws_send", "turn")
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_SECONDS = Histogram(
+    "ai_engine_stage_seconds", "Time spent in each stage of a conversation turn",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+# Bound once so the hot path skips the label lookup
+STAGE_HISTOGRAMS = {stage: STAGE_SECONDS.labels(stage) for stage in TURN_STAGES}
+
+@dataclass
+class TurnTrace:
+    """Stage timings collected for one turn"""
+    trace_id: str
+    stages: Dict[str, float] = field(default_factory=dict)
+
+current_trace: ContextVar[Optional[TurnTrace]] = ContextVar("current_trace", default=None)
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration; inside a turn it is added to the turn's trace"""
+    trace = current_trace.get()
+    if trace is None:
+        STAGE_HISTOGRAMS[stage].observe(seconds)
+    else:
+        trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds
+        
+@contextmanager
+def timed_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+        
+async def timed(stage: str, awaitable: Awaitable):
+    """Await something as one stage; for work that runs in its own task"""
+    with timed_stage(stage):
+        return await awaitable
+
+@contextmanager
+def turn_trace(trace_id: Optional[str] = None):
+    """Collect the stages of one turn under a trace id, then record and log them.
+    
+    Tasks started inside the block inherit the trace. Histograms are updated
+    once when the block exits, with stages that ran several times in the turn
+    (TTS per sentence, WebSocket sends) summed. Chunks that only fed the VAD
+    (no STT) are not counted as turns and carry no exemplar. Ids are cut to
+    64 characters to fit an exemplar.
+    """
+    trace = TurnTrace((trace_id or uuid4().hex)[:64])
+    token = current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        if "stt" not in trace.stages:
+            for stage, seconds in trace.stages.items():
+                STAGE_HISTOGRAMS[stage].observe(seconds)
+        else:
+            total = time.perf_counter() - started
+            exemplar = {"trace_id": trace.trace_id}
+            for stage, seconds in trace.stages.items():
+                STAGE_HISTOGRAMS[stage].observe(seconds, exemplar)
+            STAGE_HISTOGRAMS["turn"].observe(total, exemplar)
+            breakdown = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in trace.stages.items())
+            logger.info(f"Turn {trace.trace_id}: {total * 1000:.0f} ms ({breakdown})")
+
+def render_metrics(accept: str = "") -> tuple:
+    """Render metrics as (body, content type), merging workers in multiprocess mode.
+    
+    Set PROMETHEUS_MULTIPROC_DIR when running more than one worker so every
+    worker's samples are reported; exemplars need the OpenMetrics format and
+    are only kept in single-process mode.
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    if "application/openmetrics-text" in accept:
+        return generate_openmetrics(registry), OPENMETRICS_CONTENT_TYPE
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+# Binary audio framing, shared with ai-freeswitch. Each frame is a fixed
+# 12-byte header (version, codec, id length, flags, sample rate, sequence)
+# followed by the UTF-8 session/call id and the raw audio payload.
+AUDIO_FRAME_VERSION = 1
+AUDIO_FRAME_HEADER = struct.Struct("!BBBBII")
+AUDIO_FRAME_CONTENT_TYPE = "application/x-audio-frame"
+AUDIO_CODECS = {"l16": 1, "pcmu": 2, "pcma": 3, "opus": 4, "wav": 5, "mp3": 6}
+AUDIO_CODEC_NAMES = {code: name for name, code in AUDIO_CODECS.items()}
+AUDIO_TRANSPORTS = ("binary", "json")
+
+@dataclass
+class AudioFrame:
+    """Decoded binary audio frame; payload is a view into the received message"""
+    session_id: str
+    sequence: int
+    codec: str
+    sample_rate: int
+    payload: memoryview
+    
+    def __reduce__(self):
+        # memoryviews don't pickle; frames sent to audio worker processes carry bytes
+        return (AudioFrame, (self.session_id, self.sequence, self.codec, self.sample_rate, bytes(self.payload)))
+
+def encode_audio_frame(session_id: str, sequence: int, codec: str, sample_rate: int, payload: bytes) -> bytes:
+    """Encode raw audio into a binary frame"""
+    stream_id = session_id.encode()
+    if len(stream_id) > 255:
+        raise ValueError("Session id too long for audio frame")
+        
+    header = AUDIO_FRAME_HEADER.pack(
+        AUDIO_FRAME_VERSION, AUDIO_CODECS[codec], len(stream_id), 0, sample_rate, sequence & 0xFFFFFFFF
+    )
+    return b"".join((header, stream_id, payload))
+
+def decode_audio_frame(data: Union[bytes, bytearray, memoryview]) -> AudioFrame:
+    """Parse a binary audio frame without copying the payload"""
+    view = memoryview(data)
+    if len(view) < AUDIO_FRAME_HEADER.size:
+        raise ValueError("Audio frame too short")
+        
+    version, codec, id_length, _flags, sample_rate, sequence = AUDIO_FRAME_HEADER.unpack_from(view)
+    if version != AUDIO_FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version: {version}")
+    if codec not in AUDIO_CODEC_NAMES:
+        raise ValueError(f"Unknown audio codec: {codec}")
+        
+    offset = AUDIO_FRAME_HEADER.size + id_length
+    if len(view) < offset:
+        raise ValueError("Audio frame truncated")
+        
+    return AudioFrame(
+        session_id=str(view[AUDIO_FRAME_HEADER.size:offset], "utf-8"),
+        sequence=sequence,
+        codec=AUDIO_CODEC_NAMES[codec],
+        sample_rate=sample_rate,
+        payload=view[offset:]
+    )
+
+def negotiate_audio_transport(offered) -> str:
+    """Pick the first transport offered by the client that we support"""
+    if isinstance(offered, str):
+        offered = [offered]
+    for transport in offered or []:
+        if transport in AUDIO_TRANSPORTS:
+            return transport
+    return "json"
+
+def _build_g711_tables():
+    """Lookup tables mapping G.711 mu-law/A-law bytes to 16-bit linear PCM"""
+    codes = np.arange(256, dtype=np.int32)
+    
+    ulaw = ~codes & 0xFF
+    exponent = (ulaw >> 4) & 0x07
+    magnitude = (((ulaw & 0x0F) << 3) + 0x84) << exponent
+    ulaw_pcm = np.where(ulaw & 0x80, 0x84 - magnitude, magnitude - 0x84)
+    
+    alaw = codes ^ 0x55
+    exponent = (alaw >> 4) & 0x07
+    mantissa = (alaw & 0x0F) << 4
+    magnitude = np.where(exponent == 0, mantissa + 8, (mantissa + 0x108) << np.maximum(exponent - 1, 0))
+    alaw_pcm = np.where(alaw & 0x80, magnitude, -magnitude)
+    
+    return {"pcmu": ulaw_pcm.astype("<i2"), "pcma": alaw_pcm.astype("<i2")}
+
+G711_DECODE_TABLES = _build_g711_tables()
+
+def pcm_to_wav(pcm, sample_rate: int) -> bytes:
+    """Wrap 16-bit mono PCM (bytes-like or int16 array) in a WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+def audio_frame_to_pcm(frame: AudioFrame) -> Optional[np.ndarray]:
+    """Return a frame's audio as int16 samples, or None for compressed codecs"""
+    if frame.codec == "l16":
+        return np.frombuffer(frame.payload, dtype="<i2")
+    if frame.codec in G711_DECODE_TABLES:
+        return G711_DECODE_TABLES[frame.codec][np.frombuffer(frame.payload, dtype=np.uint8)]
+    if frame.codec == "wav":
+        decoded = wav_to_pcm(frame.payload)
+        return decoded[0] if decoded else None
+    return None
+
+def wav_to_pcm(data) -> Optional[tuple]:
+    """Decode 16-bit WAV bytes to (mono int16 samples, sample rate), or None"""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            if wav.getsampwidth() != 2:
+                return None
+            channels = wav.getnchannels()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1).astype("<i2")
+            return samples, wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+def audio_frame_to_wav(frame: AudioFrame) -> bytes:
+    """Wrap a frame's payload in a container the STT backend accepts.
+    
+    l16 is signed 16-bit little-endian mono PCM; G.711 is expanded to l16.
+    """
+    if frame.codec in ("wav", "mp3"):
+        return bytes(frame.payload)
+    pcm = audio_frame_to_pcm(frame)
+    if pcm is None:
+        raise ValueError(f"Codec {frame.codec} is not supported for transcription")
+    return pcm_to_wav(pcm, frame.sample_rate)
+
+def decode_audio_payload(audio_data: str, want_pcm: bool = True) -> tuple:
+    """Base64 request audio to (bytes, int16 PCM or None, sample rate or None)"""
+    audio_bytes = base64.b64decode(audio_data)
+    if not want_pcm or audio_bytes[:4] != b"RIFF":
+        return audio_bytes, None, None
+    pcm, sample_rate = wav_to_pcm(audio_bytes) or (None, None)
+    return audio_bytes, pcm, sample_rate
+
+def decode_frame_audio(frame: AudioFrame) -> tuple:
+    """A binary frame's audio as (WAV bytes, int16 PCM or None, sample rate)"""
+    pcm = audio_frame_to_pcm(frame)
+    if pcm is None or frame.codec == "wav":
+        return audio_frame_to_wav(frame), pcm, frame.sample_rate
+    return pcm_to_wav(pcm, frame.sample_rate), pcm, frame.sample_rate
+
+@dataclass
+class SharedBlock:
+    """Payload in a shared memory block, handed to or from an audio worker process.
+    
+    Only the block name and layout cross the process boundary, so audio is
+    not pickled through the pool's pipe. Whoever loads the payload last
+    unlinks the block.
+    """
+    name: str
+    
+    @staticmethod
+    def create(size: int) -> shared_memory.SharedMemory:
+        return shared_memory.SharedMemory(create=True, size=max(size, 1))
+        
+    def load(self):
+        """Copy the payload out and free the block"""
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            return self.copy(block.buf)
+        finally:
+            block.close()
+            block.unlink()
+            
+    def release(self):
+        """Free the block without reading it"""
+        block = shared_memory.SharedMemory(name=self.name)
+        block.close()
+        block.unlink()
+
+@dataclass
+class SharedPCM(SharedBlock):
+    """Array in a shared memory block"""
+    shape: tuple
+    dtype: str
+    
+    @classmethod
+    def export(cls, array: np.ndarray) -> "SharedPCM":
+        block = cls.create(array.nbytes)
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        block.close()
+        return cls(block.name, array.shape, array.dtype.str)
+        
+    def view(self, buffer) -> np.ndarray:
+        return np.ndarray(self.shape, np.dtype(self.dtype), buffer=buffer)
+        
+    def copy(self, buffer) -> np.ndarray:
+        return self.view(buffer).copy()
+
+@dataclass
+class SharedBytes(SharedBlock):
+    """Bytes (an encoded payload, base64 text as ASCII) in a shared memory block"""
+    size: int
+    
+    @classmethod
+    def export(cls, data) -> "SharedBytes":
+        data = memoryview(data).cast("B")
+        block = cls.create(data.nbytes)
+        block.buf[:data.nbytes] = data
+        block.close()
+        return cls(block.name, data.nbytes)
+        
+    def view(self, buffer) -> memoryview:
+        return buffer[:self.size]
+        
+    def copy(self, buffer) -> bytes:
+        return bytes(buffer[:self.size])
+
+@dataclass
+class SharedFrame(SharedBytes):
+    """Binary audio frame whose payload is in a shared memory block"""
+    session_id: str
+    sequence: int
+    codec: str
+    sample_rate: int
+    
+    @classmethod
+    def export(cls, frame: AudioFrame) -> "SharedFrame":
+        shared = SharedBytes.export(frame.payload)
+        return cls(shared.name, shared.size, frame.session_id, frame.sequence, frame.codec, frame.sample_rate)
+        
+    def view(self, buffer) -> AudioFrame:
+        return AudioFrame(self.session_id, self.sequence, self.codec, self.sample_rate, buffer[:self.size])
+
+def _export_shared(value):
+    """Move arrays, frames and byte payloads into shared memory; tuples are walked"""
+    if isinstance(value, np.ndarray):
+        return SharedPCM.export(value)
+    if isinstance(value, AudioFrame):
+        return SharedFrame.export(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return SharedBytes.export(value)
+    if isinstance(value, tuple):
+        return tuple(_export_shared(item) for item in value)
+    return value
+
+def _load_shared(value):
+    if isinstance(value, SharedBlock):
+        return value.load()
+    if isinstance(value, tuple):
+        return tuple(_load_shared(item) for item in value)
+    return value
+
+def _release_shared(value):
+    """Free the blocks in a shared result nobody will load"""
+    if isinstance(value, SharedBlock):
+        value.release()
+    elif isinstance(value, tuple):
+        for item in value:
+            _release_shared(item)
+
+def _discard_audio_task(inputs: List[SharedBlock], future):
+    """Free a cancelled task's shared inputs and results once its worker is done"""
+    for block in inputs:
+        block.release()
+    if not future.cancelled() and future.exception() is None:
+        _release_shared(future.result()[1])
+
+def _run_audio_task(fn: Callable, args: tuple) -> tuple:
+    """Audio worker process side: map shared inputs, run fn, share the results"""
+    started = time.time()
+    blocks = {index: shared_memory.SharedMemory(name=arg.name) for index, arg in enumerate(args) if isinstance(arg, SharedBlock)}
+    mapped = [arg.view(blocks[index].buf) if index in blocks else arg for index, arg in enumerate(args)]
+    try:
+        return started, _export_shared(fn(*mapped))
+    except Exception as exc:
+        # The traceback's frames still hold views into the blocks, which
+        # would stop them closing and hide this error behind a BufferError
+        traceback.clear_frames(exc.__traceback__)
+        raise
+    finally:
+        del mapped
+        for block in blocks.values():
+            block.close()
+            
+def _run_timed(fn: Callable, args: tuple) -> tuple:
+    return time.time(), fn(*args)
+
+class AudioExecutor:
+    """Pool for CPU-bound audio work, so the event loop only coordinates.
+    
+    "thread" (default) runs tasks in threads, which is enough for the numpy
+    and scipy work that releases the GIL. "process" uses a spawn process pool,
+    with arrays, audio frames and byte or base64 payloads passed in shared
+    memory rather than pickled, both ways.
+    "inline" runs everything on the event loop. Payloads smaller than
+    min_offload_bytes always run inline, where a pool hop would cost more
+    than the work.
+    """
+    
+    MODES = ("thread", "process", "inline")
+    
+    def __init__(self, mode: str = "thread", workers: int = 4, min_offload_bytes: int = 65536):
+        if mode not in self.MODES:
+            logger.warning(f"Unknown audio executor {mode}, using thread")
+            mode = "thread"
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.min_offload_bytes = min_offload_bytes
+        self.pool = None
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.offloaded = 0
+        self.inline = 0
+        self.wait_seconds = 0.0
+        
+    async def start(self):
+        if self.mode == "process":
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        elif self.mode == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio")
+            
+    async def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            
+    @property
+    def queue_depth(self) -> int:
+        """Tasks waiting for a free worker"""
+        return max(0, self.in_flight - self.workers)
+        
+    def should_offload(self, size: int) -> bool:
+        return self.mode != "inline" and size >= self.min_offload_bytes
+        
+    async def run(self, fn: Callable, *args, size: Optional[int] = None):
+        """Run fn(*args) in the pool and return its result.
+        
+        size is the payload size in bytes used to decide whether to offload
+        (default: the largest bytes, str or array argument).
+        """
+        if size is None:
+            size = max((len(arg) if isinstance(arg, (bytes, str)) else getattr(arg, "nbytes", 0) for arg in args), default=0)
+        if not self.should_offload(size):
+            self.inline += 1
+            return fn(*args)
+        if not self.pool:
+            await self.start()
+            
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self.in_flight += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        shared = []
+        try:
+            if self.mode == "process":
+                # Base64 text travels as ASCII bytes; b64decode takes either
+                args = tuple(
+                    _export_shared(arg.encode() if isinstance(arg, str) else arg)
+                    if isinstance(arg, (np.ndarray, AudioFrame, bytes, bytearray, memoryview, str)) else arg
+                    for arg in args
+                )
+                shared = [arg for arg in args if isinstance(arg, SharedBlock)]
+                future = self.pool.submit(_run_audio_task, fn, args)
+                try:
+                    started, result = await asyncio.wrap_future(future)
+                except asyncio.CancelledError:
+                    # A running task still finishes; its worker frees nothing,
+                    # so the blocks go once it is done with them
+                    future.add_done_callback(functools.partial(_discard_audio_task, shared))
+                    shared = []
+                    raise
+                result = _load_shared(result)
+            else:
+                started, result = await loop.run_in_executor(self.pool, _run_timed, fn, args)
+        finally:
+            self.in_flight -= 1
+            for block in shared:
+                block.release()
+        self.offloaded += 1
+        self.wait_seconds += max(0.0, started - submitted)
+        return result
+        
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "offloaded": self.offloaded,
+            "inline": self.inline,
+            "avg_wait_ms": round(self.wait_seconds / self.offloaded * 1000, 2) if self.offloaded else 0.0
+        }
+
+class VoiceActivityDetector:
+    """Streaming voice activity detection and utterance endpointing.
+    
+    PCM is high-pass filtered and split into short frames. A frame counts as
+    speech when its energy clears an adaptive noise floor and its zero-crossing
+    rate is not noise-like. An utterance ends after hangover_ms of non-speech;
+    trailing silence is trimmed and a little pre-roll is kept at the start.
+    """
+    
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, hangover_ms: int = 600,
+                 energy_threshold_db: float = -45.0, noise_margin_db: float = 10.0,
+                 max_zero_crossing_rate: float = 0.35, min_speech_ms: int = 200,
+                 max_utterance_ms: int = 15000, pre_roll_ms: int = 200):
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_utterance_frames = max(1, max_utterance_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        
+        # Remove DC offset and mains hum before measuring energy
+        self.filter = signal.butter(2, 80, btype="highpass", fs=sample_rate, output="sos")
+        self.filter_state = np.zeros((self.filter.shape[0], 2))
+        
+        self.noise_floor_db = energy_threshold_db - noise_margin_db
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.pre_roll: List[np.ndarray] = []
+        self.frames: List[np.ndarray] = []
+        self.speech_frames = 0
+        self.silence_run = 0
+        self.in_speech = False
+        
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        """Return a speech/non-speech flag for each row of a (n, frame_size) array"""
+        filtered, self.filter_state = signal.sosfilt(
+            self.filter, frames.reshape(-1).astype(np.float32) / 32768.0, zi=self.filter_state
+        )
+        filtered = filtered.reshape(frames.shape)
+        
+        energy_db = 10 * np.log10(np.mean(filtered ** 2, axis=1) + 1e-10)
+        signs = np.signbit(filtered)
+        zero_crossing_rate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frames.shape[1]
+        
+        is_speech = np.zeros(len(frames), dtype=bool)
+        for index, level in enumerate(energy_db):
+            threshold = max(self.energy_threshold_db, self.noise_floor_db + self.noise_margin_db)
+            is_speech[index] = level >= threshold and zero_crossing_rate[index] <= self.max_zero_crossing_rate
+            if not is_speech[index]:
+                # Track the background level slowly so noisy lines raise the bar
+                self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * level
+        return is_speech
+        
+    def feed(self, pcm: np.ndarray) -> List[np.ndarray]:
+        """Add int16 samples; return any utterances completed by them"""
+        samples = np.concatenate((self.remainder, pcm)) if len(self.remainder) else pcm
+        usable = len(samples) - len(samples) % self.frame_size
+        self.remainder = samples[usable:].copy()
+        if not usable:
+            return []
+            
+        frames = samples[:usable].reshape(-1, self.frame_size)
+        utterances = []
+        
+        for frame, is_speech in zip(frames, self.classify(frames)):
+            if not self.in_speech:
+                if is_speech:
+                    self.in_speech = True
+                    self.frames = self.pre_roll + [frame]
+                    self.pre_roll = []
+                    self.speech_frames = 1
+                    self.silence_run = 0
+                elif self.pre_roll_frames:
+                    self.pre_roll = (self.pre_roll + [frame])[-self.pre_roll_frames:]
+                continue
+                
+            self.frames.append(frame)
+            if is_speech:
+                self.speech_frames += 1
+                self.silence_run = 0
+            else:
+                self.silence_run += 1
+                
+            if self.silence_run >= self.hangover_frames or len(self.frames) >= self.max_utterance_frames:
+                utterance = self.end_utterance()
+                if utterance is not None:
+                    utterances.append(utterance)
+                    
+        return utterances
+        
+    def end_utterance(self) -> Optional[np.ndarray]:
+        """Close the current utterance, trimming trailing silence"""
+        frames = self.frames[:len(self.frames) - self.silence_run] if self.silence_run else self.frames
+        long_enough = self.speech_frames >= self.min_speech_frames
+        
+        self.frames = []
+        self.in_speech = False
+        self.speech_frames = 0
+        self.silence_run = 0
+        
+        if not frames or not long_enough:
+            return None
+        return np.concatenate(frames)
+        
+    def flush(self) -> Optional[np.ndarray]:
+        """Return whatever speech is buffered, e.g. when the stream ends"""
+        if not self.in_speech:
+            return None
+        return self.end_utterance()
+
 # Data models
 class CreateSessionRequest(BaseModel):
     call_id: str
@@ -35,17 +713,37 @@ class ProcessAudioRequest(BaseModel):
     session_id: str
     audio_data: str  # base64 encoded
     format: str = "wav"
+    # Format of the returned speech; defaults to the TTS backend's
+    response_format: Optional[str] = None
 
 class TranscribeRequest(BaseModel):
     audio_data: str
     language: str = "en-US"
 
+class BargeInRequest(BaseModel):
+    # How much of the interrupted reply the caller heard, if the client knows
+    played_ms: Optional[int] = None
+
 class SynthesizeRequest(BaseModel):
     text: str
-    voice: str = "alloy"
-    format: str = "mp3"
+    voice: Optional[str] = None
+    format: Optional[str] = None
+    # Stream 16-bit linear PCM chunks as each sentence is synthesized
+    stream: bool = False
+    sample_rate: int = 8000
 
-@dataclass
+def contains_speech(pcm: np.ndarray, sample_rate: int, threshold_db: float = -35.0,
+                    min_speech_ms: int = 120, frame_ms: int = 20) -> bool:
+    """Stateless check for caller speech in one chunk, used to detect barge-in"""
+    frame_size = sample_rate * frame_ms // 1000
+    count = len(pcm) // frame_size if frame_size else 0
+    if not count:
+        return False
+    frames = pcm[:count * frame_size].astype(np.float32).reshape(count, frame_size) / 32768.0
+    levels = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    return int(np.count_nonzero(levels > threshold_db)) * frame_ms >= min_speech_ms
+
+@dataclass(slots=True)
 class ConversationSession:
     """Represents an active conversation session"""
     session_id: str
@@ -57,12 +755,1333 @@ class ConversationSession:
     last_activity: datetime
     messages: List[Dict] = None
     user_profile: Dict = None
+    # Running summary of turns that no longer fit the context budget, covering
+    # every message up to and including the summary_through timestamp
+    summary: str = ""
+    summary_through: str = ""
+    # How many entries of `messages` are already in the Redis message list
+    stored_message_count: int = field(default=0, repr=False, compare=False)
 
     def __post_init__(self):
         if self.messages is None:
             self.messages = []
         if self.user_profile is None:
             self.user_profile = {}
+            
+    def is_summarized(self, message: Dict) -> bool:
+        """Whether the running summary already covers this message"""
+        return bool(self.summary_through) and message.get("timestamp", "") <= self.summary_through
+
+def _encode_datetime(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _parse_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+class SessionCodec:
+    """Serializes session values to bytes; datetimes travel as ISO-8601 strings"""
+    name = "json"
+    
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, default=_encode_datetime, separators=(",", ":")).encode()
+        
+    def loads(self, data):
+        return json.loads(data)
+
+class OrjsonSessionCodec(SessionCodec):
+    """JSON wire format, encoded and decoded by orjson"""
+    name = "orjson"
+    
+    def dumps(self, value) -> bytes:
+        return orjson.dumps(value, default=_encode_datetime)
+        
+    def loads(self, data):
+        return orjson.loads(data)
+
+class MsgpackSessionCodec(SessionCodec):
+    """Compact binary codec; still reads JSON values written before a switch"""
+    name = "msgpack"
+    
+    def dumps(self, value) -> bytes:
+        return msgpack.packb(value, default=_encode_datetime, use_bin_type=True)
+        
+    def loads(self, data):
+        if data[:1] in (b"{", b"["):
+            return json.loads(data)
+        return msgpack.unpackb(data, raw=False)
+
+SESSION_CODECS = {"json": SessionCodec, "orjson": OrjsonSessionCodec, "msgpack": MsgpackSessionCodec}
+
+def get_session_codec(name: str) -> SessionCodec:
+    """Return the configured session codec, falling back to JSON if unavailable"""
+    if name not in SESSION_CODECS:
+        raise ValueError(f"Unknown session codec: {name}")
+    if (name == "orjson" and orjson is None) or (name == "msgpack" and msgpack is None):
+        logger.warning(f"Session codec {name} is not installed, using json")
+        return SessionCodec()
+    return SESSION_CODECS[name]()
+
+# Session storage layout: a small metadata hash plus an append-only message list
+SESSION_TTL = 3600
+SESSION_METADATA_FIELDS = ("session_id", "call_id", "phone_number", "context", "language")
+# Metadata added later; sessions stored before them load with the defaults
+SESSION_OPTIONAL_FIELDS = ("summary", "summary_through")
+
+def session_meta_key(session_id: str) -> str:
+    return f"session:{session_id}:meta"
+
+def session_messages_key(session_id: str) -> str:
+    return f"session:{session_id}:messages"
+
+def session_to_metadata(session: ConversationSession, codec: SessionCodec) -> Dict:
+    """Flatten session metadata (everything but messages) for a Redis hash"""
+    metadata = {name: getattr(session, name) for name in SESSION_METADATA_FIELDS + SESSION_OPTIONAL_FIELDS}
+    metadata["created_at"] = session.created_at.isoformat()
+    metadata["last_activity"] = session.last_activity.isoformat()
+    metadata["user_profile"] = codec.dumps(session.user_profile)
+    return metadata
+
+def session_from_storage(metadata: Dict, messages: List, codec: SessionCodec) -> ConversationSession:
+    """Rebuild a session from its metadata hash and the tail of its message list"""
+    fields = {
+        (key.decode() if isinstance(key, bytes) else key): value
+        for key, value in metadata.items()
+    }
+    user_profile = fields.pop("user_profile", None)
+    fields = {key: value.decode() if isinstance(value, bytes) else value for key, value in fields.items()}
+    
+    session = ConversationSession(
+        **{name: fields[name] for name in SESSION_METADATA_FIELDS},
+        **{name: fields[name] for name in SESSION_OPTIONAL_FIELDS if name in fields},
+        created_at=_parse_datetime(fields["created_at"]),
+        last_activity=_parse_datetime(fields["last_activity"]),
+        messages=[codec.loads(message) for message in messages],
+        user_profile=codec.loads(user_profile) if user_profile else {}
+    )
+    session.stored_message_count = len(session.messages)
+    return session
+
+# Redis pub/sub channel other replicas use to drop stale cached sessions
+SESSION_INVALIDATION_CHANNEL = "session:invalidate"
+
+class SessionCache:
+    """Size-bounded in-process LRU cache of sessions with a per-entry TTL"""
+    
+    def __init__(self, max_size: int = 1000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        entry = self.entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+            
+        session, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[session_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+            
+        self.entries.move_to_end(session_id)
+        self.hits += 1
+        return session
+        
+    def put(self, session: ConversationSession):
+        self.entries[session.session_id] = (session, time.monotonic() + self.ttl)
+        self.entries.move_to_end(session.session_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            
+    def invalidate(self, session_id: str) -> bool:
+        if self.entries.pop(session_id, None) is None:
+            return False
+        self.invalidations += 1
+        return True
+        
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+class SessionPool:
+    """Pre-created session shells per context, handed out on session creation.
+    
+    A shell is a ConversationSession whose id is generated and whose metadata
+    hash is already in Redis, so binding it to a call is a deque pop and a
+    few field assignments. What every call in a context shares (the rendered
+    system prompt and its token count, the greeting audio) is warmed once
+    per context rather than copied into each shell. Shells are handed out
+    oldest first and retired after max_age, well before their keys expire.
+    """
+    
+    def __init__(self, contexts: List[str], size: int = 20, max_age: float = SESSION_TTL / 2):
+        self.size = size
+        self.max_age = max_age
+        self.shells: Dict[str, Deque[tuple]] = {context: deque() for context in contexts}
+        self.refill_needed = asyncio.Event()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.retired = 0
+        
+    def take(self, context: str) -> Optional[ConversationSession]:
+        shells = self.shells.get(context)
+        if not shells:
+            self.misses += 1
+            if shells is not None:
+                self.refill_needed.set()
+            return None
+            
+        _, shell = shells.popleft()
+        self.hits += 1
+        self.refill_needed.set()
+        return shell
+        
+    def missing(self) -> Dict[str, int]:
+        """Shells needed per context to be back at size"""
+        return {context: self.size - len(shells) for context, shells in self.shells.items() if len(shells) < self.size}
+        
+    def add(self, shells: List[ConversationSession]):
+        now = time.monotonic()
+        for shell in shells:
+            self.shells[shell.context].append((now, shell))
+        self.created += len(shells)
+        
+    def retire_expired(self) -> List[ConversationSession]:
+        """Remove and return shells older than max_age"""
+        cutoff = time.monotonic() - self.max_age
+        retired = []
+        for shells in self.shells.values():
+            while shells and shells[0][0] < cutoff:
+                retired.append(shells.popleft()[1])
+        self.retired += len(retired)
+        return retired
+        
+    def drain(self) -> List[ConversationSession]:
+        """Remove and return every pooled shell"""
+        shells = [shell for pool in self.shells.values() for _, shell in pool]
+        for pool in self.shells.values():
+            pool.clear()
+        return shells
+        
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "available": {context: len(shells) for context, shells in self.shells.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "retired": self.retired
+        }
+
+class TTSCache:
+    """Content-addressed cache of synthesized speech.
+    
+    Audio is keyed by a hash of (text, voice, model, format). The first tier is
+    an in-memory LRU bounded by bytes; the optional second tier is either a
+    directory on disk or Redis, also evicted oldest-first by total size.
+    """
+    
+    REDIS_INDEX_KEY = "tts:index"
+    REDIS_BYTES_KEY = "tts:bytes"
+    
+    def __init__(self, max_memory_bytes: int = 32 * 1024 * 1024, backend: str = "memory",
+                 directory: Optional[str] = None, max_backend_bytes: int = 512 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.backend = backend
+        self.directory = directory
+        self.max_backend_bytes = max_backend_bytes
+        self.redis = None
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if backend == "disk":
+            os.makedirs(directory, exist_ok=True)
+            entries = [entry for entry in os.scandir(directory) if not entry.name.endswith(".tmp")]
+            for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+                self.disk_index[entry.name] = entry.stat().st_size
+                self.disk_bytes += entry.stat().st_size
+                
+    @staticmethod
+    def key(text: str, voice: str, model: str, audio_format: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(json.dumps([normalized, voice, model, audio_format]).encode()).hexdigest()
+        
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self.memory.get(key)
+        if audio is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return audio
+            
+        audio = await self._backend_get(key)
+        if audio is not None:
+            self.backend_hits += 1
+            self._memory_put(key, audio)
+            return audio
+            
+        self.misses += 1
+        return None
+        
+    async def put(self, key: str, audio: bytes):
+        self._memory_put(key, audio)
+        try:
+            await self._backend_put(key, audio)
+        except Exception as e:
+            logger.error(f"Error writing TTS cache entry: {e}")
+            
+    def _memory_put(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+        self.memory[key] = audio
+        self.memory_bytes += len(audio)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.evictions += 1
+            
+    async def _backend_get(self, key: str) -> Optional[bytes]:
+        try:
+            if self.backend == "disk" and key in self.disk_index:
+                self.disk_index.move_to_end(key)
+                return await asyncio.to_thread(self._read_file, key)
+            if self.backend == "redis" and self.redis:
+                audio = await self.redis.get(f"tts:{key}")
+                if audio is not None:
+                    await self.redis.zadd(self.REDIS_INDEX_KEY, {key: time.time()})
+                return audio
+        except Exception as e:
+            logger.error(f"Error reading TTS cache entry: {e}")
+        return None
+        
+    async def _backend_put(self, key: str, audio: bytes):
+        if self.backend == "disk":
+            if key not in self.disk_index:
+                await asyncio.to_thread(self._write_file, key, audio)
+                self.disk_index[key] = len(audio)
+                self.disk_bytes += len(audio)
+            while self.disk_bytes > self.max_backend_bytes and self.disk_index:
+                evicted, size = self.disk_index.popitem(last=False)
+                self.disk_bytes -= size
+                self.evictions += 1
+                await asyncio.to_thread(self._remove_file, evicted)
+                
+        elif self.backend == "redis" and self.redis:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(f"tts:{key}", audio, nx=True)
+                pipe.zadd(self.REDIS_INDEX_KEY, {key: time.time()})
+                created, _ = await pipe.execute()
+            if not created:
+                return
+                
+            # The byte counter and index are shared by all replicas
+            total = await self.redis.incrby(self.REDIS_BYTES_KEY, len(audio))
+            while total > self.max_backend_bytes:
+                oldest = await self.redis.zpopmin(self.REDIS_INDEX_KEY)
+                if not oldest:
+                    break
+                evicted = oldest[0][0].decode() if isinstance(oldest[0][0], bytes) else oldest[0][0]
+                size = await self.redis.strlen(f"tts:{evicted}")
+                await self.redis.delete(f"tts:{evicted}")
+                total = await self.redis.decrby(self.REDIS_BYTES_KEY, size)
+                self.evictions += 1
+                
+    def _read_file(self, key: str) -> bytes:
+        path = os.path.join(self.directory, key)
+        os.utime(path)
+        with open(path, "rb") as f:
+            return f.read()
+            
+    def _write_file(self, key: str, audio: bytes):
+        path = os.path.join(self.directory, key)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(audio)
+        os.replace(f"{path}.tmp", path)
+        
+    def _remove_file(self, key: str):
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+            
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.backend_hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "disk_bytes": self.disk_bytes if self.backend == "disk" else None,
+            "memory_hits": self.memory_hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.backend_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+# Caller utterances that carry or ask about personal data are never cached
+PERSONAL_DATA_PATTERN = re.compile(
+    r"\d{3,}|[\w.+-]+@[\w-]+\.[\w.]+|\b(my|mine|i am|i'm|me)\b",
+    re.IGNORECASE
+)
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+def embed_text(text: str, dimensions: int = 512) -> np.ndarray:
+    """Local bag-of-words plus character-trigram embedding (feature hashing).
+    
+    Cheap enough to run on every turn without a model, and good enough to
+    match rephrasings like "what time do you open" / "when do you open".
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    words = text.split()
+    features = words + [f"#{word[i:i + 3]}" for word in words for i in range(max(1, len(word) - 2))]
+    for feature in features:
+        vector[zlib.crc32(feature.encode()) % dimensions] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+@dataclass
+class CachedResponse:
+    """A cached assistant reply and what it cost to generate"""
+    utterance: str
+    response: str
+    vector: np.ndarray
+    expires_at: float
+    latency_ms: float
+
+class ResponseCache:
+    """Cache of assistant replies to common caller questions.
+    
+    Keyed on (prompt version, context, previous assistant turn, normalized
+    last utterance). The previous turn is part of the key because short
+    answers ("yes", "the second one") mean different things after different
+    questions. Lookups try an exact match first, then the nearest cached
+    utterance after the same previous turn by cosine similarity of local
+    embeddings, accepted above a threshold.
+    """
+    
+    SIMILARITY_BUCKETS = np.arange(0.0, 1.0001, 0.05)
+    
+    def __init__(self, similarity_threshold: float = 0.9, default_ttl: float = 3600,
+                 context_ttls: Optional[Dict[str, float]] = None, max_entries: int = 1000,
+                 prompt_version: str = PROMPT_VERSION):
+        self.similarity_threshold = similarity_threshold
+        self.default_ttl = default_ttl
+        self.context_ttls = context_ttls or {}
+        self.max_entries = max_entries
+        self.prompt_version = prompt_version
+        self.entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self.matrices: Dict[str, tuple] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+        # Best similarity seen on each miss; shows what a lower threshold would hit
+        self.miss_similarity_histogram = np.zeros(len(self.SIMILARITY_BUCKETS), dtype=np.int64)
+        
+    def get(self, context: str, utterance: str, previous: str = "") -> Optional[str]:
+        normalized = normalize_utterance(utterance)
+        now = time.monotonic()
+        
+        entry = self.entries.get((self.prompt_version, context, previous, normalized))
+        if entry and entry.expires_at > now:
+            self.exact_hits += 1
+            self.latency_saved_ms += entry.latency_ms
+            return entry.response
+            
+        best_similarity = 0.0
+        keys, matrix = self._context_matrix(context, previous)
+        if keys:
+            similarities = matrix @ embed_text(normalized)
+            for index in np.argsort(similarities)[::-1]:
+                candidate = self.entries.get(keys[index])
+                if candidate and candidate.expires_at > now:
+                    best_similarity = float(similarities[index])
+                    if best_similarity >= self.similarity_threshold:
+                        self.semantic_hits += 1
+                        self.latency_saved_ms += candidate.latency_ms
+                        return candidate.response
+                    break
+                    
+        self.misses += 1
+        bucket = np.searchsorted(self.SIMILARITY_BUCKETS, best_similarity, side="right") - 1
+        if bucket >= 0:
+            self.miss_similarity_histogram[bucket] += 1
+        return None
+        
+    def put(self, context: str, utterance: str, response: str, latency_ms: float, previous: str = ""):
+        normalized = normalize_utterance(utterance)
+        key = (self.prompt_version, context, previous, normalized)
+        ttl = self.context_ttls.get(context, self.default_ttl)
+        if ttl <= 0:
+            return
+            
+        self.entries[key] = CachedResponse(
+            utterance=normalized,
+            response=response,
+            vector=embed_text(normalized),
+            expires_at=time.monotonic() + ttl,
+            latency_ms=latency_ms
+        )
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.matrices.pop(evicted[1:3], None)
+        self.matrices.pop((context, previous), None)
+        
+    def _context_matrix(self, context: str, previous: str) -> tuple:
+        """Stacked embeddings of the entries after one previous turn in a context, rebuilt after changes"""
+        if (context, previous) not in self.matrices:
+            keys = [key for key in self.entries if key[0] == self.prompt_version and key[1:3] == (context, previous)]
+            matrix = np.stack([self.entries[key].vector for key in keys]) if keys else None
+            self.matrices[(context, previous)] = (keys, matrix)
+        return self.matrices[(context, previous)]
+        
+    @staticmethod
+    def previous_turn(session: ConversationSession) -> str:
+        """Hash of the last assistant turn, or "" before the assistant has spoken"""
+        for message in reversed(session.messages):
+            if message.get("role") == "assistant":
+                return hashlib.sha1(normalize_utterance(message.get("content", "")).encode()).hexdigest()[:16]
+        return ""
+        
+    @staticmethod
+    def is_cacheable(session: ConversationSession, utterance: str, response: str) -> bool:
+        """Only cache generic answers to generic questions"""
+        if session.user_profile or PERSONAL_DATA_PATTERN.search(utterance):
+            return False
+        if response in (RESPONSE_FALLBACK_MESSAGE, PROCESSING_ERROR_MESSAGE):
+            return False
+        caller_digits = re.sub(r"\D", "", session.phone_number or "")
+        response_digits = re.sub(r"\D", "", response)
+        return not (len(caller_digits) >= 4 and caller_digits[-4:] in response_digits)
+        
+    def stats(self) -> Dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+            "miss_similarity_histogram": {
+                f"{bucket:.2f}": int(count)
+                for bucket, count in zip(self.SIMILARITY_BUCKETS, self.miss_similarity_histogram)
+            }
+        }
+
+class UpstreamOverloaded(Exception):
+    """Raised when an upstream call is shed instead of queued"""
+
+# Calls already mid-conversation are served before calls that have just started;
+# background work such as history summaries goes last and is shed first
+PRIORITY_ACTIVE_CALL = 0
+PRIORITY_NEW_CALL = 1
+PRIORITY_BACKGROUND = 2
+
+# (max concurrency, per-minute budget, max queue, timeout seconds) per upstream.
+# The budget is tokens for chat, characters for TTS and requests for STT; 0 is unlimited.
+UPSTREAM_DEFAULTS = {
+    "stt": (8, 0, 32, 10.0),
+    "chat": (16, 0, 64, 15.0),
+    "tts": (8, 0, 32, 10.0)
+}
+
+# How long to hold back new calls to an upstream after it answers 429
+RATE_LIMIT_COOLDOWN = 1.0
+
+class UpstreamScheduler:
+    """Concurrency, rate and queue limits in front of one upstream API.
+    
+    At most max_concurrency calls run at once and at most tokens_per_minute
+    of budget is spent per minute (token bucket). Other calls wait in a
+    priority queue bounded by max_queue. A call is shed with
+    UpstreamOverloaded when the queue is full (a queued lower-priority call
+    is displaced instead if there is one), when its expected wait already
+    exceeds its deadline, or when it is still queued at the deadline.
+    """
+    
+    def __init__(self, name: str, max_concurrency: int = 8, tokens_per_minute: float = 0,
+                 max_queue: int = 32, timeout: float = 10.0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.tokens = float(tokens_per_minute)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        # Heap of [priority, sequence, tokens, deadline, future]
+        self.waiters: List[list] = []
+        self.sequence = 0
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        # Moving average of call duration, used to estimate queue wait
+        self.service_time = 0.5
+        self.completed = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        
+    @property
+    def saturated(self) -> bool:
+        return len(self.waiters) >= self.max_queue
+        
+    def _cost(self, tokens: float) -> float:
+        # A call larger than the whole budget must still be able to run eventually
+        return min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+        
+    def _refill(self):
+        now = time.monotonic()
+        if self.tokens_per_minute:
+            self.tokens = min(self.tokens_per_minute,
+                              self.tokens + (now - self.refilled_at) * self.tokens_per_minute / 60)
+        self.refilled_at = now
+        
+    def _can_start(self, tokens: float) -> bool:
+        if self.in_flight >= self.max_concurrency or time.monotonic() < self.paused_until:
+            return False
+        self._refill()
+        return self.tokens >= self._cost(tokens)
+        
+    def _start(self, tokens: float):
+        self.in_flight += 1
+        self.tokens -= self._cost(tokens)
+        
+    def _dispatch(self):
+        if self.wakeup:
+            self.wakeup.cancel()
+            self.wakeup = None
+        while self.waiters:
+            priority, _, tokens, _, future = self.waiters[0]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+            if not self._can_start(tokens):
+                break
+            heapq.heappop(self.waiters)
+            self._start(tokens)
+            future.set_result(None)
+            
+        # Blocked on the rate budget rather than concurrency: retry once it refills
+        if self.waiters and self.in_flight < self.max_concurrency:
+            deficit = self._cost(self.waiters[0][2]) - self.tokens
+            delay = max(self.paused_until - time.monotonic(),
+                        deficit * 60 / self.tokens_per_minute if self.tokens_per_minute else 0, 0.001)
+            self.wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+            
+    def _remove_waiter(self, future: asyncio.Future):
+        self.waiters = [waiter for waiter in self.waiters if waiter[4] is not future]
+        heapq.heapify(self.waiters)
+        
+    async def acquire(self, tokens: float = 1, priority: int = PRIORITY_NEW_CALL,
+                      deadline: Optional[float] = None):
+        """Wait for a slot; raises UpstreamOverloaded if the call is shed"""
+        deadline = deadline or time.monotonic() + self.timeout
+        if not self.waiters and self._can_start(tokens):
+            self._start(tokens)
+            return
+            
+        ahead = sum(1 for waiter in self.waiters if waiter[0] <= priority)
+        expected_wait = self.service_time * (ahead + 1) / self.max_concurrency
+        if time.monotonic() + expected_wait > deadline:
+            self.shed += 1
+            raise UpstreamOverloaded(f"{self.name}: expected wait {expected_wait:.2f}s exceeds deadline")
+            
+        if len(self.waiters) >= self.max_queue:
+            victim = max(self.waiters, default=None)
+            if victim is None or victim[0] <= priority:
+                self.shed += 1
+                raise UpstreamOverloaded(f"{self.name}: queue full")
+            self._remove_waiter(victim[4])
+            self.shed += 1
+            victim[4].set_exception(UpstreamOverloaded(f"{self.name}: displaced by a higher priority call"))
+            
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.waiters, [priority, self.sequence, tokens, deadline, future])
+        if self.wakeup is None:
+            self._dispatch()
+            
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(future, max(0.0, deadline - queued_at))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted a slot at the same moment we gave up on it
+                self.release()
+            else:
+                self._remove_waiter(future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise UpstreamOverloaded(f"{self.name}: still queued at deadline") from None
+            raise
+        finally:
+            self.total_wait += time.monotonic() - queued_at
+            
+    def release(self, elapsed: Optional[float] = None):
+        self.in_flight -= 1
+        if elapsed is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+        self._dispatch()
+        
+    def throttle(self):
+        """Back off after the upstream reports a rate limit (HTTP 429)"""
+        self.rate_limited += 1
+        self.paused_until = time.monotonic() + RATE_LIMIT_COOLDOWN
+        
+    @asynccontextmanager
+    async def slot(self, tokens: float = 1, priority: int = PRIORITY_NEW_CALL,
+                   deadline: Optional[float] = None):
+        await self.acquire(tokens, priority, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        except openai.RateLimitError:
+            self.throttle()
+            raise
+        finally:
+            self.completed += 1
+            self.release(time.monotonic() - started)
+            
+    async def run(self, call: Callable[[], Awaitable], tokens: float = 1,
+                  priority: int = PRIORITY_NEW_CALL, timeout: Optional[float] = None):
+        """Run call() in a slot; queueing and the call share one timeout budget"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        async with self.slot(tokens, priority, deadline):
+            return await asyncio.wait_for(call(), max(0.0, deadline - time.monotonic()))
+            
+    def stats(self) -> Dict:
+        self._refill()
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": len(self.waiters),
+            "max_queue": self.max_queue,
+            "saturated": self.saturated,
+            "tokens_available": round(self.tokens, 1) if self.tokens_per_minute else None,
+            "completed": self.completed,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "avg_wait_ms": round(self.total_wait * 1000 / max(1, self.completed + self.timeouts), 1)
+        }
+
+class STTBackend:
+    """Speech-to-text backend interface"""
+    
+    name = "base"
+    
+    async def start(self):
+        pass
+        
+    async def close(self):
+        pass
+        
+    async def transcribe(self, audio_bytes: bytes, language: str = "en-US",
+                         priority: int = PRIORITY_NEW_CALL) -> str:
+        raise NotImplementedError
+        
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+class OpenAISTTBackend(STTBackend):
+    """Hosted Whisper through the OpenAI API, behind the STT upstream scheduler"""
+    
+    name = "openai"
+    
+    def __init__(self, client: openai.AsyncOpenAI, scheduler: UpstreamScheduler, model: str = "whisper-1"):
+        self.client = client
+        self.scheduler = scheduler
+        self.model = model
+        
+    async def transcribe(self, audio_bytes: bytes, language: str = "en-US",
+                         priority: int = PRIORITY_NEW_CALL) -> str:
+        # Create a temporary file-like object
+        audio_file = io.BytesIO(audio_bytes)
+        audio_file.name = "audio.wav"
+        
+        response = await self.scheduler.run(
+            lambda: self.client.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                language=language.split("-")[0]  # Convert en-US to en
+            ),
+            priority=priority
+        )
+        return response.text
+
+# Loaded once per worker process by _init_whisper_worker
+_whisper_model = None
+
+WHISPER_SAMPLE_RATE = 16000
+
+def _init_whisper_worker(model_size: str, compute_type: str, cpu_threads: int):
+    global _whisper_model
+    _whisper_model = faster_whisper.WhisperModel(
+        model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads
+    )
+
+def _whisper_audio(audio_bytes: bytes) -> np.ndarray:
+    """Decode WAV (or any container PyAV reads) to 16 kHz mono float32"""
+    decoded = wav_to_pcm(audio_bytes)
+    if decoded is None:
+        return faster_whisper.decode_audio(io.BytesIO(audio_bytes), sampling_rate=WHISPER_SAMPLE_RATE)
+    pcm, sample_rate = decoded
+    audio = pcm.astype(np.float32) / 32768.0
+    if sample_rate != WHISPER_SAMPLE_RATE:
+        audio = signal.resample_poly(audio, WHISPER_SAMPLE_RATE, sample_rate).astype(np.float32)
+    return audio
+
+def _whisper_transcribe_batch(items: List[tuple]) -> List[str]:
+    """Transcribe (audio bytes, language) items in one batched decoder pass.
+    
+    Utterances up to 30 s are padded to one Whisper window and encoded and
+    decoded together, one batch per language; longer audio falls back to the
+    regular sequential transcribe().
+    """
+    from faster_whisper.tokenizer import Tokenizer
+    
+    model = _whisper_model
+    extractor = model.feature_extractor
+    results = [""] * len(items)
+    by_language: Dict[str, List[tuple]] = {}
+    
+    for index, (audio_bytes, language) in enumerate(items):
+        audio = _whisper_audio(audio_bytes)
+        if len(audio) > extractor.n_samples:
+            segments, _ = model.transcribe(audio, language=language, beam_size=1)
+            results[index] = " ".join(segment.text.strip() for segment in segments)
+            continue
+        features = extractor(audio)[:, :extractor.nb_max_frames]
+        features = np.pad(features, ((0, 0), (0, extractor.nb_max_frames - features.shape[1])))
+        by_language.setdefault(language, []).append((index, features))
+        
+    for language, batch in by_language.items():
+        tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual,
+                              task="transcribe", language=language)
+        prompt = model.get_prompt(tokenizer, [], without_timestamps=True)
+        encoder_output = model.encode(np.stack([features for _, features in batch]))
+        generated = model.model.generate(
+            encoder_output, [prompt] * len(batch), beam_size=1,
+            max_length=model.max_length, suppress_blank=True, suppress_tokens=[-1]
+        )
+        for (index, _), result in zip(batch, generated):
+            results[index] = tokenizer.decode(result.sequences_ids[0]).strip()
+            
+    return results
+
+class FasterWhisperSTTBackend(STTBackend):
+    """CPU-local Whisper (faster-whisper / CTranslate2) in a process pool.
+    
+    Each worker process loads the model once. Requests that arrive within
+    batch_window_ms of each other, from any session, are sent to a worker as
+    one batch of up to batch_size utterances.
+    """
+    
+    name = "faster-whisper"
+    
+    def __init__(self, model_size: str = "base.en", compute_type: str = "int8", workers: int = 2,
+                 cpu_threads: int = 0, batch_size: int = 8, batch_window_ms: float = 20):
+        if faster_whisper is None:
+            raise RuntimeError("faster-whisper is not installed")
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.workers = max(1, workers)
+        self.cpu_threads = cpu_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window_ms / 1000
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pending: asyncio.Queue = asyncio.Queue()
+        self.batcher: Optional[asyncio.Task] = None
+        self.busy_workers: Optional[asyncio.Semaphore] = None
+        self.batch_tasks: set = set()
+        self.batches = 0
+        self.transcribed = 0
+        
+    async def start(self):
+        # spawn, not fork: the parent is running an event loop and threads
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_whisper_worker,
+            initargs=(self.model_size, self.compute_type, self.cpu_threads)
+        )
+        self.busy_workers = asyncio.Semaphore(self.workers)
+        self.batcher = asyncio.create_task(self.batch_loop())
+        
+    async def close(self):
+        if self.batcher:
+            self.batcher.cancel()
+            await asyncio.gather(self.batcher, *self.batch_tasks, return_exceptions=True)
+            self.batcher = None
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            
+    async def transcribe(self, audio_bytes: bytes, language: str = "en-US",
+                         priority: int = PRIORITY_NEW_CALL) -> str:
+        if not self.batcher:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.pending.put((audio_bytes, language.split("-")[0], future))
+        return await future
+        
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Hold batches back while every worker is busy so they fill up
+            await self.busy_workers.acquire()
+            batch = [await self.pending.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self.run_batch(batch))
+            self.batch_tasks.add(task)
+            task.add_done_callback(self.batch_tasks.discard)
+            
+    async def run_batch(self, batch: List[tuple]):
+        try:
+            items = [(audio_bytes, language) for audio_bytes, language, _ in batch]
+            texts = await asyncio.get_running_loop().run_in_executor(self.pool, _whisper_transcribe_batch, items)
+            for (_, _, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+            self.batches += 1
+            self.transcribed += len(batch)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.busy_workers.release()
+            
+    def stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "model": self.model_size,
+            "workers": self.workers,
+            "queued": self.pending.qsize(),
+            "batches": self.batches,
+            "transcribed": self.transcribed,
+            "avg_batch_size": round(self.transcribed / self.batches, 2) if self.batches else 0.0
+        }
+
+STT_BACKENDS = {"openai": OpenAISTTBackend, "faster-whisper": FasterWhisperSTTBackend}
+
+def create_stt_backend(config: Dict, client: openai.AsyncOpenAI, scheduler: UpstreamScheduler) -> STTBackend:
+    """Build the configured STT backend, falling back to OpenAI if unavailable"""
+    name = config.get("STT_BACKEND", "openai")
+    if name not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend: {name}")
+    if name == "faster-whisper":
+        if faster_whisper is not None:
+            return FasterWhisperSTTBackend(
+                model_size=config.get("STT_LOCAL_MODEL", "base.en"),
+                compute_type=config.get("STT_LOCAL_COMPUTE_TYPE", "int8"),
+                workers=int(config.get("STT_LOCAL_WORKERS", 2)),
+                cpu_threads=int(config.get("STT_LOCAL_THREADS", 0)),
+                batch_size=int(config.get("STT_BATCH_SIZE", 8)),
+                batch_window_ms=float(config.get("STT_BATCH_WINDOW_MS", 20))
+            )
+        logger.warning("STT backend faster-whisper is not installed, using openai")
+    return OpenAISTTBackend(client, scheduler, config.get("SPEECH_MODEL", "whisper-1"))
+
+def resample_pcm(pcm: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Polyphase-resample 16-bit PCM between sample rates"""
+    if from_rate == to_rate or not len(pcm):
+        return pcm.astype(np.int16)
+    resampled = signal.resample_poly(pcm.astype(np.float32), to_rate, from_rate)
+    return np.clip(resampled, -32768, 32767).astype(np.int16)
+
+class TTSBackend:
+    """Text-to-speech backend interface.
+    
+    synthesize returns one complete clip. "pcm" is headerless 16-bit
+    little-endian mono at sample_rate (the backend's default_sample_rate if
+    not given); "wav" is the same in a WAV container.
+    """
+    
+    name = "base"
+    model = ""
+    default_format = "wav"
+    default_sample_rate = 16000
+    # Set by the engine; resampling runs there instead of on the event loop
+    audio_executor: Optional["AudioExecutor"] = None
+    
+    async def start(self):
+        pass
+        
+    async def close(self):
+        pass
+        
+    async def synthesize(self, text: str, voice: Optional[str] = None, audio_format: Optional[str] = None,
+                         sample_rate: Optional[int] = None, priority: int = PRIORITY_NEW_CALL) -> bytes:
+        raise NotImplementedError
+        
+    def stats(self) -> Dict:
+        return {"backend": self.name, "model": self.model}
+
+class OpenAITTSBackend(TTSBackend):
+    """Hosted OpenAI TTS behind the TTS upstream scheduler"""
+    
+    name = "openai"
+    default_format = "mp3"
+    default_sample_rate = 24000
+    # response_format="pcm" is 24 kHz 16-bit little-endian mono
+    PCM_SAMPLE_RATE = 24000
+    
+    def __init__(self, client: openai.AsyncOpenAI, scheduler: UpstreamScheduler,
+                 model: str = "tts-1", voice: str = "alloy"):
+        self.client = client
+        self.scheduler = scheduler
+        self.model = model
+        self.voice = voice
+        
+    async def synthesize(self, text: str, voice: Optional[str] = None, audio_format: Optional[str] = None,
+                         sample_rate: Optional[int] = None, priority: int = PRIORITY_NEW_CALL) -> bytes:
+        audio_format = audio_format or self.default_format
+        linear = audio_format in ("pcm", "wav") and sample_rate and sample_rate != self.PCM_SAMPLE_RATE
+        response = await self.scheduler.run(
+            lambda: self.client.audio.speech.create(
+                model=self.model,
+                voice=voice or self.voice,
+                input=text,
+                response_format="pcm" if linear else audio_format
+            ),
+            tokens=len(text),
+            priority=priority
+        )
+        if not linear:
+            return response.content
+        pcm = np.frombuffer(response.content, dtype="<i2")
+        if self.audio_executor:
+            pcm = await self.audio_executor.run(resample_pcm, pcm, self.PCM_SAMPLE_RATE, sample_rate)
+        else:
+            pcm = resample_pcm(pcm, self.PCM_SAMPLE_RATE, sample_rate)
+        return pcm.tobytes() if audio_format == "pcm" else pcm_to_wav(pcm, sample_rate)
+
+# Loaded once per worker process by _init_piper_worker
+_piper_voice = None
+
+def _init_piper_worker(model_path: str):
+    global _piper_voice
+    _piper_voice = piper.PiperVoice.load(model_path)
+
+def _piper_synthesize(text: str, sample_rate: int) -> bytes:
+    """Synthesize text to 16-bit PCM at sample_rate in a worker process"""
+    chunks = [
+        resample_pcm(chunk.audio_int16_array, chunk.sample_rate, sample_rate)
+        for chunk in _piper_voice.synthesize(text)
+    ]
+    return np.concatenate(chunks).astype("<i2").tobytes() if chunks else b""
+
+class PiperTTSBackend(TTSBackend):
+    """CPU-local Piper voice synthesized in a process pool.
+    
+    Each worker process loads the voice model once. A Piper model is a single
+    voice, so the voice argument is ignored; only "pcm" and "wav" are produced.
+    """
+    
+    name = "piper"
+    
+    def __init__(self, model_path: str, workers: int = 2, sample_rate: int = 16000):
+        if piper is None:
+            raise RuntimeError("piper-tts is not installed")
+        self.model = model_path
+        self.workers = max(1, workers)
+        self.default_sample_rate = sample_rate
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.synthesized = 0
+        
+    async def start(self):
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_piper_worker,
+            initargs=(self.model,)
+        )
+        
+    async def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            
+    async def synthesize(self, text: str, voice: Optional[str] = None, audio_format: Optional[str] = None,
+                         sample_rate: Optional[int] = None, priority: int = PRIORITY_NEW_CALL) -> bytes:
+        audio_format = audio_format or self.default_format
+        if audio_format not in ("pcm", "wav"):
+            raise ValueError(f"Piper cannot produce {audio_format} audio")
+        if not self.pool:
+            await self.start()
+        sample_rate = sample_rate or self.default_sample_rate
+        pcm = await asyncio.get_running_loop().run_in_executor(self.pool, _piper_synthesize, text, sample_rate)
+        self.synthesized += 1
+        if audio_format == "pcm":
+            return pcm
+        return pcm_to_wav(np.frombuffer(pcm, dtype="<i2"), sample_rate)
+        
+    def stats(self) -> Dict:
+        return {"backend": self.name, "model": self.model, "workers": self.workers, "synthesized": self.synthesized}
+
+TTS_BACKENDS = {"openai": OpenAITTSBackend, "piper": PiperTTSBackend}
+
+def create_tts_backend(config: Dict, client: openai.AsyncOpenAI, scheduler: UpstreamScheduler) -> TTSBackend:
+    """Build the configured TTS backend, falling back to OpenAI if unavailable"""
+    name = config.get("TTS_BACKEND", "openai")
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend: {name}")
+    if name == "piper":
+        if piper is not None and config.get("TTS_PIPER_MODEL"):
+            return PiperTTSBackend(
+                model_path=config["TTS_PIPER_MODEL"],
+                workers=int(config.get("TTS_LOCAL_WORKERS", 2)),
+                sample_rate=int(config.get("TTS_SAMPLE_RATE", 16000))
+            )
+        logger.warning("TTS backend piper is not installed or TTS_PIPER_MODEL is unset, using openai")
+    return OpenAITTSBackend(client, scheduler, config.get("TTS_MODEL", "tts-1"), config.get("TTS_VOICE", "alloy"))
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Rough prompt size (about four characters per token)"""
+    return sum(len(message["content"]) for message in messages) // 4
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """Exact counts with tiktoken when it is installed, else the four-characters rule"""
+    if tiktoken:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text))
+        except Exception as e:
+            # The encoding files are downloaded on first use
+            logger.warning(f"tiktoken unavailable ({e}), estimating tokens")
+    return lambda text: len(text) // 4 + 1
+
+# Tokens the chat format adds around each message's content
+MESSAGE_OVERHEAD_TOKENS = 4
+# Older turns are summarized once at least this many no longer fit
+SUMMARY_MIN_MESSAGES = 4
+SUMMARY_PROMPT = (
+    "Summarize this phone call between a caller and a receptionist in a few "
+    "sentences. Keep names, dates, times, numbers, requests and anything "
+    "promised. Merge it with the earlier summary if there is one."
+)
+
+class ContextWindow:
+    """Builds the chat messages for a turn within a token budget.
+    
+    The rendered system prompt and its token count are cached per (context,
+    PROMPT_VERSION), so every call in a context sends an identical prefix. Each message's token
+    count is computed once and kept on the message. History is filled newest
+    first up to history_tokens and max_messages; older messages the session
+    summary does not cover yet are returned so they can be summarized.
+    """
+    
+    def __init__(self, render_prompt: Callable[[str], str], history_tokens: int = 1000,
+                 max_messages: int = 10, model: str = "gpt-3.5-turbo"):
+        self.render_prompt = render_prompt
+        self.history_tokens = history_tokens
+        self.max_messages = max_messages
+        self.count = token_counter(model)
+        self.prompts: Dict[tuple, tuple] = {}
+        
+    def prefix(self, context: str) -> tuple:
+        """(rendered system prompt, its token count), computed once per context"""
+        key = (context, PROMPT_VERSION)
+        prefix = self.prompts.get(key)
+        if prefix is None:
+            prompt = self.render_prompt(context)
+            prefix = self.prompts[key] = (prompt, self.count(prompt) + MESSAGE_OVERHEAD_TOKENS)
+        return prefix
+        
+    def system_prompt(self, context: str) -> str:
+        return self.prefix(context)[0]
+        
+    def message_tokens(self, message: Dict) -> int:
+        tokens = message.get("tokens")
+        if tokens is None:
+            tokens = message["tokens"] = self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        return tokens
+        
+    def build(self, session: ConversationSession, user_input: str) -> tuple:
+        """Return (chat messages, unsummarized messages that did not fit)"""
+        pending = [message for message in session.messages if not session.is_summarized(message)]
+        # The turn's user message is normally already in the session
+        if not pending or pending[-1]["role"] != "user" or pending[-1]["content"] != user_input:
+            pending.append({"role": "user", "content": user_input})
+            
+        budget = self.history_tokens
+        start = len(pending)
+        while start > 0 and len(pending) - start < self.max_messages:
+            tokens = self.message_tokens(pending[start - 1])
+            # The newest message is always sent
+            if tokens > budget and start < len(pending):
+                break
+            budget -= tokens
+            start -= 1
+            
+        call_details = f"The caller's phone number is {session.phone_number}."
+        if session.summary:
+            call_details += f" Summary of the call so far: {session.summary}"
+        messages = [
+            {"role": "system", "content": self.system_prompt(session.context)},
+            {"role": "system", "content": call_details}
+        ]
+        messages.extend({"role": message["role"], "content": message["content"]} for message in pending[start:])
+        return messages, pending[:start]
+
+# Multiplexed audio from ai-freeswitch on /ws/mux. Every call's chunks share
+# one connection as audio frames keyed by session id, numbered per session.
+# Chunks are acknowledged in batches every MUX_ACK_INTERVAL so the client can
+# bound what it has in flight and resend the rest after reconnecting. Replies
+# go to whichever connection last carried the session; those that find no
+# open connection wait in a short per-session outbox for the client to resume.
+MUX_ACK_INTERVAL = 0.05
+MUX_OUTBOX_SIZE = 16
+
+def stream_trace_id(session_id: str, sequence: int) -> str:
+    """Trace id of a chunk sent on /ws/mux; ai-freeswitch derives the same one"""
+    return f"{session_id}-{sequence}"
+
+class MuxConnection:
+    """One /ws/mux connection; sends are serialized so audio follows its message"""
+    
+    def __init__(self, websocket: WebSocket, sample_rate: int = 24000):
+        self.websocket = websocket
+        self.sample_rate = sample_rate
+        self.lock = asyncio.Lock()
+        # Highest accepted sequence per session, not yet acknowledged
+        self.acks: Dict[str, int] = {}
+        self.closed = False
+        
+    async def send(self, message: Dict, audio: Optional[bytes] = None, audio_format: str = "wav"):
+        """Send a message, followed by its audio as a binary frame with the same session and sequence"""
+        async with self.lock:
+            await self.websocket.send_text(json.dumps({**message, "audio": audio is not None}))
+            if audio is not None:
+                await self.websocket.send_bytes(encode_audio_frame(
+                    message["session_id"], message["sequence"], audio_format, self.sample_rate, audio
+                ))
+                
+    async def flush_acks(self):
+        if not self.acks:
+            return
+        acks, self.acks = self.acks, {}
+        async with self.lock:
+            await self.websocket.send_text(json.dumps({"type": "ack", "sessions": acks}))
+
+# With WORKERS > 1 every session belongs to one worker, which holds its
+# in-process state (in-flight turn, VAD detector, mux sequences and outbox,
+# cached session). Other workers forward the session's requests to the owner
+# over the owner's private unix socket.
+FORWARDED_HEADER = "X-Engine-Forwarded"
+
+def session_owner(session_id: str, workers: int) -> int:
+    """Index of the worker that owns a session; the same in every process"""
+    if workers <= 1:
+        return 0
+    return zlib.crc32(session_id.encode()) % workers
+
+def worker_socket_path(config: Dict, index: int) -> str:
+    """Private unix socket of one worker, for requests about the sessions it owns"""
+    return os.path.join(config.get("WORKER_SOCKET_DIR") or "/tmp", f"ai-engine-{config['PORT']}-{index}.sock")
+
+class MuxRelay:
+    """Internal /ws/mux connection to the worker that owns some of a client's sessions
+    
+    Chunks for those sessions are passed on unchanged. What the owner sends
+    back (replies and their audio frames, acknowledgements) is passed to the
+    client connection under its lock, so audio still follows its message.
+    """
+    
+    def __init__(self, path: str, connection: MuxConnection):
+        self.path = path
+        self.connection = connection
+        self.sessions: set = set()
+        self.websocket = None
+        self.reader: Optional[asyncio.Task] = None
+        
+    @property
+    def closed(self) -> bool:
+        return self.websocket is None or self.websocket.closed or (self.reader is not None and self.reader.done())
+        
+    async def open(self, hello: Dict) -> Dict:
+        """Connect and resume sessions on the owner; returns the owner's hello reply"""
+        self.websocket = await websockets.unix_connect(self.path, uri="ws://worker/ws/mux", max_size=None)
+        await self.websocket.send(json.dumps(hello))
+        return json.loads(await self.websocket.recv())
+        
+    def start(self):
+        """Start passing the owner's messages to the client"""
+        if self.reader is None:
+            self.reader = asyncio.create_task(self.relay_replies())
+            
+    async def relay_replies(self):
+        try:
+            async for message in self.websocket:
+                audio = await self.websocket.recv() if isinstance(message, str) and json.loads(message).get("audio") else None
+                async with self.connection.lock:
+                    if isinstance(message, str):
+                        await self.connection.websocket.send_text(message)
+                    else:
+                        await self.connection.websocket.send_bytes(message)
+                    if audio is not None:
+                        await self.connection.websocket.send_bytes(audio)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.warning(f"Mux relay to {self.path} failed: {e}")
+            
+    async def send(self, data: Union[str, bytes]):
+        await self.websocket.send(data)
+        
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+            await asyncio.gather(self.reader, return_exceptions=True)
+        if self.websocket:
+            await self.websocket.close()
 
 class AIEngine:
     """Main AI Engine class handling all AI processing"""
@@ -71,7 +2090,102 @@ class AIEngine:
         self.config = config
         self.redis = None
         self.openai_client = openai.AsyncOpenAI(api_key=config.get("OPENAI_API_KEY"))
-        self.speech_recognizer = sr.Recognizer()
+        
+        # In-process session cache in front of Redis; replicas stay coherent
+        # through invalidation messages on SESSION_INVALIDATION_CHANNEL
+        cache_size = int(config.get("SESSION_CACHE_SIZE", 1000))
+        self.session_cache = SessionCache(cache_size, float(config.get("SESSION_CACHE_TTL", 300))) if cache_size > 0 else None
+        self.session_write_mode = config.get("SESSION_WRITE_MODE", "write-through")
+        self.history_window = int(config.get("SESSION_HISTORY_WINDOW", 10))
+        
+        # Chat history within a token budget; turns that drop out are summarized
+        self.context_window = ContextWindow(
+            self.build_system_prompt,
+            history_tokens=int(config.get("CONTEXT_HISTORY_TOKENS", 1000)),
+            max_messages=self.history_window,
+            model=config.get("MODEL_NAME", "gpt-3.5-turbo")
+        )
+        self.summaries_enabled = config.get("CONTEXT_SUMMARY_ENABLED", True)
+        self.summary_max_tokens = int(config.get("CONTEXT_SUMMARY_MAX_TOKENS", 150))
+        self.summary_tasks: Dict[str, asyncio.Task] = {}
+        self.session_codec = get_session_codec(config.get("SESSION_CODEC", "json"))
+        self.instance_id = uuid4().hex
+        self.dirty_sessions: Dict[str, ConversationSession] = {}
+        self.background_tasks: List[asyncio.Task] = []
+        
+        # Optional pool of pre-created sessions so creation skips Redis;
+        # the call details of a bound shell are written in the background
+        pool_size = int(config.get("SESSION_POOL_SIZE", 0))
+        self.session_pool = SessionPool(
+            config.get("SESSION_POOL_CONTEXTS") or ["receptionist"],
+            size=pool_size,
+            max_age=float(config.get("SESSION_POOL_MAX_AGE", SESSION_TTL / 2))
+        ) if pool_size > 0 else None
+        self.binding_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Synthesized speech cache; fixed phrases are pre-rendered on startup
+        self.tts_cache = TTSCache(
+            max_memory_bytes=int(float(config.get("TTS_CACHE_MEMORY_MB", 32)) * 1024 * 1024),
+            backend=config.get("TTS_CACHE_BACKEND", "memory"),
+            directory=config.get("TTS_CACHE_DIR", "/tmp/ai-engine-tts-cache"),
+            max_backend_bytes=int(float(config.get("TTS_CACHE_MAX_MB", 512)) * 1024 * 1024)
+        ) if config.get("TTS_CACHE_ENABLED", True) else None
+        
+        # Optional cache of replies to common questions
+        self.response_cache = ResponseCache(
+            similarity_threshold=float(config.get("RESPONSE_CACHE_THRESHOLD", 0.9)),
+            default_ttl=float(config.get("RESPONSE_CACHE_TTL", 3600)),
+            context_ttls=config.get("RESPONSE_CACHE_CONTEXT_TTLS") or {},
+            max_entries=int(config.get("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+        ) if config.get("RESPONSE_CACHE_ENABLED", False) else None
+        
+        # One scheduler per upstream API
+        self.upstreams = {
+            name: UpstreamScheduler(
+                name,
+                max_concurrency=int(config.get(f"UPSTREAM_{name.upper()}_CONCURRENCY", concurrency)),
+                tokens_per_minute=float(config.get(f"UPSTREAM_{name.upper()}_TPM", per_minute)),
+                max_queue=int(config.get(f"UPSTREAM_{name.upper()}_QUEUE", queue)),
+                timeout=float(config.get(f"UPSTREAM_{name.upper()}_TIMEOUT", timeout))
+            )
+            for name, (concurrency, per_minute, queue, timeout) in UPSTREAM_DEFAULTS.items()
+        }
+        
+        # CPU-bound audio work (decoding, resampling) runs off the event loop
+        self.audio_executor = AudioExecutor(
+            mode=config.get("AUDIO_EXECUTOR", "thread"),
+            workers=int(config.get("AUDIO_EXECUTOR_WORKERS", 4)),
+            min_offload_bytes=int(config.get("AUDIO_OFFLOAD_MIN_BYTES", 65536))
+        )
+        
+        # Speech-to-text backend (hosted or CPU-local), chosen per deployment
+        self.stt_backend = create_stt_backend(config, self.openai_client, self.upstreams["stt"])
+        self.tts_backend = create_tts_backend(config, self.openai_client, self.upstreams["tts"])
+        self.tts_backend.audio_executor = self.audio_executor
+        
+        # In-flight turn per session, cancelled when the caller barges in
+        self.active_turns: Dict[str, asyncio.Task] = {}
+        self.barge_in_enabled = config.get("BARGE_IN_ENABLED", True)
+        
+        # Sessions carried on /ws/mux: current connection, last accepted
+        # sequence and replies waiting for the client to reconnect
+        self.mux_routes: Dict[str, MuxConnection] = {}
+        self.mux_sequences: Dict[str, int] = {}
+        self.mux_outbox: Dict[str, Deque[tuple]] = {}
+        
+        # Sessions are owned by one worker (session_owner); requests about
+        # another worker's sessions are forwarded to it over its unix socket
+        self.workers = int(config.get("WORKERS", 1))
+        self.worker_index = int(config.get("WORKER_INDEX", 0))
+        self.worker_clients: Dict[int, httpx.AsyncClient] = {}
+        
+        # Set on SIGTERM: no new sessions, open call streams run to completion
+        self.draining = False
+        self.open_streams = 0
+        
+        # Per-session endpointing state; audio only reaches STT as whole utterances
+        self.vad_enabled = config.get("VAD_ENABLED", False)
+        self.vad_detectors: Dict[str, VoiceActivityDetector] = {}
         
         # Initialize FastAPI app
         self.app = FastAPI(title="AI Engine", version="1.0.0")
@@ -94,12 +2208,52 @@ class AIEngine:
         @self.app.on_event("startup")
         async def startup():
             await self.initialize_redis()
+            await self.audio_executor.start()
+            await self.stt_backend.start()
+            await self.tts_backend.start()
+            if self.tts_cache:
+                self.tts_cache.redis = self.redis
+                if self.config.get("TTS_CACHE_PREWARM", True):
+                    self.background_tasks.append(asyncio.create_task(self.prewarm_tts_cache()))
+            if self.session_pool:
+                self.background_tasks.append(asyncio.create_task(self.session_pool_loop()))
+            if self.redis and self.session_cache:
+                self.background_tasks.append(asyncio.create_task(self.listen_for_invalidations()))
+                if self.session_write_mode == "write-behind":
+                    self.background_tasks.append(asyncio.create_task(self.write_behind_loop()))
             
         @self.app.on_event("shutdown")
         async def shutdown():
+            for task in [*self.background_tasks, *self.summary_tasks.values()]:
+                task.cancel()
+            await asyncio.gather(*self.background_tasks, *self.summary_tasks.values(), return_exceptions=True)
+            self.background_tasks = []
+            await asyncio.gather(*self.binding_tasks.values(), return_exceptions=True)
+            await self.drain_session_pool()
+            await self.flush_dirty_sessions()
+            await self.stt_backend.close()
+            await self.tts_backend.close()
+            await self.audio_executor.close()
+            for client in self.worker_clients.values():
+                await client.aclose()
             if self.redis:
                 await self.redis.close()
                 
+        @self.app.get("/stats")
+        async def stats():
+            return {
+                "session_cache": self.session_cache.stats() if self.session_cache else None,
+                "session_write_mode": self.session_write_mode,
+                "dirty_sessions": len(self.dirty_sessions),
+                "session_pool": self.session_pool.stats() if self.session_pool else None,
+                "tts_cache": self.tts_cache.stats() if self.tts_cache else None,
+                "response_cache": self.response_cache.stats() if self.response_cache else None,
+                "upstreams": {name: scheduler.stats() for name, scheduler in self.upstreams.items()},
+                "stt": self.stt_backend.stats(),
+                "tts": self.tts_backend.stats(),
+                "audio_executor": self.audio_executor.stats()
+            }
+            
         @self.app.get("/health")
         async def health_check():
             return {"status": "healthy", "timestamp": datetime.now().isoformat()}
@@ -107,32 +2261,88 @@ class AIEngine:
         @self.app.get("/ready")
         async def readiness_check():
             """Check if the service is ready to accept traffic"""
+            if self.draining:
+                return JSONResponse(status_code=503, content={
+                    "status": "draining", "open_streams": self.open_streams, "timestamp": datetime.now().isoformat()
+                })
             try:
                 # Check Redis connection
-                if self.redis:
-                    await self.redis.ping()
-                    return {"status": "ready", "redis": "connected", "timestamp": datetime.now().isoformat()}
-                else:
-                    return {"status": "not_ready", "redis": "disconnected", "timestamp": datetime.now().isoformat()}, 503
+                if not self.redis:
+                    return JSONResponse(status_code=503, content={
+                        "status": "not_ready", "redis": "disconnected", "timestamp": datetime.now().isoformat()
+                    })
+                await self.redis.ping()
+                
+                # Shed new traffic while any upstream queue is full
+                saturated = [name for name, scheduler in self.upstreams.items() if scheduler.saturated]
+                if saturated:
+                    return JSONResponse(status_code=503, content={
+                        "status": "not_ready", "saturated": saturated, "timestamp": datetime.now().isoformat()
+                    })
+                    
+                return {"status": "ready", "redis": "connected", "timestamp": datetime.now().isoformat()}
             except Exception as e:
                 logger.error(f"Readiness check failed: {e}")
-                return {"status": "not_ready", "error": str(e), "timestamp": datetime.now().isoformat()}, 503
+                return JSONResponse(status_code=503, content={
+                    "status": "not_ready", "error": str(e), "timestamp": datetime.now().isoformat()
+                })
             
         @self.app.post("/session/create")
         async def create_session(request: CreateSessionRequest):
             return await self.create_conversation_session(request)
             
         @self.app.get("/session/{session_id}")
-        async def get_session(session_id: str):
+        async def get_session(session_id: str, request: Request):
+            forwarded = await self.forward_to_owner(session_id, request)
+            if forwarded:
+                return forwarded
             return await self.get_conversation_session(session_id)
             
         @self.app.delete("/session/{session_id}")
-        async def delete_session(session_id: str):
+        async def delete_session(session_id: str, request: Request):
+            forwarded = await self.forward_to_owner(session_id, request)
+            if forwarded:
+                return forwarded
             return await self.cleanup_session(session_id)
             
         @self.app.post("/process")
-        async def process_audio(request: ProcessAudioRequest):
-            return await self.process_audio_chunk(request)
+        async def process_audio(request: ProcessAudioRequest, http_request: Request, response: Response):
+            forwarded = await self.forward_to_owner(request.session_id, http_request)
+            if forwarded:
+                return forwarded
+            with turn_trace(http_request.headers.get(TRACE_HEADER)) as trace:
+                response.headers[TRACE_HEADER] = trace.trace_id
+                return await self.run_turn(request.session_id, self.process_audio_chunk(request))
+                
+        @self.app.post("/process/frame")
+        async def process_audio_frame(request: Request, response: Response):
+            """Process a binary audio frame; the frame id is the session id"""
+            try:
+                frame = decode_audio_frame(await request.body())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            forwarded = await self.forward_to_owner(frame.session_id, request)
+            if forwarded:
+                return forwarded
+            with turn_trace(request.headers.get(TRACE_HEADER)) as trace:
+                response.headers[TRACE_HEADER] = trace.trace_id
+                return await self.run_turn(frame.session_id, self.process_audio_chunk(
+                    frame, response_format=request.query_params.get("response_format")
+                ))
+                
+        @self.app.get("/metrics")
+        async def metrics(request: Request):
+            """Prometheus metrics, including per-stage turn latency"""
+            body, content_type = render_metrics(request.headers.get("accept", ""))
+            return Response(content=body, media_type=content_type)
+            
+        @self.app.post("/session/{session_id}/barge_in")
+        async def barge_in(session_id: str, http_request: Request, request: Optional[BargeInRequest] = None):
+            """The caller started talking over the reply: stop work on it"""
+            forwarded = await self.forward_to_owner(session_id, http_request)
+            if forwarded:
+                return forwarded
+            return await self.barge_in(session_id, request.played_ms if request else None)
             
         @self.app.post("/transcribe")
         async def transcribe_audio(request: TranscribeRequest):
@@ -140,12 +2350,21 @@ class AIEngine:
             
         @self.app.post("/synthesize")
         async def synthesize_speech(request: SynthesizeRequest):
+            if request.stream:
+                return StreamingResponse(
+                    self.stream_speech_pcm(request.text, request.voice, request.sample_rate),
+                    media_type=f"audio/L16; rate={request.sample_rate}; channels=1"
+                )
             return await self.text_to_speech(request)
             
         @self.app.websocket("/ws/stream")
         async def websocket_stream(websocket: WebSocket):
             await self.handle_audio_stream(websocket)
             
+        @self.app.websocket("/ws/mux")
+        async def websocket_mux(websocket: WebSocket):
+            await self.handle_stream_mux(websocket)
+            
     async def initialize_redis(self):
         """Initialize Redis connection for session storage"""
         try:
@@ -158,79 +2377,464 @@ class AIEngine:
             
     async def create_conversation_session(self, request: CreateSessionRequest) -> Dict:
         """Create a new conversation session"""
-        session_id = str(uuid4())
-        
-        session = ConversationSession(
-            session_id=session_id,
-            call_id=request.call_id,
-            phone_number=request.phone_number,
-            context=request.context,
-            language=request.language,
-            created_at=datetime.now(),
-            last_activity=datetime.now()
-        )
-        
-        # Store session in Redis
-        if self.redis:
-            await self.redis.setex(
-                f"session:{session_id}",
-                3600,  # 1 hour TTL
-                json.dumps(asdict(session), default=str)
+        if self.draining:
+            raise HTTPException(status_code=503, detail="Worker is draining")
+            
+        session = self.session_pool.take(request.context) if self.session_pool else None
+        if session:
+            # A pooled shell is already stored; only the call details are new
+            session.call_id = request.call_id
+            session.phone_number = request.phone_number
+            session.language = request.language
+            session.created_at = session.last_activity = datetime.now()
+            if self.redis:
+                task = asyncio.create_task(self.store_session_binding(session))
+                self.binding_tasks[session.session_id] = task
+                task.add_done_callback(lambda done: self.binding_tasks.pop(session.session_id, None))
+        else:
+            session = ConversationSession(
+                session_id=self.new_session_id(),
+                call_id=request.call_id,
+                phone_number=request.phone_number,
+                context=request.context,
+                language=request.language,
+                created_at=datetime.now(),
+                last_activity=datetime.now()
             )
             
+            # Store session in Redis
+            if self.redis:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hset(session_meta_key(session.session_id), mapping=session_to_metadata(session, self.session_codec))
+                    pipe.expire(session_meta_key(session.session_id), SESSION_TTL)
+                    await pipe.execute()
+        session_id = session.session_id
+        if self.session_cache:
+            self.session_cache.put(session)
+            
         logger.info(f"Created session {session_id} for call {request.call_id}")
         
         return {
             "session_id": session_id,
             "status": "created",
-            "welcome_message": "Hello! How can I help you today?"
+            "welcome_message": WELCOME_MESSAGE
         }
         
+    async def store_session_binding(self, session: ConversationSession):
+        """Write a bound shell's call details over its pooled metadata"""
+        try:
+            meta_key = session_meta_key(session.session_id)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(meta_key, mapping=session_to_metadata(session, self.session_codec))
+                pipe.expire(meta_key, SESSION_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error storing session {session.session_id}: {e}")
+            
+    def new_session_id(self) -> str:
+        """A new session id that this worker owns"""
+        while True:
+            session_id = str(uuid4())
+            if self.owns_session(session_id):
+                return session_id
+                
+    def owns_session(self, session_id: str) -> bool:
+        return session_owner(session_id, self.workers) == self.worker_index
+        
+    async def forward_to_owner(self, session_id: str, request: Request) -> Optional[Response]:
+        """Pass a request about another worker's session to that worker
+        
+        Returns the owner's response, or None when the request is handled
+        here: this worker owns the session, the request was already
+        forwarded once, or the owner cannot be reached (it is restarting and
+        its in-process state for the session is gone anyway).
+        """
+        if self.owns_session(session_id) or request.headers.get(FORWARDED_HEADER):
+            return None
+        owner = session_owner(session_id, self.workers)
+        client = self.worker_clients.get(owner)
+        if client is None:
+            client = self.worker_clients[owner] = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=worker_socket_path(self.config, owner)),
+                base_url="http://worker",
+                timeout=None
+            )
+        headers = {name: request.headers[name] for name in ("content-type", TRACE_HEADER) if name in request.headers}
+        headers[FORWARDED_HEADER] = str(self.worker_index)
+        try:
+            response = await client.request(
+                request.method, request.url.path, params=request.query_params,
+                content=await request.body(), headers=headers
+            )
+        except httpx.TransportError as e:
+            logger.warning(f"Worker {owner} unreachable for session {session_id}, handling it here: {e}")
+            return None
+        return Response(
+            content=response.content,
+            status_code=response.status_code,
+            headers={name: response.headers[name] for name in ("content-type", TRACE_HEADER) if name in response.headers}
+        )
+        
+    def new_session_shell(self, context: str) -> ConversationSession:
+        now = datetime.now()
+        return ConversationSession(
+            session_id=self.new_session_id(),
+            call_id="",
+            phone_number="",
+            context=context,
+            language="en-US",
+            created_at=now,
+            last_activity=now
+        )
+        
+    async def refill_session_pool(self):
+        """Retire stale shells and top every context back up, in one Redis round trip each"""
+        retired = self.session_pool.retire_expired()
+        shells = [
+            self.new_session_shell(context)
+            for context, count in self.session_pool.missing().items() for _ in range(count)
+        ]
+        if self.redis and (retired or shells):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for shell in retired:
+                    pipe.delete(session_meta_key(shell.session_id))
+                for shell in shells:
+                    pipe.hset(session_meta_key(shell.session_id), mapping=session_to_metadata(shell, self.session_codec))
+                    pipe.expire(session_meta_key(shell.session_id), SESSION_TTL)
+                await pipe.execute()
+        self.session_pool.add(shells)
+        
+    async def session_pool_loop(self):
+        """Warm each pooled context once, then keep the pool at its target size"""
+        for context in self.session_pool.shells:
+            self.context_window.prefix(context)
+        if self.tts_cache:
+            await self.text_to_speech_bytes(WELCOME_MESSAGE)
+            
+        while True:
+            self.session_pool.refill_needed.clear()
+            try:
+                await self.refill_session_pool()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refilling session pool: {e}")
+            try:
+                # Bursts are refilled as they drain; idle pools are checked for stale shells
+                await asyncio.wait_for(self.session_pool.refill_needed.wait(), 60)
+            except asyncio.TimeoutError:
+                pass
+                
+    async def drain_session_pool(self):
+        """Delete the stored metadata of shells that were never used"""
+        shells = self.session_pool.drain() if self.session_pool else []
+        if self.redis and shells:
+            try:
+                await self.redis.delete(*(session_meta_key(shell.session_id) for shell in shells))
+            except Exception as e:
+                logger.error(f"Error deleting pooled sessions: {e}")
+                
     async def get_conversation_session(self, session_id: str) -> Optional[ConversationSession]:
-        """Retrieve conversation session from storage"""
+        """Retrieve conversation session from the local cache or storage"""
+        if self.session_cache:
+            session = self.session_cache.get(session_id)
+            if session:
+                return session
+                
+        # Evicted from the cache but not yet written back
+        session = self.dirty_sessions.get(session_id)
+        if session:
+            return session
+            
         if not self.redis:
             return None
             
         try:
-            session_data = await self.redis.get(f"session:{session_id}")
-            if session_data:
-                data = json.loads(session_data)
-                return ConversationSession(**data)
+            # Only the recent history window is loaded; older turns stay in Redis
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(session_meta_key(session_id))
+                pipe.lrange(session_messages_key(session_id), -self.history_window, -1)
+                metadata, messages = await pipe.execute()
+            if metadata:
+                session = session_from_storage(metadata, messages, self.session_codec)
+                if self.summaries_enabled:
+                    await self.load_unsummarized_history(session)
+                if self.session_cache:
+                    self.session_cache.put(session)
+                return session
         except Exception as e:
             logger.error(f"Error retrieving session {session_id}: {e}")
             
         return None
         
+    async def load_unsummarized_history(self, session: ConversationSession):
+        """Extend the loaded history back to the first message the summary covers.
+        
+        Turns older than the history window that are not summarized yet (the
+        summary is still running, was shed or failed) are still needed to
+        build the context and to summarize them later.
+        """
+        key = session_messages_key(session.session_id)
+        end = -len(session.messages) - 1
+        while session.messages and not session.is_summarized(session.messages[0]):
+            older = await self.redis.lrange(key, end - self.history_window + 1, end)
+            if not older:
+                break
+            session.messages[:0] = [self.session_codec.loads(message) for message in older]
+            end -= len(older)
+        session.stored_message_count = len(session.messages)
+        
     async def save_conversation_session(self, session: ConversationSession):
-        """Save conversation session to storage"""
+        """Save conversation session to storage
+        
+        In write-behind mode the session is only marked dirty here and
+        written by write_behind_loop, coalescing several turns into one write.
+        """
+        session.last_activity = datetime.now()
+        if self.session_cache:
+            self.session_cache.put(session)
+            
         if not self.redis:
             return
             
+        if self.session_cache and self.session_write_mode == "write-behind":
+            self.dirty_sessions[session.session_id] = session
+            return
+            
+        await self.write_session(session)
+        
+    async def write_session(self, session: ConversationSession):
+        """Persist a session to Redis and tell other replicas to drop their copy
+        
+        Only messages added since the last write are appended; metadata and
+        TTLs are refreshed in the same pipelined round trip.
+        """
         try:
-            session.last_activity = datetime.now()
-            await self.redis.setex(
-                f"session:{session.session_id}",
-                3600,
-                json.dumps(asdict(session), default=str)
-            )
+            new_messages = session.messages[session.stored_message_count:]
+            meta_key = session_meta_key(session.session_id)
+            messages_key = session_messages_key(session.session_id)
+            
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if new_messages:
+                    pipe.rpush(messages_key, *[self.session_codec.dumps(message) for message in new_messages])
+                pipe.hset(meta_key, mapping=session_to_metadata(session, self.session_codec))
+                pipe.expire(meta_key, SESSION_TTL)
+                pipe.expire(messages_key, SESSION_TTL)
+                await pipe.execute()
+                
+            session.stored_message_count = len(session.messages)
+            
+            # Keep only the history window in memory for long calls; turns the
+            # summary does not cover yet stay until it does
+            overflow = len(session.messages) - 2 * self.history_window
+            if self.summaries_enabled:
+                unsummarized = next(
+                    (index for index, message in enumerate(session.messages) if not session.is_summarized(message)),
+                    len(session.messages)
+                )
+                overflow = min(overflow, unsummarized)
+            if overflow > 0:
+                del session.messages[:overflow]
+                session.stored_message_count -= overflow
+                
+            if self.session_cache:
+                await self.publish_invalidation(session.session_id)
         except Exception as e:
             logger.error(f"Error saving session {session.session_id}: {e}")
             
-    async def process_audio_chunk(self, request: ProcessAudioRequest) -> Dict:
-        """Process incoming audio chunk and return AI response"""
-        session = await self.get_conversation_session(request.session_id)
+    async def flush_dirty_sessions(self):
+        """Write all sessions pending in write-behind mode"""
+        if not self.redis:
+            return
+        while self.dirty_sessions:
+            _, session = self.dirty_sessions.popitem()
+            await self.write_session(session)
+            
+    async def write_behind_loop(self):
+        """Periodically flush dirty sessions to Redis"""
+        interval = float(self.config.get("SESSION_WRITE_BEHIND_INTERVAL", 0.5))
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_dirty_sessions()
+            
+    async def publish_invalidation(self, session_id: str):
+        """Notify other replicas that their cached copy of a session is stale"""
+        try:
+            await self.redis.publish(SESSION_INVALIDATION_CHANNEL, json.dumps({
+                "session_id": session_id,
+                "origin": self.instance_id
+            }))
+        except Exception as e:
+            logger.error(f"Error publishing invalidation for {session_id}: {e}")
+            
+    def handle_invalidation(self, data) -> bool:
+        """Apply an invalidation message published by another replica"""
+        message = json.loads(data)
+        if message.get("origin") == self.instance_id:
+            return False
+        self.dirty_sessions.pop(message["session_id"], None)
+        return self.session_cache.invalidate(message["session_id"])
+        
+    async def listen_for_invalidations(self):
+        """Subscribe to session invalidations from other replicas"""
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(SESSION_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    self.handle_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Session invalidation listener stopped: {e}")
+        finally:
+            await pubsub.reset()
+            
+    async def decode_request_audio(self, request: Union[ProcessAudioRequest, AudioFrame], want_pcm: bool = True) -> tuple:
+        """Decode a JSON request's or binary frame's audio on the audio executor.
+        
+        Returns (bytes for STT, int16 PCM or None, sample rate or None).
+        """
+        if isinstance(request, AudioFrame):
+            return await self.audio_executor.run(decode_frame_audio, request, size=len(request.payload))
+        return await self.audio_executor.run(decode_audio_payload, request.audio_data, want_pcm)
+        
+    async def endpoint_request_audio(self, request: Union[ProcessAudioRequest, AudioFrame]) -> Optional[bytes]:
+        """Return audio ready for STT, or None while an utterance is still open.
+        
+        With VAD enabled, PCM is buffered per session and only complete
+        utterances (trailing silence trimmed) are returned. Audio that cannot
+        be decoded to PCM, such as MP3, is passed through unchanged.
+        """
+        audio_bytes, pcm, sample_rate = await self.decode_request_audio(request, want_pcm=self.vad_enabled)
+        if not self.vad_enabled or pcm is None:
+            return audio_bytes
+            
+        detector = self.vad_detectors.get(request.session_id)
+        if detector is None or detector.sample_rate != sample_rate:
+            detector = VoiceActivityDetector(
+                sample_rate=sample_rate,
+                hangover_ms=int(self.config.get("VAD_HANGOVER_MS", 600)),
+                energy_threshold_db=float(self.config.get("VAD_ENERGY_THRESHOLD_DB", -45)),
+                min_speech_ms=int(self.config.get("VAD_MIN_SPEECH_MS", 200)),
+                max_utterance_ms=int(self.config.get("VAD_MAX_UTTERANCE_MS", 15000))
+            )
+            self.vad_detectors[request.session_id] = detector
+            
+        # Detector state is per session, so it stays on the event loop
+        utterances = detector.feed(pcm)
+        if not utterances:
+            return None
+        return await self.audio_executor.run(pcm_to_wav, np.concatenate(utterances), sample_rate)
+        
+    async def request_contains_speech(self, request: Union[ProcessAudioRequest, AudioFrame]) -> bool:
+        """Whether a chunk carries caller speech; audio that is not PCM never does"""
+        if isinstance(request, AudioFrame):
+            pcm, sample_rate = audio_frame_to_pcm(request), request.sample_rate
+        else:
+            _, pcm, sample_rate = await self.decode_request_audio(request)
+        if pcm is None:
+            return False
+        return await self.audio_executor.run(
+            contains_speech,
+            pcm, sample_rate,
+            float(self.config.get("BARGE_IN_THRESHOLD_DB", -35)),
+            int(self.config.get("BARGE_IN_MIN_SPEECH_MS", 120))
+        )
+        
+    def start_turn(self, session_id: str, coro: Awaitable) -> asyncio.Task:
+        """Run one conversational turn as a task that barge-in can cancel"""
+        task = asyncio.create_task(coro)
+        self.active_turns[session_id] = task
+        task.add_done_callback(
+            lambda done: self.active_turns.pop(session_id, None) if self.active_turns.get(session_id) is done else None
+        )
+        return task
+        
+    async def run_turn(self, session_id: str, coro: Awaitable) -> Dict:
+        """Run a turn for a request handler; a barged-in turn answers "interrupted" """
+        task = self.start_turn(session_id, coro)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if not task.cancelled() or asyncio.current_task().cancelling():
+                raise
+            return {"status": "interrupted", "session_id": session_id}
+            
+    async def barge_in(self, session_id: str, played_ms: Optional[int] = None) -> Dict:
+        """Cancel the session's in-flight turn (LLM, TTS, pending audio) and record the cut-off"""
+        task = self.active_turns.get(session_id)
+        cancelled = task is not None and not task.done()
+        if cancelled:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.mark_interrupted(session_id, played_ms)
+        logger.info(f"Session {session_id}: barge-in (cancelled turn: {cancelled}, played {played_ms} ms)")
+        return {"status": "interrupted", "session_id": session_id, "cancelled": cancelled}
+        
+    async def record_interrupted_reply(self, session: ConversationSession, text: str):
+        """Store the part of a reply that was produced before the turn was cancelled"""
+        if session.messages and session.messages[-1]["role"] == "user":
+            session.messages.append({
+                "role": "assistant",
+                "content": text,
+                "timestamp": datetime.now().isoformat(),
+                "interrupted": True
+            })
+            await self.save_conversation_session(session)
+            
+    async def mark_interrupted(self, session_id: str, played_ms: Optional[int] = None):
+        """Flag the latest assistant message as cut off, with how much was heard"""
+        session = await self.get_conversation_session(session_id)
+        if not session:
+            return
+        index = next((i for i in range(len(session.messages) - 1, -1, -1)
+                      if session.messages[i]["role"] == "assistant"), None)
+        if index is None:
+            return
+            
+        message = session.messages[index]
+        message["interrupted"] = True
+        if played_ms is not None:
+            message["played_ms"] = played_ms
+        # Already in the append-only Redis list: rewrite that one entry in place
+        if index < session.stored_message_count and self.redis:
+            try:
+                await self.redis.lset(
+                    session_messages_key(session_id), index - session.stored_message_count,
+                    self.session_codec.dumps(message)
+                )
+            except Exception as e:
+                logger.error(f"Error recording interruption for {session_id}: {e}")
+        await self.save_conversation_session(session)
+        
+    async def process_audio_chunk(self, request: Union[ProcessAudioRequest, AudioFrame],
+                                  encode_audio: bool = True, response_format: Optional[str] = None) -> Dict:
+        """Process incoming audio chunk and return AI response
+        
+        With encode_audio=False the response audio is returned as raw bytes,
+        for transports that carry it in a binary frame.
+        """
+        with timed_stage("redis_get"):
+            session = await self.get_conversation_session(request.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
             
+        ai_response = ""
         try:
             # Decode audio data
-            audio_bytes = base64.b64decode(request.audio_data)
-            
+            with timed_stage("decode"):
+                audio_bytes = await self.endpoint_request_audio(request)
+            if audio_bytes is None:
+                return {"status": "listening", "session_id": session.session_id}
+                
             # Transcribe speech to text
-            transcript = await self.speech_to_text(audio_bytes, session.language)
+            priority = self.call_priority(session)
+            with timed_stage("stt"):
+                transcript = await self.speech_to_text(audio_bytes, session.language, priority)
             
             if not transcript.strip():
-                return {"text_response": "I didn't catch that. Could you please repeat?"}
+                return {"text_response": REPEAT_PROMPT}
                 
             logger.info(f"Transcribed: {transcript}")
             
@@ -252,77 +2856,335 @@ class AIEngine:
             })
             
             # Save updated session
-            await self.save_conversation_session(session)
+            with timed_stage("redis_save"):
+                await self.save_conversation_session(session)
             
             # Generate speech audio for response
-            audio_data = await self.text_to_speech_bytes(ai_response)
+            audio_format = response_format or getattr(request, "response_format", None) or self.tts_backend.default_format
+            with timed_stage("tts"):
+                audio_data = await self.text_to_speech_bytes(ai_response, audio_format=audio_format, priority=priority)
             
             return {
                 "text_response": ai_response,
                 "transcript": transcript,
-                "audio_response": base64.b64encode(audio_data).decode() if audio_data else None,
+                "audio_response": (base64.b64encode(audio_data).decode() if encode_audio else audio_data) if audio_data else None,
+                "audio_format": audio_format,
                 "session_id": session.session_id
             }
             
+        except asyncio.CancelledError:
+            await self.record_interrupted_reply(session, ai_response)
+            raise
         except Exception as e:
             logger.error(f"Error processing audio: {e}")
-            return {"text_response": "I'm having trouble processing your request. Please try again."}
+            return {"text_response": PROCESSING_ERROR_MESSAGE}
+            
+    async def process_audio_stream(self, request: Union[ProcessAudioRequest, AudioFrame],
+                                   send: Callable[[Dict], Awaitable[None]], audio_format: Optional[str] = None) -> Dict:
+        """Process an audio chunk, sending response audio sentence by sentence.
+        
+        The chat completion is streamed and TTS for each sentence starts as soon
+        as the sentence is complete, so the first segment is sent while the LLM
+        is still generating the rest of the reply. audio_segment events carry
+        raw audio bytes; the transport decides how to encode them.
+        """
+        with timed_stage("redis_get"):
+            session = await self.get_conversation_session(request.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
             
-    async def speech_to_text(self, audio_bytes: bytes, language: str = "en-US") -> str:
-        """Convert speech audio to text using OpenAI Whisper"""
+        started = time.perf_counter()
+        first_audio_ms = None
+        segments: List[str] = []
+        
         try:
-            # Create a temporary file-like object
-            audio_file = io.BytesIO(audio_bytes)
-            audio_file.name = "audio.wav"
+            with timed_stage("decode"):
+                audio_bytes = await self.endpoint_request_audio(request)
+            if audio_bytes is None:
+                return {"status": "listening", "session_id": session.session_id}
+                
+            priority = self.call_priority(session)
+            with timed_stage("stt"):
+                transcript = await self.speech_to_text(audio_bytes, session.language, priority)
             
-            # Use OpenAI Whisper API
-            response = await self.openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language.split("-")[0]  # Convert en-US to en
-            )
+            if transcript.strip():
+                logger.info(f"Transcribed: {transcript}")
+                await send({
+                    "type": "transcript",
+                    "session_id": session.session_id,
+                    "transcript": transcript
+                })
+                
+                session.messages.append({
+                    "role": "user",
+                    "content": transcript,
+                    "timestamp": datetime.now().isoformat()
+                })
+                sentences = self.generate_response_stream(session, transcript)
+            else:
+                sentences = self._single_sentence(REPEAT_PROMPT)
+                
+            # Synthesis of sentence N overlaps generation of sentence N+1;
+            # the queue keeps segments in order
+            pending: asyncio.Queue = asyncio.Queue()
+            
+            async def produce():
+                try:
+                    async for sentence in sentences:
+                        await pending.put((sentence, asyncio.create_task(
+                            timed("tts", self.text_to_speech_bytes(sentence, audio_format=audio_format, priority=priority))
+                        )))
+                finally:
+                    await pending.put(None)
+                    
+            producer = asyncio.create_task(produce())
+            try:
+                while True:
+                    item = await pending.get()
+                    if item is None:
+                        break
+                    sentence, tts_task = item
+                    audio_data = await tts_task
+                    
+                    if first_audio_ms is None:
+                        first_audio_ms = (time.perf_counter() - started) * 1000
+                        
+                    await send({
+                        "type": "audio_segment",
+                        "session_id": session.session_id,
+                        "sequence": len(segments),
+                        "text": sentence,
+                        "audio_data": audio_data
+                    })
+                    segments.append(sentence)
+            finally:
+                if not producer.done():
+                    producer.cancel()
+                while not pending.empty():
+                    item = pending.get_nowait()
+                    if item is not None:
+                        item[1].cancel()
+                        
+            await producer
+            ai_response = " ".join(segments)
+            
+            if transcript.strip():
+                session.messages.append({
+                    "role": "assistant",
+                    "content": ai_response,
+                    "timestamp": datetime.now().isoformat()
+                })
+                with timed_stage("redis_save"):
+                    await self.save_conversation_session(session)
+                
+            if first_audio_ms is not None:
+                logger.info(f"Session {session.session_id}: first audio after {first_audio_ms:.0f} ms")
+                
+            return {
+                "text_response": ai_response,
+                "transcript": transcript,
+                "session_id": session.session_id,
+                "segments": len(segments),
+                "time_to_first_audio_ms": first_audio_ms
+            }
+            
+        except asyncio.CancelledError:
+            # Barge-in: keep what was already sent to the caller
+            await self.record_interrupted_reply(session, " ".join(segments))
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming audio response: {e}")
+            return {"text_response": PROCESSING_ERROR_MESSAGE}
             
-            return response.text
+    async def _single_sentence(self, text: str) -> AsyncIterator[str]:
+        yield text
+        
+    @staticmethod
+    def call_priority(session: ConversationSession) -> int:
+        """Calls that have already been answered once outrank new calls"""
+        if any(message["role"] == "assistant" for message in session.messages):
+            return PRIORITY_ACTIVE_CALL
+        return PRIORITY_NEW_CALL
+        
+    async def speech_to_text(self, audio_bytes: bytes, language: str = "en-US",
+                             priority: int = PRIORITY_NEW_CALL) -> str:
+        """Convert speech audio to text with the configured STT backend"""
+        try:
+            return await self.stt_backend.transcribe(audio_bytes, language, priority)
             
         except Exception as e:
             logger.error(f"Speech recognition error: {e}")
             return ""
             
+    def build_chat_messages(self, session: ConversationSession, user_input: str) -> List[Dict]:
+        """Build the chat completion message list for a conversation turn"""
+        messages, overflow = self.context_window.build(session, user_input)
+        if self.summaries_enabled and len(overflow) >= SUMMARY_MIN_MESSAGES:
+            self.schedule_summary(session, overflow)
+        return messages
+        
+    def schedule_summary(self, session: ConversationSession, messages: List[Dict]):
+        """Fold messages into the session summary in the background, one task per session"""
+        task = self.summary_tasks.get(session.session_id)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self.summarize_history(session, messages))
+        self.summary_tasks[session.session_id] = task
+        task.add_done_callback(
+            lambda done: self.summary_tasks.pop(session.session_id, None)
+            if self.summary_tasks.get(session.session_id) is done else None
+        )
+        
+    async def summarize_history(self, session: ConversationSession, messages: List[Dict]):
+        """Summarize older turns with the previous summary and store the result"""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if session.summary:
+            transcript = f"Earlier summary: {session.summary}\n\n{transcript}"
+        prompt = [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}]
+        
+        try:
+            response = await self.upstreams["chat"].run(
+                lambda: self.openai_client.chat.completions.create(
+                    model=self.config.get("MODEL_NAME", "gpt-3.5-turbo"),
+                    messages=prompt,
+                    max_tokens=self.summary_max_tokens,
+                    temperature=0
+                ),
+                tokens=estimate_tokens(prompt) + self.summary_max_tokens,
+                priority=PRIORITY_BACKGROUND
+            )
+            summary = response.choices[0].message.content.strip()
+        except Exception as e:
+            # The turns stay in the session, so the next turn that overflows retries
+            logger.warning(f"Session {session.session_id}: summary failed: {e}")
+            return
+            
+        session.summary = summary
+        session.summary_through = messages[-1].get("timestamp") or datetime.now().isoformat()
+        if self.redis:
+            meta_key = session_meta_key(session.session_id)
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hset(meta_key, mapping={"summary": session.summary, "summary_through": session.summary_through})
+                    pipe.expire(meta_key, SESSION_TTL)
+                    await pipe.execute()
+            except Exception as e:
+                logger.error(f"Error saving summary for {session.session_id}: {e}")
+        logger.info(f"Session {session.session_id}: summarized {len(messages)} older messages")
+        
+    def cached_response(self, session: ConversationSession, user_input: str) -> Optional[str]:
+        if not self.response_cache:
+            return None
+        return self.response_cache.get(session.context, user_input, ResponseCache.previous_turn(session))
+        
+    def cache_response(self, session: ConversationSession, user_input: str, response: str, started: float):
+        if self.response_cache and ResponseCache.is_cacheable(session, user_input, response):
+            self.response_cache.put(
+                session.context, user_input, response, (time.perf_counter() - started) * 1000,
+                ResponseCache.previous_turn(session)
+            )
+            
     async def generate_response(self, session: ConversationSession, user_input: str) -> str:
         """Generate AI response using OpenAI GPT"""
-        try:
-            # Build conversation context
-            system_prompt = self.build_system_prompt(session.context, session.phone_number)
+        cached = self.cached_response(session, user_input)
+        if cached:
+            return cached
             
-            messages = [{"role": "system", "content": system_prompt}]
+        try:
+            started = time.perf_counter()
             
-            # Add conversation history (last 10 messages to stay within limits)
-            for message in session.messages[-10:]:
-                messages.append({
-                    "role": message["role"],
-                    "content": message["content"]
-                })
-                
-            # Add current user input
-            messages.append({"role": "user", "content": user_input})
+            # Build conversation context
+            messages = self.build_chat_messages(session, user_input)
             
             # Generate response
-            response = await self.openai_client.chat.completions.create(
-                model=self.config.get("MODEL_NAME", "gpt-3.5-turbo"),
-                messages=messages,
-                max_tokens=150,
-                temperature=0.7
+            response = await self.upstreams["chat"].run(
+                lambda: self.openai_client.chat.completions.create(
+                    model=self.config.get("MODEL_NAME", "gpt-3.5-turbo"),
+                    messages=messages,
+                    max_tokens=150,
+                    temperature=0.7
+                ),
+                tokens=estimate_tokens(messages) + 150,
+                priority=self.call_priority(session)
             )
             
-            return response.choices[0].message.content.strip()
+            reply = response.choices[0].message.content.strip()
+            # Not streamed, so the first token arrives with the whole reply
+            elapsed = time.perf_counter() - started
+            observe_stage("llm_first_token", elapsed)
+            observe_stage("llm_total", elapsed)
+            self.cache_response(session, user_input, reply, started)
+            return reply
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return "I apologize, but I'm having difficulty processing your request right now."
+            return RESPONSE_FALLBACK_MESSAGE
+            
+    async def generate_response_stream(self, session: ConversationSession, user_input: str) -> AsyncIterator[str]:
+        """Stream the AI response from OpenAI GPT one sentence at a time"""
+        cached = self.cached_response(session, user_input)
+        if cached:
+            sentences, remainder = split_sentences(cached)
+            for sentence in sentences + ([remainder] if remainder.strip() else []):
+                yield sentence
+            return
+            
+        yielded = []
+        try:
+            started = time.perf_counter()
+            messages = self.build_chat_messages(session, user_input)
+            scheduler = self.upstreams["chat"]
+            deadline = time.monotonic() + scheduler.timeout
+            
+            # The slot is held until the stream is drained; the timeout covers time to first chunk
+            async with scheduler.slot(estimate_tokens(messages) + 150, self.call_priority(session), deadline):
+                stream = await asyncio.wait_for(
+                    self.openai_client.chat.completions.create(
+                        model=self.config.get("MODEL_NAME", "gpt-3.5-turbo"),
+                        messages=messages,
+                        max_tokens=150,
+                        temperature=0.7,
+                        stream=True
+                    ),
+                    max(0.0, deadline - time.monotonic())
+                )
+                
+                buffer = ""
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not yielded and not buffer:
+                        observe_stage("llm_first_token", time.perf_counter() - started)
+                        
+                    buffer += delta
+                    sentences, buffer = split_sentences(buffer)
+                    for sentence in sentences:
+                        yielded.append(sentence)
+                        yield sentence
+                        
+            if buffer.strip():
+                yielded.append(buffer.strip())
+                yield buffer.strip()
+                
+            observe_stage("llm_total", time.perf_counter() - started)
+            self.cache_response(session, user_input, " ".join(yielded), started)
             
-    def build_system_prompt(self, context: str, phone_number: str) -> str:
-        """Build system prompt for the AI receptionist"""
-        return f"""
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            if not yielded:
+                yield RESPONSE_FALLBACK_MESSAGE
+                
+    def build_system_prompt(self, context: str) -> str:
+        """Build system prompt for the AI receptionist
+        
+        Call-specific details (the caller's number, the call summary) are sent
+        in a separate message, so the prompt is the same for every call in a
+        context and is rendered once by the context window.
+        """
+        return textwrap.dedent(f"""
         You are a professional AI receptionist for our company. Your role is to:
         
         1. Greet callers warmly and professionally
@@ -335,32 +3197,71 @@ class AIEngine:
         - Keep responses concise and professional
         - Be helpful and courteous at all times
         - If you cannot help with something, offer to transfer to a human
-        - Remember the caller's phone number is {phone_number}
         - Context: {context}
         
         Always maintain a friendly, professional tone and ask clarifying questions when needed.
-        """
+        """).strip()
         
-    async def text_to_speech_bytes(self, text: str) -> Optional[bytes]:
-        """Convert text to speech and return audio bytes"""
+    async def text_to_speech_bytes(self, text: str, voice: Optional[str] = None,
+                                   audio_format: Optional[str] = None,
+                                   priority: int = PRIORITY_NEW_CALL,
+                                   sample_rate: Optional[int] = None) -> Optional[bytes]:
+        """Convert text to speech and return audio bytes, using the TTS cache"""
+        voice = voice or self.config.get("TTS_VOICE", "alloy")
+        audio_format = audio_format or self.tts_backend.default_format
+        cache_format = f"{audio_format}@{sample_rate}" if sample_rate else audio_format
+        cache_key = TTSCache.key(text, voice, self.tts_backend.model, cache_format) if self.tts_cache else None
+        
+        if cache_key:
+            cached = await self.tts_cache.get(cache_key)
+            if cached is not None:
+                return cached
+                
         try:
-            # Use OpenAI TTS API
-            response = await self.openai_client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=text
-            )
+            audio = await self.tts_backend.synthesize(text, voice, audio_format, sample_rate, priority)
             
-            return response.content
+            if cache_key:
+                await self.tts_cache.put(cache_key, audio)
+            return audio
             
         except Exception as e:
             logger.error(f"Text-to-speech error: {e}")
             return None
             
+    async def stream_speech_pcm(self, text: str, voice: Optional[str] = None, sample_rate: int = 8000,
+                                chunk_ms: int = 20, priority: int = PRIORITY_NEW_CALL) -> AsyncIterator[bytes]:
+        """Yield 16-bit linear PCM in chunk_ms pieces, sentence by sentence.
+        
+        Every sentence is submitted to the TTS backend up front and played in
+        order, so the first chunk is ready once the first sentence is.
+        """
+        sentences, remainder = split_sentences(text)
+        if remainder.strip():
+            sentences.append(remainder.strip())
+        tasks = [
+            asyncio.create_task(self.text_to_speech_bytes(sentence, voice, "pcm", priority, sample_rate))
+            for sentence in sentences
+        ]
+        chunk_bytes = sample_rate * chunk_ms // 1000 * 2
+        try:
+            for task in tasks:
+                pcm = await task
+                for offset in range(0, len(pcm or b""), chunk_bytes):
+                    yield pcm[offset:offset + chunk_bytes]
+        finally:
+            for task in tasks:
+                task.cancel()
+            
+    async def prewarm_tts_cache(self):
+        """Render the fixed receptionist phrases so they play without a TTS call"""
+        for phrase in STATIC_PHRASES:
+            await self.text_to_speech_bytes(phrase)
+        logger.info(f"Pre-warmed TTS cache with {len(STATIC_PHRASES)} phrases")
+        
     async def transcribe_speech(self, request: TranscribeRequest) -> Dict:
         """Transcribe audio to text only"""
         try:
-            audio_bytes = base64.b64decode(request.audio_data)
+            audio_bytes = await self.audio_executor.run(base64.b64decode, request.audio_data)
             transcript = await self.speech_to_text(audio_bytes, request.language)
             
             return {
@@ -376,12 +3277,13 @@ class AIEngine:
     async def text_to_speech(self, request: SynthesizeRequest) -> Dict:
         """Convert text to speech"""
         try:
-            audio_bytes = await self.text_to_speech_bytes(request.text)
+            audio_format = request.format or self.tts_backend.default_format
+            audio_bytes = await self.text_to_speech_bytes(request.text, request.voice, audio_format)
             
             if audio_bytes:
                 return {
                     "audio_data": base64.b64encode(audio_bytes).decode(),
-                    "format": request.format,
+                    "format": audio_format,
                     "text": request.text
                 }
             else:
@@ -393,84 +3295,664 @@ class AIEngine:
             
     async def cleanup_session(self, session_id: str) -> Dict:
         """Clean up and end conversation session"""
+        self.dirty_sessions.pop(session_id, None)
+        if self.session_cache:
+            self.session_cache.invalidate(session_id)
+        summary = self.summary_tasks.pop(session_id, None)
+        if summary:
+            summary.cancel()
+        binding = self.binding_tasks.get(session_id)
+        if binding:
+            # Otherwise the pooled shell's details could be written after the delete
+            await asyncio.wait([binding])
+            
         if self.redis:
-            await self.redis.delete(f"session:{session_id}")
+            await self.redis.delete(session_meta_key(session_id), session_messages_key(session_id))
+            if self.session_cache:
+                await self.publish_invalidation(session_id)
+        self.vad_detectors.pop(session_id, None)
+        self.mux_routes.pop(session_id, None)
+        self.mux_sequences.pop(session_id, None)
+        self.mux_outbox.pop(session_id, None)
             
         logger.info(f"Cleaned up session {session_id}")
         
         return {"status": "session_ended", "session_id": session_id}
         
     async def handle_audio_stream(self, websocket: WebSocket):
-        """Handle real-time audio streaming via WebSocket"""
+        """Handle real-time audio streaming via WebSocket
+        
+        Audio arrives either as base64 inside JSON text messages or as binary
+        audio frames. Clients choose how response audio is sent by offering
+        "audio_transport" (e.g. ["binary", "json"]) in a hello or start_session
+        message; JSON is used when nothing is negotiated.
+        """
         await websocket.accept()
+        self.open_streams += 1
         session_id = None
+        streaming = False
+        transport = "json"
         
+        async def send_event(event: Dict):
+            """Send an event, moving any raw audio into a binary frame when negotiated"""
+            audio_data = event.get("audio_data")
+            with timed_stage("ws_send"):
+                if transport == "binary":
+                    await websocket.send_text(json.dumps({**event, "audio_data": None}))
+                    if audio_data:
+                        await websocket.send_bytes(encode_audio_frame(
+                            event.get("session_id") or session_id or "",
+                            event.get("sequence", 0),
+                            self.tts_backend.default_format,
+                            self.tts_backend.default_sample_rate,
+                            audio_data
+                        ))
+                else:
+                    if isinstance(audio_data, bytes):
+                        event = {**event, "audio_data": base64.b64encode(audio_data).decode()}
+                    await websocket.send_text(json.dumps(event))
+                    
+        async def respond(request: Union[ProcessAudioRequest, AudioFrame], previous: Optional[asyncio.Task],
+                          trace_id: Optional[str] = None):
+            """One turn; chunks that are not barge-ins wait for the turn before them"""
+            if previous:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                with turn_trace(trace_id):
+                    if streaming:
+                        result = await self.process_audio_stream(request, send_event)
+                        
+                        with timed_stage("ws_send"):
+                            await websocket.send_text(json.dumps({
+                                "type": "ai_response_end",
+                                "data": result
+                            }))
+                    else:
+                        result = await self.process_audio_chunk(request, encode_audio=transport == "json")
+                        audio_response = result.pop("audio_response", None) if transport == "binary" else None
+                        
+                        with timed_stage("ws_send"):
+                            await websocket.send_text(json.dumps({
+                                "type": "ai_response",
+                                "data": result
+                            }))
+                            if audio_response:
+                                await websocket.send_bytes(encode_audio_frame(
+                                    session_id, 0, self.tts_backend.default_format,
+                                    self.tts_backend.default_sample_rate, audio_response
+                                ))
+            except Exception as e:
+                logger.error(f"WebSocket turn error: {e}")
+                
         try:
             while True:
-                data = await websocket.receive_text()
-                message = json.loads(data)
-                
-                if message.get("type") == "start_session":
+                received = await websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    break
+                    
+                if received.get("bytes") is not None:
+                    if not session_id:
+                        continue
+                    try:
+                        frame = decode_audio_frame(received["bytes"])
+                    except ValueError as e:
+                        logger.warning(f"Dropping invalid audio frame: {e}")
+                        continue
+                    frame.session_id = session_id
+                    request = frame
+                    message = {"type": "audio_chunk"}
+                else:
+                    message = json.loads(received["text"])
+                    request = None
+                    
+                if message.get("type") == "hello":
+                    transport = negotiate_audio_transport(message.get("audio_transport"))
+                    await websocket.send_text(json.dumps({
+                        "type": "hello",
+                        "audio_transport": transport,
+                        "frame_version": AUDIO_FRAME_VERSION
+                    }))
+                    
+                elif message.get("type") == "start_session":
+                    if self.draining:
+                        # Reconnect to another worker (1013: try again later)
+                        await websocket.send_text(json.dumps({"type": "error", "error": "draining"}))
+                        await websocket.close(code=1013)
+                        break
+                        
                     # Create new session for WebSocket
                     request = CreateSessionRequest(**message["data"])
                     result = await self.create_conversation_session(request)
                     session_id = result["session_id"]
-                    
+                    streaming = message.get("streaming", self.config.get("STREAM_RESPONSES", False))
+                    if "audio_transport" in message:
+                        transport = negotiate_audio_transport(message["audio_transport"])
+                        
                     await websocket.send_text(json.dumps({
                         "type": "session_created",
                         "session_id": session_id,
-                        "message": result["welcome_message"]
+                        "message": result["welcome_message"],
+                        "streaming": streaming,
+                        "audio_transport": transport
                     }))
                     
+                elif message.get("type") == "barge_in" and session_id:
+                    # Client-detected interruption; played_ms says how much was heard
+                    result = await self.barge_in(session_id, message.get("played_ms"))
+                    await websocket.send_text(json.dumps({"type": "barge_in", **result}))
+                    
                 elif message.get("type") == "audio_chunk" and session_id:
                     # Process audio chunk
-                    request = ProcessAudioRequest(
-                        session_id=session_id,
-                        audio_data=message["audio_data"]
-                    )
-                    
-                    result = await self.process_audio_chunk(request)
-                    
-                    await websocket.send_text(json.dumps({
-                        "type": "ai_response",
-                        "data": result
-                    }))
+                    if request is None:
+                        request = ProcessAudioRequest(
+                            session_id=session_id,
+                            audio_data=message["audio_data"]
+                        )
+                        
+                    # Turns run as tasks so this loop keeps reading; speech
+                    # arriving while a reply is in flight cancels that reply
+                    previous = self.active_turns.get(session_id)
+                    if previous and previous.done():
+                        previous = None
+                    if previous and self.barge_in_enabled and await self.request_contains_speech(request):
+                        result = await self.barge_in(session_id)
+                        await websocket.send_text(json.dumps({"type": "barge_in", **result}))
+                        previous = None
+                    self.start_turn(session_id, respond(request, previous, message.get("trace_id")))
                     
         except Exception as e:
             logger.error(f"WebSocket error: {e}")
         finally:
+            self.open_streams -= 1
             if session_id:
+                turn = self.active_turns.get(session_id)
+                if turn:
+                    turn.cancel()
+                    await asyncio.gather(turn, return_exceptions=True)
                 await self.cleanup_session(session_id)
+                
+    async def handle_stream_mux(self, websocket: WebSocket):
+        """Carry many calls' audio over one WebSocket from ai-freeswitch
+        
+        Sessions are created and ended over HTTP as before; this connection
+        only carries their audio and replies. A "hello" sets the reply format
+        and whether replies stream sentence by sentence, and lists the
+        sessions the client is resuming: they are routed to this connection,
+        their last accepted sequences are returned so the client resends only
+        what never arrived, and replies that waited in the outbox follow.
+        Chunks are audio frames, or "audio_chunk" messages with base64 audio,
+        each with its session's next sequence number. Acknowledgements are
+        batched every MUX_ACK_INTERVAL. Barge-in is detected by the client and
+        sent as a "barge_in" message with the session id and played_ms, behind
+        the session's chunks; POST /session/{id}/barge_in works as well.
+        
+        Sessions owned by another worker are carried through a MuxRelay to
+        that worker, which answers for them on the same connection.
+        """
+        await websocket.accept()
+        self.open_streams += 1
+        connection = MuxConnection(websocket, self.tts_backend.default_sample_rate)
+        streaming = self.config.get("STREAM_RESPONSES", False)
+        response_format = "wav"
+        
+        async def acknowledge():
+            while True:
+                await asyncio.sleep(MUX_ACK_INTERVAL)
+                await connection.flush_acks()
+                
+        async def close_when_draining():
+            """Let this worker's turns finish, then send the client to another worker"""
+            while not self.draining:
+                await asyncio.sleep(0.5)
+            while any(self.mux_routes.get(session_id) is connection for session_id in self.active_turns):
+                await asyncio.sleep(0.1)
+            await connection.flush_acks()
+            await websocket.close(code=1013)
+            
+        relays: Dict[int, MuxRelay] = {}
+        barge_ins = set()
+        
+        async def open_relay(owner: int, sessions: List[str]) -> Optional[Dict]:
+            """Connect to a session's owner and resume sessions there; None if it cannot be reached"""
+            relay = MuxRelay(worker_socket_path(self.config, owner), connection)
+            try:
+                resumed = await relay.open({
+                    "type": "hello", "streaming": streaming, "response_format": response_format, "sessions": sessions
+                })
+            except (OSError, websockets.WebSocketException) as e:
+                logger.warning(f"Worker {owner} unreachable over mux, handling its sessions here: {e}")
+                return None
+            relay.sessions.update(sessions)
+            relays[owner] = relay
+            return resumed.get("sessions", {})
+            
+        async def relay(session_id: str, data: Union[str, bytes]) -> bool:
+            """Pass a chunk for another worker's session on to it; False to handle it here"""
+            if self.owns_session(session_id):
+                return False
+            owner = session_owner(session_id, self.workers)
+            for _ in range(2):
+                current = relays.get(owner)
+                if current is None or current.closed:
+                    previous = relays.pop(owner, None)
+                    if previous:
+                        await previous.close()
+                    if await open_relay(owner, sorted(previous.sessions if previous else ())) is None:
+                        return False
+                    current = relays[owner]
+                    current.start()
+                current.sessions.add(session_id)
+                try:
+                    await current.send(data)
+                    return True
+                except websockets.ConnectionClosed:
+                    continue
+            return False
+            
+        background = [asyncio.create_task(acknowledge()), asyncio.create_task(close_when_draining())]
+        try:
+            while True:
+                received = await websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    break
+                    
+                if received.get("bytes") is not None:
+                    try:
+                        frame = decode_audio_frame(received["bytes"])
+                    except ValueError as e:
+                        logger.warning(f"Dropping invalid audio frame: {e}")
+                        continue
+                    if not await relay(frame.session_id, received["bytes"]):
+                        self.accept_mux_chunk(connection, frame, frame.sequence, streaming, response_format)
+                    continue
+                    
+                message = json.loads(received["text"])
+                if message.get("type") == "hello":
+                    streaming = message.get("streaming", streaming)
+                    if message.get("response_format") in AUDIO_CODECS:
+                        response_format = message["response_format"]
+                    foreign: Dict[int, List[str]] = {}
+                    for session_id in message.get("sessions", []):
+                        if not self.owns_session(session_id):
+                            foreign.setdefault(session_owner(session_id, self.workers), []).append(session_id)
+                    resumed = {}
+                    for owner, sessions in foreign.items():
+                        if owner in relays:
+                            await relays.pop(owner).close()
+                        resumed.update(await open_relay(owner, sessions) or {})
+                    local = [session_id for session_id in message.get("sessions", []) if session_id not in resumed]
+                    resumed.update({session_id: self.mux_sequences.get(session_id, -1) for session_id in local})
+                    await connection.send({
+                        "type": "hello",
+                        "frame_version": AUDIO_FRAME_VERSION,
+                        "streaming": streaming,
+                        "sessions": resumed
+                    })
+                    for session_id in local:
+                        self.mux_routes[session_id] = connection
+                        for reply, audio, audio_format in self.mux_outbox.pop(session_id, ()):
+                            await connection.send(reply, audio, audio_format)
+                    # Owners flush their outboxes once the client has its hello
+                    for current in relays.values():
+                        current.start()
+                        
+                elif message.get("type") == "barge_in":
+                    # Runs beside this loop, like a turn, so other sessions' chunks keep flowing
+                    if not await relay(message["session_id"], received["text"]):
+                        task = asyncio.create_task(self.mux_barge_in(message["session_id"], message.get("played_ms")))
+                        barge_ins.add(task)
+                        task.add_done_callback(barge_ins.discard)
+                        
+                elif message.get("type") == "audio_chunk":
+                    if await relay(message["session_id"], received["text"]):
+                        continue
+                    request = ProcessAudioRequest(
+                        session_id=message["session_id"],
+                        audio_data=message["audio_data"],
+                        format=message.get("format", "wav")
+                    )
+                    self.accept_mux_chunk(connection, request, message["sequence"], streaming, response_format)
+                    
+        except Exception as e:
+            logger.error(f"Mux WebSocket error: {e}")
+        finally:
+            connection.closed = True
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, *(current.close() for current in relays.values()), return_exceptions=True)
+            await asyncio.gather(*barge_ins, return_exceptions=True)
+            self.open_streams -= 1
+            
+    def accept_mux_chunk(self, connection: MuxConnection, request: Union[ProcessAudioRequest, AudioFrame],
+                         sequence: int, streaming: bool, response_format: str):
+        """Queue a chunk behind its session's previous turn, skipping chunks resent after a reconnect"""
+        session_id = request.session_id
+        self.mux_routes[session_id] = connection
+        last = self.mux_sequences.get(session_id, -1)
+        if sequence <= last:
+            connection.acks[session_id] = last
+            return
+        self.mux_sequences[session_id] = sequence
+        connection.acks[session_id] = sequence
+        
+        previous = self.active_turns.get(session_id)
+        if previous and previous.done():
+            previous = None
+        self.start_turn(session_id, self.mux_turn(request, sequence, previous, streaming, response_format))
+        
+    async def mux_turn(self, request: Union[ProcessAudioRequest, AudioFrame], sequence: int,
+                       previous: Optional[asyncio.Task], streaming: bool, response_format: str):
+        """One chunk from /ws/mux; replies carry the chunk's session and sequence"""
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
+        session_id = request.session_id
+        reply = {"session_id": session_id, "sequence": sequence}
+        try:
+            with turn_trace(stream_trace_id(session_id, sequence)):
+                if streaming:
+                    async def send_event(event: Dict):
+                        audio = event.pop("audio_data", None)
+                        if "sequence" in event:
+                            event["segment"] = event.pop("sequence")
+                        await self.send_mux(session_id, {**event, **reply}, audio, response_format)
+                        
+                    result = await self.process_audio_stream(request, send_event, response_format)
+                    if result.get("status") != "listening":
+                        await self.send_mux(session_id, {"type": "ai_response_end", **reply, "data": result})
+                else:
+                    result = await self.process_audio_chunk(request, encode_audio=False, response_format=response_format)
+                    if result.get("status") != "listening":
+                        audio = result.pop("audio_response", None)
+                        await self.send_mux(session_id, {"type": "ai_response", **reply, "data": result}, audio, response_format)
+        except HTTPException as e:
+            await self.send_mux(session_id, {"type": "error", **reply, "error": e.detail})
+        except Exception as e:
+            logger.error(f"Mux turn error for session {session_id}: {e}")
+            
+    async def mux_barge_in(self, session_id: str, played_ms: Optional[int]):
+        """A barge-in sent on /ws/mux; the result goes back like a reply"""
+        try:
+            result = await self.barge_in(session_id, played_ms)
+            await self.send_mux(session_id, {"type": "barge_in", **result})
+        except Exception as e:
+            logger.error(f"Mux barge-in error for session {session_id}: {e}")
+            
+    async def send_mux(self, session_id: str, message: Dict, audio: Optional[bytes] = None,
+                       audio_format: str = "wav"):
+        """Send a reply on the session's connection, or keep it until the client resumes"""
+        connection = self.mux_routes.get(session_id)
+        if connection and not connection.closed:
+            try:
+                with timed_stage("ws_send"):
+                    await connection.send(message, audio, audio_format)
+                return
+            except Exception as e:
+                logger.warning(f"Mux connection lost sending to session {session_id}: {e}")
+                connection.closed = True
+        outbox = self.mux_outbox.setdefault(session_id, deque(maxlen=MUX_OUTBOX_SIZE))
+        outbox.append((message, audio, audio_format))
 
-async def main():
-    """Main entry point"""
-    from os import getenv
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that drains on SIGTERM instead of dropping live calls.
     
-    config = {
-        "OPENAI_API_KEY": getenv("OPENAI_API_KEY"),
-        "MODEL_NAME": getenv("MODEL_NAME", "gpt-3.5-turbo"),
-        "REDIS_URL": getenv("REDIS_URL", "redis://localhost:6379"),
-        "HOST": getenv("HOST", "localhost"),
-        "PORT": int(getenv("PORT", 8081)),
-        "DEBUG": getenv("DEBUG", "false").lower() == "true"
-    }
+    The first SIGTERM or SIGINT closes the listening socket, so with
+    SO_REUSEPORT the kernel hands new connections to the other workers, and
+    marks the engine as draining: /ready returns 503 and new sessions are
+    refused. Open call streams get up to drain_timeout seconds to finish
+    before the usual uvicorn shutdown; a second signal exits at once. The
+    worker's private socket stays open meanwhile, so other workers can still
+    forward requests about the sessions it owns.
+    """
     
-    ai_engine = AIEngine(config)
+    def __init__(self, config: uvicorn.Config, engine: "AIEngine", drain_timeout: float = 30,
+                 worker_socket: Optional[socket.socket] = None):
+        super().__init__(config)
+        self.engine = engine
+        self.drain_timeout = drain_timeout
+        self.worker_socket = worker_socket
+        self.drain_task: Optional[asyncio.Task] = None
+        
+    def install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (process_signal.SIGINT, process_signal.SIGTERM):
+            loop.add_signal_handler(sig, self.begin_drain)
+            
+    def begin_drain(self):
+        if self.drain_task:
+            self.force_exit = True
+            self.should_exit = True
+            return
+        self.drain_task = asyncio.create_task(self.drain())
+        
+    async def drain(self):
+        logger.info(f"Draining worker {os.getpid()} ({self.engine.open_streams} open streams)")
+        self.engine.draining = True
+        for server in self.servers:
+            if self.worker_socket and any(sock.fileno() == self.worker_socket.fileno() for sock in server.sockets):
+                continue
+            server.close()
+            
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while self.engine.open_streams and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self.engine.open_streams:
+            logger.warning(f"Drain timeout with {self.engine.open_streams} streams still open")
+        self.should_exit = True
+
+def bind_reuseport_socket(host: str, port: int) -> socket.socket:
+    """Listening socket that other worker processes can bind to as well"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+def bind_worker_socket(path: str) -> socket.socket:
+    """A worker's private unix socket; a stale one from a previous run is replaced"""
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    return sock
+
+def worker_cpu_sets(affinity: Optional[str], workers: int) -> List[Optional[set]]:
+    """CPUs each worker is pinned to, from WORKER_CPU_AFFINITY.
     
-    logger.info("Starting AI Engine server...")
+    "auto" gives each worker one of the CPUs this process may use, round
+    robin; a list such as "0-3,8" does the same over those CPUs; empty leaves
+    scheduling to the OS.
+    """
+    if not affinity or affinity == "none" or not hasattr(os, "sched_setaffinity"):
+        return [None] * workers
+    if affinity == "auto":
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = []
+        for part in affinity.split(","):
+            start, _, end = part.strip().partition("-")
+            cpus.extend(range(int(start), int(end or start) + 1))
+    return [{cpus[index % len(cpus)]} for index in range(workers)]
+
+async def serve(config: Dict, sock: Optional[socket.socket] = None):
+    """Run one engine worker: its own AIEngine, Redis pool and model handles"""
+    ai_engine = AIEngine(config)
+    sockets = [sock] if sock else None
+    worker_socket = None
+    if sock and config.get("WORKERS", 1) > 1:
+        worker_socket = bind_worker_socket(worker_socket_path(config, config.get("WORKER_INDEX", 0)))
+        sockets.append(worker_socket)
     
     # Create and configure the uvicorn server
-    server = uvicorn.Server(
+    server = DrainingServer(
         uvicorn.Config(
             ai_engine.app,
             host=config["HOST"],
             port=config["PORT"],
             log_level="info" if config["DEBUG"] else "warning"
-        )
+        ),
+        ai_engine,
+        drain_timeout=config.get("DRAIN_TIMEOUT", 30),
+        worker_socket=worker_socket
     )
     
     # Start the server within the existing event loop
-    await server.serve()
+    try:
+        await server.serve(sockets=sockets)
+    finally:
+        if worker_socket:
+            os.unlink(worker_socket.getsockname())
+
+def run_worker(config: Dict, index: int, cpus: Optional[set]):
+    """Worker process entry point"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    logger.info(f"Worker {index} (pid {os.getpid()}) starting" + (f" on CPUs {sorted(cpus)}" if cpus else ""))
+    asyncio.run(serve({**config, "WORKER_INDEX": index}, bind_reuseport_socket(config["HOST"], config["PORT"])))
+
+def run_workers(config: Dict):
+    """Run WORKERS engine processes on one port and keep them running.
+    
+    Workers share nothing but Redis; each binds the port with SO_REUSEPORT so
+    the kernel spreads connections across them, and a private unix socket in
+    WORKER_SOCKET_DIR for requests about the sessions it owns. A worker that
+    dies is restarted. SIGTERM is passed on to every worker, which drains, and
+    the supervisor exits when they have.
+    """
+    workers = config.get("WORKERS", 1)
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("SO_REUSEPORT is not available, running a single worker")
+        workers = 1
+    if workers <= 1:
+        asyncio.run(serve(config))
+        return
+        
+    context = multiprocessing.get_context("spawn")
+    cpu_sets = worker_cpu_sets(config.get("WORKER_CPU_AFFINITY"), workers)
+    processes = {}
+    signalled = set()
+    stopping = threading.Event()
+    
+    def start(index: int):
+        process = context.Process(target=run_worker, args=(config, index, cpu_sets[index]), name=f"ai-engine-worker-{index}")
+        process.start()
+        processes[index] = process
+        
+    def stop_workers():
+        # Once per worker: a second SIGTERM would skip its drain
+        for process in processes.values():
+            if process.is_alive() and process.pid not in signalled:
+                signalled.add(process.pid)
+                os.kill(process.pid, process_signal.SIGTERM)
+                
+    def stop(signum, frame):
+        stopping.set()
+        stop_workers()
+        
+    process_signal.signal(process_signal.SIGTERM, stop)
+    process_signal.signal(process_signal.SIGINT, stop)
+    logger.info(f"Starting {workers} AI Engine workers on {config['HOST']}:{config['PORT']}")
+    for index in range(workers):
+        start(index)
+        
+    while not stopping.is_set():
+        for index, process in list(processes.items()):
+            if not process.is_alive() and not stopping.is_set():
+                logger.error(f"Worker {index} exited with {process.exitcode}, restarting")
+                start(index)
+        stopping.wait(1)
+        
+    # Catch a worker restarted while the signal was being handled
+    stop_workers()
+    for process in processes.values():
+        process.join()
+    logger.info("AI Engine workers stopped")
+
+def load_config() -> Dict:
+    """Engine configuration from environment variables"""
+    from os import getenv
+    
+    return {
+        "OPENAI_API_KEY": getenv("OPENAI_API_KEY"),
+        "MODEL_NAME": getenv("MODEL_NAME", "gpt-3.5-turbo"),
+        "REDIS_URL": getenv("REDIS_URL", "redis://localhost:6379"),
+        "HOST": getenv("HOST", "localhost"),
+        "PORT": int(getenv("PORT", 8081)),
+        "DEBUG": getenv("DEBUG", "false").lower() == "true",
+        "STREAM_RESPONSES": getenv("STREAM_RESPONSES", "false").lower() == "true",
+        "VAD_ENABLED": getenv("VAD_ENABLED", "false").lower() == "true",
+        "VAD_HANGOVER_MS": int(getenv("VAD_HANGOVER_MS", 600)),
+        "VAD_ENERGY_THRESHOLD_DB": float(getenv("VAD_ENERGY_THRESHOLD_DB", -45)),
+        "VAD_MIN_SPEECH_MS": int(getenv("VAD_MIN_SPEECH_MS", 200)),
+        "VAD_MAX_UTTERANCE_MS": int(getenv("VAD_MAX_UTTERANCE_MS", 15000)),
+        "SESSION_CACHE_SIZE": int(getenv("SESSION_CACHE_SIZE", 1000)),
+        "SESSION_CACHE_TTL": float(getenv("SESSION_CACHE_TTL", 300)),
+        "SESSION_WRITE_MODE": getenv("SESSION_WRITE_MODE", "write-through"),
+        "SESSION_WRITE_BEHIND_INTERVAL": float(getenv("SESSION_WRITE_BEHIND_INTERVAL", 0.5)),
+        "SESSION_HISTORY_WINDOW": int(getenv("SESSION_HISTORY_WINDOW", 10)),
+        "CONTEXT_HISTORY_TOKENS": int(getenv("CONTEXT_HISTORY_TOKENS", 1000)),
+        "CONTEXT_SUMMARY_ENABLED": getenv("CONTEXT_SUMMARY_ENABLED", "true").lower() == "true",
+        "CONTEXT_SUMMARY_MAX_TOKENS": int(getenv("CONTEXT_SUMMARY_MAX_TOKENS", 150)),
+        "SESSION_CODEC": getenv("SESSION_CODEC", "json"),
+        "SESSION_POOL_SIZE": int(getenv("SESSION_POOL_SIZE", 0)),
+        "SESSION_POOL_CONTEXTS": [context for context in getenv("SESSION_POOL_CONTEXTS", "receptionist").split(",") if context],
+        "SESSION_POOL_MAX_AGE": float(getenv("SESSION_POOL_MAX_AGE", SESSION_TTL / 2)),
+        "TTS_MODEL": getenv("TTS_MODEL", "tts-1"),
+        "TTS_VOICE": getenv("TTS_VOICE", "alloy"),
+        "TTS_CACHE_ENABLED": getenv("TTS_CACHE_ENABLED", "true").lower() == "true",
+        "TTS_CACHE_MEMORY_MB": float(getenv("TTS_CACHE_MEMORY_MB", 32)),
+        "TTS_CACHE_BACKEND": getenv("TTS_CACHE_BACKEND", "memory"),
+        "TTS_CACHE_DIR": getenv("TTS_CACHE_DIR", "/tmp/ai-engine-tts-cache"),
+        "TTS_CACHE_MAX_MB": float(getenv("TTS_CACHE_MAX_MB", 512)),
+        "TTS_CACHE_PREWARM": getenv("TTS_CACHE_PREWARM", "true").lower() == "true",
+        "RESPONSE_CACHE_ENABLED": getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true",
+        "RESPONSE_CACHE_THRESHOLD": float(getenv("RESPONSE_CACHE_THRESHOLD", 0.9)),
+        "RESPONSE_CACHE_TTL": float(getenv("RESPONSE_CACHE_TTL", 3600)),
+        "RESPONSE_CACHE_CONTEXT_TTLS": {
+            context.strip(): float(ttl)
+            for context, ttl in (
+                item.split("=", 1) for item in getenv("RESPONSE_CACHE_CONTEXT_TTLS", "").split(",") if "=" in item
+            )
+        },
+        "RESPONSE_CACHE_MAX_ENTRIES": int(getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+        "TTS_BACKEND": getenv("TTS_BACKEND", "openai"),
+        "TTS_PIPER_MODEL": getenv("TTS_PIPER_MODEL"),
+        "TTS_LOCAL_WORKERS": int(getenv("TTS_LOCAL_WORKERS", 2)),
+        "TTS_SAMPLE_RATE": int(getenv("TTS_SAMPLE_RATE", 16000)),
+        "BARGE_IN_ENABLED": getenv("BARGE_IN_ENABLED", "true").lower() == "true",
+        "BARGE_IN_THRESHOLD_DB": float(getenv("BARGE_IN_THRESHOLD_DB", -35)),
+        "BARGE_IN_MIN_SPEECH_MS": int(getenv("BARGE_IN_MIN_SPEECH_MS", 120)),
+        "STT_BACKEND": getenv("STT_BACKEND", "openai"),
+        "SPEECH_MODEL": getenv("SPEECH_MODEL", "whisper-1"),
+        "STT_LOCAL_MODEL": getenv("STT_LOCAL_MODEL", "base.en"),
+        "STT_LOCAL_COMPUTE_TYPE": getenv("STT_LOCAL_COMPUTE_TYPE", "int8"),
+        "STT_LOCAL_WORKERS": int(getenv("STT_LOCAL_WORKERS", 2)),
+        "STT_LOCAL_THREADS": int(getenv("STT_LOCAL_THREADS", 0)),
+        "STT_BATCH_SIZE": int(getenv("STT_BATCH_SIZE", 8)),
+        "STT_BATCH_WINDOW_MS": float(getenv("STT_BATCH_WINDOW_MS", 20)),
+        **{
+            f"UPSTREAM_{name}_{setting}": float(getenv(f"UPSTREAM_{name}_{setting}"))
+            for name in ("STT", "CHAT", "TTS")
+            for setting in ("CONCURRENCY", "TPM", "QUEUE", "TIMEOUT")
+            if getenv(f"UPSTREAM_{name}_{setting}")
+        },
+        "AUDIO_EXECUTOR": getenv("AUDIO_EXECUTOR", "thread"),
+        "AUDIO_EXECUTOR_WORKERS": int(getenv("AUDIO_EXECUTOR_WORKERS", 4)),
+        "AUDIO_OFFLOAD_MIN_BYTES": int(getenv("AUDIO_OFFLOAD_MIN_BYTES", 65536)),
+        "WORKERS": int(getenv("WORKERS", 1)),
+        "WORKER_CPU_AFFINITY": getenv("WORKER_CPU_AFFINITY", ""),
+        "WORKER_SOCKET_DIR": getenv("WORKER_SOCKET_DIR", "/tmp"),
+        "DRAIN_TIMEOUT": float(getenv("DRAIN_TIMEOUT", 30))
+    }
+
+def main():
+    """Main entry point"""
+    logger.info("Starting AI Engine server...")
+    run_workers(load_config())
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file
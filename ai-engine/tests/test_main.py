@@ -2,9 +2,25 @@ import pytest
 import asyncio
 import json
 import base64
+import time
+import numpy as np
+import fakeredis
+from contextlib import asynccontextmanager
 from unittest.mock import Mock, AsyncMock, patch
 from datetime import datetime
-from src.main import AIEngine, ConversationSession, CreateSessionRequest, ProcessAudioRequest
+from src.main import (
+    AIEngine, ConversationSession, CreateSessionRequest, ProcessAudioRequest, split_sentences,
+    encode_audio_frame, decode_audio_frame, audio_frame_to_wav, negotiate_audio_transport, G711_DECODE_TABLES,
+    VoiceActivityDetector, pcm_to_wav, SessionCache, SESSION_CODECS, get_session_codec,
+    session_to_metadata, session_from_storage,
+    TTSCache, STATIC_PHRASES, ResponseCache, normalize_utterance, RESPONSE_FALLBACK_MESSAGE,
+    UpstreamScheduler, UpstreamOverloaded, PRIORITY_ACTIVE_CALL, PRIORITY_NEW_CALL,
+    OpenAISTTBackend, FasterWhisperSTTBackend, create_stt_backend, _whisper_audio,
+    OpenAITTSBackend, PiperTTSBackend, create_tts_backend, resample_pcm, wav_to_pcm, contains_speech,
+    DrainingServer, worker_cpu_sets, load_config, AudioExecutor, decode_audio_payload, decode_frame_audio,
+    TRACE_HEADER, turn_trace, ContextWindow, session_owner, worker_socket_path, bind_worker_socket
+)
+import src.main as main_module
 
 @pytest.fixture
 def config():
@@ -14,7 +30,8 @@ def config():
         "REDIS_URL": "redis://localhost:6379",
         "HOST": "localhost",
         "PORT": 8081,
-        "DEBUG": True
+        "DEBUG": True,
+        "TTS_CACHE_PREWARM": False
     }
 
 @pytest.fixture
@@ -54,8 +71,12 @@ async def test_conversation_session_creation():
     assert session.messages == []
     assert session.user_profile == {}
 
+@pytest.fixture
+def fake_redis():
+    return fakeredis.aioredis.FakeRedis()
+
 @pytest.mark.asyncio
-async def test_create_conversation_session(ai_engine):
+async def test_create_conversation_session(ai_engine, fake_redis):
     """Test creating a new conversation session"""
     request = CreateSessionRequest(
         call_id="test-call-789",
@@ -64,15 +85,55 @@ async def test_create_conversation_session(ai_engine):
         language="en-US"
     )
     
-    with patch.object(ai_engine, 'redis', new=AsyncMock()) as mock_redis:
-        mock_redis.setex = AsyncMock()
-        
+    with patch.object(ai_engine, 'redis', new=fake_redis):
         result = await ai_engine.create_conversation_session(request)
         
         assert "session_id" in result
         assert result["status"] == "created"
         assert "welcome_message" in result
-        mock_redis.setex.assert_called_once()
+        
+        metadata = await fake_redis.hgetall(f"session:{result['session_id']}:meta")
+        assert metadata[b"call_id"] == b"test-call-789"
+        assert 0 < await fake_redis.ttl(f"session:{result['session_id']}:meta") <= 3600
+
+@pytest.mark.asyncio
+async def test_session_pool_binds_prestored_shells(config, fake_redis):
+    """Test session creation hands out a pooled shell and the pool is refilled"""
+    engine = AIEngine({**config, "SESSION_POOL_SIZE": 2, "SESSION_POOL_MAX_AGE": 60})
+    engine.redis = fake_redis
+    await engine.refill_session_pool()
+    shell_ids = [shell.session_id for _, shell in engine.session_pool.shells["receptionist"]]
+    assert len(shell_ids) == 2
+    assert (await fake_redis.hgetall(f"session:{shell_ids[0]}:meta"))[b"call_id"] == b""
+    
+    request = CreateSessionRequest(call_id="call-1", phone_number="+1987654321")
+    with patch.object(fake_redis, 'pipeline', wraps=fake_redis.pipeline) as mock_pipeline:
+        result = await engine.create_conversation_session(request)
+        # Creation itself does not wait on Redis
+        mock_pipeline.assert_not_called()
+        await asyncio.gather(*engine.binding_tasks.values())
+    assert result["session_id"] == shell_ids[0]
+    assert engine.session_cache.get(shell_ids[0]).call_id == "call-1"
+    metadata = await fake_redis.hgetall(f"session:{shell_ids[0]}:meta")
+    assert metadata[b"phone_number"] == b"+1987654321"
+    
+    # Contexts without a pool fall back to the normal path
+    other = await engine.create_conversation_session(CreateSessionRequest(call_id="call-2", phone_number="+1", context="sales"))
+    assert other["session_id"] not in shell_ids
+    assert engine.session_pool.stats()["misses"] == 1
+    
+    await engine.refill_session_pool()
+    assert len(engine.session_pool.shells["receptionist"]) == 2
+    engine.session_pool.max_age = 0
+    await engine.refill_session_pool()
+    assert engine.session_pool.retired == 2
+    assert not await fake_redis.exists(f"session:{shell_ids[1]}:meta")
+    
+    # Unused shells are deleted on shutdown; the bound sessions stay
+    await engine.drain_session_pool()
+    assert sorted(await fake_redis.keys("session:*:meta")) == sorted(
+        f"session:{session_id}:meta".encode() for session_id in (result["session_id"], other["session_id"])
+    )
 
 @pytest.mark.asyncio
 async def test_speech_to_text(ai_engine):
@@ -95,7 +156,7 @@ async def test_generate_response(ai_engine, sample_session):
     """Test AI response generation"""
     user_input = "I need help with my account"
     
-    with patch.object(ai_engine.openai_client.chat.completions, 'create') as mock_chat:
+    with patch.object(ai_engine.openai_client.chat.completions, 'create', new_callable=AsyncMock) as mock_chat:
         mock_response = Mock()
         mock_response.choices = [Mock()]
         mock_response.choices[0].message.content = "I'd be happy to help you with your account. What specific assistance do you need?"
@@ -106,6 +167,11 @@ async def test_generate_response(ai_engine, sample_session):
         assert "account" in result.lower()
         assert "help" in result.lower()
         mock_chat.assert_called_once()
+        
+    # The system prompt is followed by the call details, then the user's text once
+    messages = mock_chat.call_args.kwargs["messages"]
+    assert [message["role"] for message in messages] == ["system", "system", "user"]
+    assert "+1234567890" in messages[1]["content"]
 
 @pytest.mark.asyncio
 async def test_text_to_speech_bytes(ai_engine):
@@ -163,36 +229,45 @@ async def test_build_system_prompt(ai_engine):
     context = "receptionist"
     phone_number = "+1234567890"
     
-    prompt = ai_engine.build_system_prompt(context, phone_number)
+    prompt = ai_engine.build_system_prompt(context)
     
     assert "AI receptionist" in prompt
-    assert phone_number in prompt
     assert context in prompt
     assert "professional" in prompt
+    assert prompt == prompt.strip() and "\n        " not in prompt
+    
+    # The number goes in the per-call message, so the prompt is shared by every call
+    session = ConversationSession(
+        session_id="s1", call_id="c1", phone_number=phone_number, context=context, language="en-US",
+        created_at=datetime.now(), last_activity=datetime.now()
+    )
+    messages = ai_engine.build_chat_messages(session, "Hello")
+    assert messages[0]["content"] is ai_engine.context_window.system_prompt(context)
+    assert phone_number in messages[1]["content"]
 
 @pytest.mark.asyncio
-async def test_get_conversation_session_not_found(ai_engine):
+async def test_get_conversation_session_not_found(ai_engine, fake_redis):
     """Test getting non-existent session"""
-    with patch.object(ai_engine, 'redis', new=AsyncMock()) as mock_redis:
-        mock_redis.get.return_value = None
-        
+    with patch.object(ai_engine, 'redis', new=fake_redis):
         result = await ai_engine.get_conversation_session("non-existent")
         
         assert result is None
 
 @pytest.mark.asyncio
-async def test_cleanup_session(ai_engine):
+async def test_cleanup_session(ai_engine, fake_redis, sample_session):
     """Test session cleanup"""
-    session_id = "test-cleanup-session"
+    session_id = sample_session.session_id
     
-    with patch.object(ai_engine, 'redis', new=AsyncMock()) as mock_redis:
-        mock_redis.delete = AsyncMock()
+    with patch.object(ai_engine, 'redis', new=fake_redis):
+        sample_session.messages.append({"role": "user", "content": "Hi"})
+        await ai_engine.save_conversation_session(sample_session)
         
         result = await ai_engine.cleanup_session(session_id)
         
         assert result["status"] == "session_ended"
         assert result["session_id"] == session_id
-        mock_redis.delete.assert_called_once_with(f"session:{session_id}")
+        assert await fake_redis.exists(f"session:{session_id}:meta", f"session:{session_id}:messages") == 0
+        assert session_id not in ai_engine.session_cache.entries
 
 @pytest.mark.asyncio
 async def test_transcribe_speech_api_endpoint(ai_engine):
@@ -233,5 +308,1279 @@ async def test_empty_transcript_handling(ai_engine, sample_session):
         
         assert "didn't catch that" in result["text_response"].lower()
 
+def test_split_sentences():
+    """Test cutting streamed text at sentence boundaries"""
+    sentences, remainder = split_sentences("Thanks for calling. Our office opens at 9. We clo")
+    
+    assert sentences == ["Thanks for calling.", "Our office opens at 9."]
+    assert remainder == "We clo"
+    
+    # Short fragments are held back and merged with what follows
+    sentences, remainder = split_sentences("Hi! How can I help you today? ")
+    assert sentences == ["Hi! How can I help you today?"]
+    assert remainder == ""
+
+@pytest.mark.asyncio
+async def test_generate_response_stream(ai_engine, sample_session):
+    """Test streamed chat completion is yielded sentence by sentence"""
+    def chunk(text):
+        delta = Mock()
+        delta.content = text
+        choice = Mock()
+        choice.delta = delta
+        result = Mock()
+        result.choices = [choice]
+        return result
+        
+    async def fake_stream():
+        for token in ["Sure, our office ", "is open until 5. ", "Anything ", "else?"]:
+            yield chunk(token)
+            
+    with patch.object(ai_engine.openai_client.chat.completions, 'create', new=AsyncMock(return_value=fake_stream())) as mock_chat:
+        sentences = [s async for s in ai_engine.generate_response_stream(sample_session, "When do you close?")]
+        
+        assert sentences == ["Sure, our office is open until 5.", "Anything else?"]
+        assert mock_chat.call_args.kwargs["stream"] is True
+
+def long_call(session, turns):
+    """Fill a session with alternating turns of about 55 tokens each"""
+    for index in range(turns):
+        session.messages.append({
+            "role": "user" if index % 2 == 0 else "assistant",
+            "content": f"Turn {index} " + "details " * 25,
+            "timestamp": f"2024-01-01T10:00:{index:02d}"
+        })
+    session.messages.append({"role": "user", "content": "What time is it?", "timestamp": "2024-01-01T10:01:00"})
+
+@pytest.mark.asyncio
+async def test_unsummarized_turns_survive_write_and_reload(config, fake_redis, sample_session):
+    """Test turns a failed summary did not cover are neither trimmed nor left out on reload"""
+    engine = AIEngine({**config, "CONTEXT_HISTORY_TOKENS": 130, "SESSION_HISTORY_WINDOW": 4})
+    engine.redis = fake_redis
+    engine.session_cache = None
+    long_call(sample_session, 15)
+    
+    with patch.object(engine.openai_client.chat.completions, 'create', new=AsyncMock(side_effect=RuntimeError("shed"))):
+        engine.build_chat_messages(sample_session, "What time is it?")
+        await engine.summary_tasks[sample_session.session_id]
+    await engine.write_session(sample_session)
+    
+    assert sample_session.summary == ""
+    assert len(sample_session.messages) == 16
+    reloaded = await engine.get_conversation_session(sample_session.session_id)
+    assert [message["content"] for message in reloaded.messages] == [message["content"] for message in sample_session.messages]
+    
+    # Once summarized, older turns are trimmed and only the rest is reloaded
+    sample_session.summary = "The caller gave details."
+    sample_session.summary_through = sample_session.messages[9]["timestamp"]
+    sample_session.messages.append({"role": "assistant", "content": "It is ten.", "timestamp": "2024-01-01T10:01:01"})
+    await engine.write_session(sample_session)
+    assert sample_session.messages[0]["content"].startswith("Turn 9")
+    
+    reloaded = await engine.get_conversation_session(sample_session.session_id)
+    unsummarized = [message for message in reloaded.messages if not reloaded.is_summarized(message)]
+    assert unsummarized[0]["content"].startswith("Turn 10")
+    assert len(unsummarized) == 7
+    assert reloaded.stored_message_count == len(reloaded.messages)
+
+def test_context_window_token_budget(sample_session):
+    """Test history is filled newest first within the budget and the input is sent once"""
+    window = ContextWindow(lambda context: f"prompt for {context}", history_tokens=130, max_messages=10)
+    long_call(sample_session, 6)
+    
+    messages, overflow = window.build(sample_session, "What time is it?")
+    assert [message["role"] for message in messages] == ["system", "system", "user", "assistant", "user"]
+    assert [message["content"] for message in messages].count("What time is it?") == 1
+    assert overflow == sample_session.messages[:4]
+    assert all("tokens" in message for message in sample_session.messages[4:])
+    
+    # Messages covered by the summary are neither sent nor summarized again
+    sample_session.summary = "The caller asked about details."
+    sample_session.summary_through = sample_session.messages[1]["timestamp"]
+    messages, overflow = window.build(sample_session, "What time is it?")
+    assert "The caller asked about details." in messages[1]["content"]
+    assert overflow == sample_session.messages[2:4]
+    assert window.system_prompt("receptionist") is messages[0]["content"]
+
+@pytest.mark.asyncio
+async def test_older_turns_summarized_in_background(config, sample_session):
+    """Test turns that no longer fit are summarized instead of dropped"""
+    engine = AIEngine({**config, "CONTEXT_HISTORY_TOKENS": 130})
+    long_call(sample_session, 6)
+    summary = Mock()
+    summary.choices = [Mock()]
+    summary.choices[0].message.content = "The caller gave details for an appointment."
+    
+    with patch.object(engine.openai_client.chat.completions, 'create', new=AsyncMock(return_value=summary)) as mock_chat:
+        engine.build_chat_messages(sample_session, "What time is it?")
+        await engine.summary_tasks[sample_session.session_id]
+        
+    assert mock_chat.call_args.kwargs["messages"][1]["content"].startswith("user: Turn 0")
+    assert sample_session.summary == "The caller gave details for an appointment."
+    assert sample_session.summary_through == sample_session.messages[3]["timestamp"]
+    
+    messages = engine.build_chat_messages(sample_session, "What time is it?")
+    assert "appointment" in messages[1]["content"]
+    assert not engine.summary_tasks
+
+@pytest.mark.asyncio
+async def test_process_audio_stream(ai_engine, sample_session):
+    """Test streaming pipeline sends audio segments in order as they are ready"""
+    request = ProcessAudioRequest(
+        session_id="test-session-123",
+        audio_data=base64.b64encode(b"fake_audio").decode()
+    )
+    
+    async def fake_sentences(session, user_input):
+        yield "First sentence here."
+        yield "Second sentence here."
+        
+    async def fake_tts(text, **kwargs):
+        # Later sentences finish synthesis first; order must still hold
+        await asyncio.sleep(0.02 if text.startswith("First") else 0)
+        return text.encode()
+        
+    sent = []
+    
+    async def send(event):
+        sent.append(event)
+        
+    with patch.object(ai_engine, 'get_conversation_session', return_value=sample_session), \
+         patch.object(ai_engine, 'speech_to_text', return_value="What are your hours?"), \
+         patch.object(ai_engine, 'generate_response_stream', side_effect=fake_sentences), \
+         patch.object(ai_engine, 'text_to_speech_bytes', side_effect=fake_tts), \
+         patch.object(ai_engine, 'save_conversation_session') as mock_save:
+        
+        result = await ai_engine.process_audio_stream(request, send)
+        
+    assert [event["type"] for event in sent] == ["transcript", "audio_segment", "audio_segment"]
+    assert [event["sequence"] for event in sent[1:]] == [0, 1]
+    assert sent[1]["audio_data"] == b"First sentence here."
+    assert result["text_response"] == "First sentence here. Second sentence here."
+    assert result["segments"] == 2
+    assert result["time_to_first_audio_ms"] is not None
+    assert sample_session.messages[-1]["content"] == result["text_response"]
+    mock_save.assert_called_once()
+
+def test_audio_frame_round_trip():
+    """Test binary audio frames encode and decode without copying the payload"""
+    pcm = bytes(range(256)) * 2
+    data = encode_audio_frame("session-abc", 42, "l16", 16000, pcm)
+    
+    frame = decode_audio_frame(data)
+    
+    assert frame.session_id == "session-abc"
+    assert frame.sequence == 42
+    assert frame.codec == "l16"
+    assert frame.sample_rate == 16000
+    assert isinstance(frame.payload, memoryview)
+    assert frame.payload.obj is data
+    assert frame.payload == pcm
+
+def test_decode_audio_frame_rejects_bad_input():
+    """Test malformed frames are rejected"""
+    with pytest.raises(ValueError):
+        decode_audio_frame(b"\x01\x01")
+        
+    data = bytearray(encode_audio_frame("s", 0, "l16", 8000, b"\x00\x00"))
+    data[1] = 99
+    with pytest.raises(ValueError):
+        decode_audio_frame(bytes(data))
+
+def test_audio_frame_to_wav():
+    """Test raw and G.711 payloads are wrapped as 16-bit WAV"""
+    import wave, io
+    
+    ulaw = decode_audio_frame(encode_audio_frame("s", 0, "pcmu", 8000, bytes([0xFF, 0x7F, 0x00, 0x80])))
+    wav = wave.open(io.BytesIO(audio_frame_to_wav(ulaw)))
+    
+    assert wav.getframerate() == 8000
+    assert wav.getsampwidth() == 2
+    assert list(np.frombuffer(wav.readframes(4), dtype="<i2")) == [0, 0, -32124, 32124]
+    
+    # A-law 0xD5 is the smallest positive step
+    assert G711_DECODE_TABLES["pcma"][0xD5] == 8
+    assert G711_DECODE_TABLES["pcma"][0x55] == -8
+
+def test_negotiate_audio_transport():
+    """Test transport negotiation falls back to JSON"""
+    assert negotiate_audio_transport(["binary", "json"]) == "binary"
+    assert negotiate_audio_transport("json") == "json"
+    assert negotiate_audio_transport(["carrier-pigeon"]) == "json"
+    assert negotiate_audio_transport(None) == "json"
+
+@pytest.mark.asyncio
+async def test_process_audio_chunk_from_frame(ai_engine, sample_session):
+    """Test binary frames feed STT with WAV audio and can return raw audio"""
+    frame = decode_audio_frame(encode_audio_frame("test-session-123", 1, "l16", 16000, b"\x00\x00" * 160))
+    
+    with patch.object(ai_engine, 'get_conversation_session', return_value=sample_session), \
+         patch.object(ai_engine, 'speech_to_text', return_value="Hello") as mock_stt, \
+         patch.object(ai_engine, 'generate_response', return_value="Hi there"), \
+         patch.object(ai_engine, 'text_to_speech_bytes', return_value=b"mp3-bytes"), \
+         patch.object(ai_engine, 'save_conversation_session'):
+        
+        result = await ai_engine.process_audio_chunk(frame, encode_audio=False)
+        
+    assert mock_stt.call_args[0][0][:4] == b"RIFF"
+    assert result["audio_response"] == b"mp3-bytes"
+
+def test_websocket_binary_transport(ai_engine):
+    """Test /ws/stream negotiates binary audio and answers with a binary frame"""
+    from fastapi.testclient import TestClient
+    
+    with patch.object(ai_engine, 'initialize_redis'), \
+         patch.object(ai_engine, 'create_conversation_session', return_value={
+             "session_id": "ws-session", "welcome_message": "Hello!"
+         }), \
+         patch.object(ai_engine, 'process_audio_chunk', return_value={
+             "text_response": "Hi there", "audio_response": b"mp3-bytes", "session_id": "ws-session"
+         }) as mock_process, \
+         patch.object(ai_engine, 'cleanup_session'):
+        
+        with TestClient(ai_engine.app).websocket_connect("/ws/stream") as websocket:
+            websocket.send_json({"type": "hello", "audio_transport": ["binary", "json"]})
+            assert websocket.receive_json()["audio_transport"] == "binary"
+            
+            websocket.send_json({"type": "start_session", "data": {"call_id": "c1", "phone_number": "+1"}})
+            assert websocket.receive_json()["session_id"] == "ws-session"
+            
+            websocket.send_bytes(encode_audio_frame("", 7, "l16", 8000, b"\x00\x00" * 80))
+            response = websocket.receive_json()
+            audio = decode_audio_frame(websocket.receive_bytes())
+            
+    assert response["data"]["text_response"] == "Hi there"
+    assert "audio_response" not in response["data"]
+    assert audio.session_id == "ws-session"
+    assert audio.payload == b"mp3-bytes"
+    
+    frame = mock_process.call_args[0][0]
+    assert frame.session_id == "ws-session"
+    assert frame.sequence == 7
+
+def test_stream_mux_acks_dedups_and_resumes(ai_engine):
+    """Test /ws/mux interleaves sessions, skips resent chunks and reports them on resume"""
+    from fastapi.testclient import TestClient
+    
+    async def process(request, encode_audio=True, response_format=None):
+        return {"text_response": f"Hi {request.session_id}", "audio_response": b"wav-bytes", "session_id": request.session_id}
+        
+    with patch.object(ai_engine, 'initialize_redis'), \
+         patch.object(ai_engine, 'process_audio_chunk', side_effect=process) as mock_process:
+        client = TestClient(ai_engine.app)
+        with client.websocket_connect("/ws/mux") as websocket:
+            websocket.send_json({"type": "hello", "sessions": []})
+            assert websocket.receive_json()["sessions"] == {}
+            
+            websocket.send_bytes(encode_audio_frame("s1", 0, "l16", 8000, b"\x00\x00" * 80))
+            websocket.send_json({
+                "type": "audio_chunk", "session_id": "s2", "sequence": 0,
+                "audio_data": base64.b64encode(b"\x00\x00" * 80).decode(), "format": "base64"
+            })
+            # Resent after a lost acknowledgement
+            websocket.send_bytes(encode_audio_frame("s1", 0, "l16", 8000, b"\x00\x00" * 80))
+            
+            replies, acks = {}, {}
+            while len(replies) < 2 or acks != {"s1": 0, "s2": 0}:
+                message = websocket.receive_json()
+                if message["type"] == "ack":
+                    acks.update(message["sessions"])
+                else:
+                    assert message["type"] == "ai_response" and message["audio"]
+                    replies[message["session_id"]] = (message, decode_audio_frame(websocket.receive_bytes()))
+                    
+        with client.websocket_connect("/ws/mux") as websocket:
+            websocket.send_json({"type": "hello", "sessions": ["s1", "s2", "s3"]})
+            resumed = websocket.receive_json()
+            
+    assert mock_process.call_count == 2
+    message, audio = replies["s1"]
+    assert message["sequence"] == 0
+    assert message["data"]["text_response"] == "Hi s1"
+    assert "audio_response" not in message["data"]
+    assert (audio.session_id, audio.sequence, audio.payload) == ("s1", 0, b"wav-bytes")
+    assert replies["s2"][0]["data"]["text_response"] == "Hi s2"
+    assert resumed["sessions"] == {"s1": 0, "s2": 0, "s3": -1}
+
+def synthetic_call_audio(sample_rate=16000):
+    """Quiet line noise, one second of voiced speech-like tone, then silence"""
+    rng = np.random.default_rng(0)
+    t = np.arange(sample_rate) / sample_rate
+    voiced = 0.3 * np.sin(2 * np.pi * 180 * t) + 0.15 * np.sin(2 * np.pi * 360 * t)
+    noise = lambda seconds: 0.001 * rng.standard_normal(int(seconds * sample_rate))
+    audio = np.concatenate((noise(0.5), voiced, noise(1.0)))
+    return (audio * 32767).astype(np.int16)
+
+def test_vad_endpoints_single_utterance():
+    """Test VAD emits one utterance with trailing silence trimmed"""
+    detector = VoiceActivityDetector(sample_rate=16000, hangover_ms=400, pre_roll_ms=100)
+    audio = synthetic_call_audio()
+    
+    utterances = []
+    for start in range(0, len(audio), 320):
+        utterances.extend(detector.feed(audio[start:start + 320]))
+        
+    assert len(utterances) == 1
+    duration = len(utterances[0]) / 16000
+    assert 1.0 <= duration <= 1.15
+    assert detector.flush() is None
+
+def test_vad_ignores_silence_and_hiss():
+    """Test VAD does not open an utterance on silence or line hiss"""
+    detector = VoiceActivityDetector(sample_rate=8000)
+    rng = np.random.default_rng(1)
+    hiss = (0.02 * rng.standard_normal(8000 * 2) * 32767).astype(np.int16)
+    
+    assert detector.feed(np.zeros(8000, dtype=np.int16)) == []
+    assert detector.feed(hiss) == []
+    assert detector.flush() is None
+
+@pytest.mark.asyncio
+async def test_process_audio_chunk_waits_for_utterance(ai_engine, sample_session):
+    """Test VAD buffers audio and only sends complete utterances to STT"""
+    ai_engine.vad_enabled = True
+    audio = synthetic_call_audio()
+    half = 16000  # mid-utterance
+    
+    def request(pcm):
+        return ProcessAudioRequest(session_id="test-session-123", audio_data=base64.b64encode(pcm_to_wav(pcm, 16000)).decode())
+        
+    with patch.object(ai_engine, 'get_conversation_session', return_value=sample_session), \
+         patch.object(ai_engine, 'speech_to_text', return_value="Hello") as mock_stt, \
+         patch.object(ai_engine, 'generate_response', return_value="Hi there"), \
+         patch.object(ai_engine, 'text_to_speech_bytes', return_value=b"mp3"), \
+         patch.object(ai_engine, 'save_conversation_session'):
+        
+        result = await ai_engine.process_audio_chunk(request(audio[:half]))
+        assert result["status"] == "listening"
+        assert "text_response" not in result
+        mock_stt.assert_not_called()
+        
+        result = await ai_engine.process_audio_chunk(request(audio[half:]))
+        assert result["text_response"] == "Hi there"
+        mock_stt.assert_called_once()
+
+def make_session(session_id):
+    return ConversationSession(
+        session_id=session_id,
+        call_id=f"call-{session_id}",
+        phone_number="+1234567890",
+        context="receptionist",
+        language="en-US",
+        created_at=datetime.now(),
+        last_activity=datetime.now()
+    )
+
+def test_session_cache_lru_and_ttl():
+    """Test LRU eviction, TTL expiry and metrics of the session cache"""
+    cache = SessionCache(max_size=2, ttl=60)
+    cache.put(make_session("a"))
+    cache.put(make_session("b"))
+    assert cache.get("a").session_id == "a"  # a is now most recent
+    
+    cache.put(make_session("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    
+    cache.entries["c"] = (cache.entries["c"][0], 0)  # force expiry
+    assert cache.get("c") is None
+    
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+
+@pytest.mark.asyncio
+async def test_get_conversation_session_served_from_cache(ai_engine, fake_redis, sample_session):
+    """Test only the first read of a session goes to Redis"""
+    with patch.object(ai_engine, 'redis', new=fake_redis):
+        await ai_engine.write_session(sample_session)
+        
+        with patch.object(fake_redis, 'pipeline', wraps=fake_redis.pipeline) as mock_pipeline:
+            first = await ai_engine.get_conversation_session("test-session-123")
+            second = await ai_engine.get_conversation_session("test-session-123")
+            
+        assert first is second
+        assert first.created_at == sample_session.created_at
+        mock_pipeline.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_write_behind_coalesces_saves(config, fake_redis, sample_session):
+    """Test write-behind mode writes a session once however often it is saved"""
+    engine = AIEngine({**config, "SESSION_WRITE_MODE": "write-behind"})
+    
+    with patch.object(engine, 'redis', new=fake_redis), \
+         patch.object(engine, 'publish_invalidation') as mock_publish:
+        for turn in range(3):
+            sample_session.messages.append({"role": "user", "content": f"turn {turn}"})
+            await engine.save_conversation_session(sample_session)
+        assert await fake_redis.exists("session:test-session-123:meta") == 0
+        
+        await engine.flush_dirty_sessions()
+        
+        assert await fake_redis.llen("session:test-session-123:messages") == 3
+        mock_publish.assert_called_once()
+        assert engine.dirty_sessions == {}
+
+@pytest.mark.asyncio
+async def test_turns_are_appended_not_rewritten(config, fake_redis, sample_session):
+    """Test each save appends only new messages and reads load the recent window"""
+    # Without summaries nothing waits to be summarized, so memory is bounded by the window
+    engine = AIEngine({**config, "SESSION_CACHE_SIZE": 0, "SESSION_HISTORY_WINDOW": 4, "CONTEXT_SUMMARY_ENABLED": False})
+    
+    with patch.object(engine, 'redis', new=fake_redis):
+        for turn in range(6):
+            sample_session.messages.append({"role": "user", "content": f"question {turn}"})
+            sample_session.messages.append({"role": "assistant", "content": f"answer {turn}"})
+            await engine.save_conversation_session(sample_session)
+            assert await fake_redis.llen("session:test-session-123:messages") == 2 * (turn + 1)
+            
+        assert await fake_redis.llen("session:test-session-123:messages") == 12
+        assert len(sample_session.messages) <= 8  # in-memory history is bounded
+        
+        loaded = await engine.get_conversation_session("test-session-123")
+        
+    assert [m["content"] for m in loaded.messages] == ["question 4", "answer 4", "question 5", "answer 5"]
+    assert loaded.stored_message_count == 4
+    assert isinstance(loaded.last_activity, datetime)
+
+def test_handle_invalidation_from_other_replica(ai_engine, sample_session):
+    """Test invalidations drop cached sessions unless we published them"""
+    ai_engine.session_cache.put(sample_session)
+    
+    own = json.dumps({"session_id": sample_session.session_id, "origin": ai_engine.instance_id})
+    assert ai_engine.handle_invalidation(own) is False
+    assert sample_session.session_id in ai_engine.session_cache.entries
+    
+    other = json.dumps({"session_id": sample_session.session_id, "origin": "other-replica"})
+    assert ai_engine.handle_invalidation(other) is True
+    assert sample_session.session_id not in ai_engine.session_cache.entries
+
+@pytest.mark.parametrize("codec_name", list(SESSION_CODECS))
+def test_session_codec_round_trip(codec_name, sample_session):
+    """Test every codec round-trips stored sessions including datetimes and the summary"""
+    codec = get_session_codec(codec_name)
+    sample_session.messages.append({"role": "user", "content": "Hi", "timestamp": datetime.now().isoformat()})
+    sample_session.user_profile = {"name": "Alex"}
+    
+    sample_session.summary = "Caller asked about opening hours."
+    sample_session.summary_through = datetime.now().isoformat()
+    
+    metadata = session_to_metadata(sample_session, codec)
+    decoded = session_from_storage(metadata, [codec.dumps(message) for message in sample_session.messages], codec)
+    
+    assert decoded == sample_session
+    assert isinstance(decoded.created_at, datetime)
+    assert codec.loads(codec.dumps({"at": sample_session.created_at})) == {"at": sample_session.created_at.isoformat()}
+
+def test_msgpack_codec_reads_json_values():
+    """Test switching to msgpack keeps previously stored JSON entries readable"""
+    codec = get_session_codec("msgpack")
+    legacy = get_session_codec("json").dumps({"role": "user", "content": "Hello"})
+    
+    assert codec.loads(legacy) == {"role": "user", "content": "Hello"}
+
+def test_conversation_session_uses_slots(sample_session):
+    """Test sessions carry no per-instance __dict__"""
+    assert not hasattr(sample_session, "__dict__")
+    with pytest.raises(AttributeError):
+        sample_session.unexpected = True
+
+@pytest.mark.asyncio
+async def test_storage_with_binary_codec(config, fake_redis, sample_session):
+    """Test sessions persist and load through the msgpack codec"""
+    engine = AIEngine({**config, "SESSION_CACHE_SIZE": 0, "SESSION_CODEC": "msgpack"})
+    sample_session.messages.append({"role": "user", "content": "Hi"})
+    sample_session.user_profile = {"vip": True}
+    
+    with patch.object(engine, 'redis', new=fake_redis):
+        await engine.save_conversation_session(sample_session)
+        loaded = await engine.get_conversation_session(sample_session.session_id)
+        
+    assert loaded.messages == [{"role": "user", "content": "Hi"}]
+    assert loaded.user_profile == {"vip": True}
+    assert loaded.last_activity == sample_session.last_activity
+
+@pytest.mark.asyncio
+async def test_tts_cache_memory_lru_by_size():
+    """Test the memory tier evicts least recently used audio by total bytes"""
+    cache = TTSCache(max_memory_bytes=10)
+    await cache.put("a", b"12345")
+    await cache.put("b", b"12345")
+    assert await cache.get("a") == b"12345"
+    
+    await cache.put("c", b"12345")
+    
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.memory_bytes == 10
+
+@pytest.mark.asyncio
+async def test_tts_cache_disk_tier(tmp_path):
+    """Test the disk tier survives restarts and is evicted by size"""
+    cache = TTSCache(max_memory_bytes=1024, backend="disk", directory=str(tmp_path), max_backend_bytes=8)
+    await cache.put("first", b"1234")
+    await cache.put("second", b"5678")
+    
+    restarted = TTSCache(max_memory_bytes=1024, backend="disk", directory=str(tmp_path), max_backend_bytes=8)
+    assert await restarted.get("first") == b"1234"
+    assert restarted.stats()["backend_hits"] == 1
+    
+    await restarted.put("third", b"9abc")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["first", "third"]
+
+@pytest.mark.asyncio
+async def test_tts_cache_redis_tier(fake_redis):
+    """Test the Redis tier is shared and evicted by total size"""
+    cache = TTSCache(max_memory_bytes=1024, backend="redis", max_backend_bytes=8)
+    cache.redis = fake_redis
+    await cache.put("first", b"1234")
+    await cache.put("second", b"5678")
+    await cache.put("third", b"9abc")
+    
+    other_replica = TTSCache(backend="redis")
+    other_replica.redis = fake_redis
+    assert await other_replica.get("first") is None
+    assert await other_replica.get("third") == b"9abc"
+    assert int(await fake_redis.get(TTSCache.REDIS_BYTES_KEY)) == 8
+
+@pytest.mark.asyncio
+async def test_text_to_speech_bytes_uses_cache(ai_engine):
+    """Test repeated phrases are synthesized once"""
+    with patch.object(ai_engine.openai_client.audio.speech, 'create') as mock_tts:
+        mock_response = Mock()
+        mock_response.content = b"fake_audio_bytes"
+        mock_tts.return_value = mock_response
+        
+        first = await ai_engine.text_to_speech_bytes("Thank you  for calling.")
+        second = await ai_engine.text_to_speech_bytes("Thank you for calling.")
+        other_voice = await ai_engine.text_to_speech_bytes("Thank you for calling.", voice="nova")
+        
+    assert first == second == other_voice == b"fake_audio_bytes"
+    assert mock_tts.call_count == 2
+
+@pytest.mark.asyncio
+async def test_prewarm_tts_cache(ai_engine):
+    """Test all fixed phrases are rendered into the cache"""
+    with patch.object(ai_engine.openai_client.audio.speech, 'create') as mock_tts:
+        mock_response = Mock()
+        mock_response.content = b"audio"
+        mock_tts.return_value = mock_response
+        
+        await ai_engine.prewarm_tts_cache()
+        
+    assert [call.kwargs["input"] for call in mock_tts.call_args_list] == list(STATIC_PHRASES)
+    assert len(ai_engine.tts_cache.memory) == len(STATIC_PHRASES)
+
+def test_response_cache_exact_and_semantic_hits():
+    """Test normalized exact hits, paraphrase hits and the similarity threshold"""
+    cache = ResponseCache(similarity_threshold=0.6)
+    cache.put("receptionist", "What are your opening hours?", "We are open 9 to 5.", latency_ms=800)
+    
+    assert normalize_utterance("  What are your OPENING hours??") == "what are your opening hours"
+    assert cache.get("receptionist", "what are your opening hours") == "We are open 9 to 5."
+    assert cache.get("receptionist", "what are the opening hours") == "We are open 9 to 5."
+    assert cache.get("receptionist", "can I book a table") is None
+    assert cache.get("sales", "what are your opening hours") is None
+    
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 2)
+    assert stats["latency_saved_ms"] == 1600
+    assert sum(stats["miss_similarity_histogram"].values()) == 2
+
+def test_response_cache_ttl_and_prompt_version():
+    """Test per-context TTLs, expiry and prompt version isolation"""
+    cache = ResponseCache(default_ttl=60, context_ttls={"promotions": 0})
+    cache.put("promotions", "any deals today", "Yes, 10% off.", latency_ms=500)
+    assert cache.get("promotions", "any deals today") is None
+    
+    cache.put("receptionist", "where are you located", "Main Street.", latency_ms=500)
+    cache.entries[next(iter(cache.entries))].expires_at = 0
+    assert cache.get("receptionist", "where are you located") is None
+    
+    cache.put("receptionist", "where are you located", "Main Street.", latency_ms=500)
+    cache.prompt_version = "next"
+    assert cache.get("receptionist", "where are you located") is None
+
+def test_response_cache_is_cacheable(sample_session):
+    """Test personal data and fallbacks are never cached"""
+    sample_session.user_profile = {}
+    assert ResponseCache.is_cacheable(sample_session, "What are your hours?", "9 to 5.")
+    assert not ResponseCache.is_cacheable(sample_session, "When is my appointment?", "Tomorrow.")
+    assert not ResponseCache.is_cacheable(sample_session, "Call me at 555 1234", "Sure.")
+    assert not ResponseCache.is_cacheable(sample_session, "Who is this?", "I have +1234567890 on file.")
+    assert not ResponseCache.is_cacheable(sample_session, "What are your hours?", RESPONSE_FALLBACK_MESSAGE)
+    sample_session.user_profile = {"name": "Ann"}
+    assert not ResponseCache.is_cacheable(sample_session, "What are your hours?", "9 to 5.")
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_response_cache(config, sample_session):
+    """Test a cached reply skips the chat completion"""
+    engine = AIEngine({**config, "RESPONSE_CACHE_ENABLED": True})
+    sample_session.user_profile = {}
+    completion = Mock()
+    completion.choices = [Mock(message=Mock(content="We are open 9 to 5. Anything else?"))]
+    
+    with patch.object(engine.openai_client.chat.completions, 'create', new=AsyncMock(return_value=completion)) as mock_chat:
+        first = await engine.generate_response(sample_session, "What are your hours?")
+        second = await engine.generate_response(sample_session, "what are your hours")
+        streamed = [sentence async for sentence in engine.generate_response_stream(sample_session, "What are your hours")]
+        
+    assert first == second == "We are open 9 to 5. Anything else?"
+    assert streamed == ["We are open 9 to 5.", "Anything else?"]
+    assert mock_chat.await_count == 1
+    assert engine.response_cache.stats()["exact_hits"] == 2
+
+@pytest.mark.asyncio
+async def test_response_cache_keyed_on_previous_turn(config, sample_session):
+    """Test the same short answer after a different question is not served from the cache"""
+    engine = AIEngine({**config, "RESPONSE_CACHE_ENABLED": True})
+    sample_session.user_profile = {}
+    replies = iter(["Great, you're booked for Tuesday.", "Okay, I'll transfer you to billing."])
+    
+    async def chat(**kwargs):
+        return Mock(choices=[Mock(message=Mock(content=next(replies)))])
+        
+    with patch.object(engine.openai_client.chat.completions, 'create', new=AsyncMock(side_effect=chat)) as mock_chat:
+        sample_session.messages.append({"role": "assistant", "content": "Shall I book you for Tuesday?"})
+        booked = await engine.generate_response(sample_session, "Yes")
+        sample_session.messages.append({"role": "assistant", "content": "Do you want to talk to billing?"})
+        transferred = await engine.generate_response(sample_session, "yes")
+        
+    assert booked == "Great, you're booked for Tuesday."
+    assert transferred == "Okay, I'll transfer you to billing."
+    assert mock_chat.await_count == 2
+    assert engine.response_cache.stats()["exact_hits"] == 0
+    assert engine.response_cache.stats()["semantic_hits"] == 0
+
+@pytest.mark.asyncio
+async def test_upstream_scheduler_limits_concurrency_and_prioritizes():
+    """Test queued calls run in priority order once a slot frees up"""
+    scheduler = UpstreamScheduler("chat", max_concurrency=1, max_queue=4, timeout=5)
+    gate = asyncio.Event()
+    order = []
+    
+    async def call(label):
+        order.append(label)
+        await gate.wait()
+        return label
+        
+    first = asyncio.create_task(scheduler.run(lambda: call("first")))
+    await asyncio.sleep(0)
+    new = asyncio.create_task(scheduler.run(lambda: call("new"), priority=PRIORITY_NEW_CALL))
+    await asyncio.sleep(0)
+    active = asyncio.create_task(scheduler.run(lambda: call("active"), priority=PRIORITY_ACTIVE_CALL))
+    await asyncio.sleep(0)
+    
+    assert scheduler.stats()["in_flight"] == 1
+    assert scheduler.stats()["queued"] == 2
+    gate.set()
+    assert await asyncio.gather(first, new, active) == ["first", "new", "active"]
+    assert order == ["first", "active", "new"]
+    assert scheduler.stats()["completed"] == 3
+
+@pytest.mark.asyncio
+async def test_upstream_scheduler_sheds_when_queue_full():
+    """Test a full queue sheds new calls but displaces them for active calls"""
+    scheduler = UpstreamScheduler("stt", max_concurrency=1, max_queue=1, timeout=5)
+    await scheduler.acquire()
+    queued_new = asyncio.create_task(scheduler.acquire(priority=PRIORITY_NEW_CALL))
+    await asyncio.sleep(0)
+    assert scheduler.saturated
+    
+    with pytest.raises(UpstreamOverloaded, match="queue full"):
+        await scheduler.acquire(priority=PRIORITY_NEW_CALL)
+        
+    queued_active = asyncio.create_task(scheduler.acquire(priority=PRIORITY_ACTIVE_CALL))
+    await asyncio.sleep(0)
+    with pytest.raises(UpstreamOverloaded, match="displaced"):
+        await queued_new
+        
+    scheduler.release()
+    await queued_active
+    assert scheduler.stats()["shed"] == 2
+
+@pytest.mark.asyncio
+async def test_upstream_scheduler_deadlines():
+    """Test calls are shed up front or at the deadline instead of waiting forever"""
+    scheduler = UpstreamScheduler("tts", max_concurrency=1, max_queue=8, timeout=5)
+    await scheduler.acquire()
+    
+    scheduler.service_time = 10
+    with pytest.raises(UpstreamOverloaded, match="exceeds deadline"):
+        await scheduler.acquire(deadline=time.monotonic() + 1)
+        
+    scheduler.service_time = 0.01
+    with pytest.raises(UpstreamOverloaded, match="at deadline"):
+        await scheduler.acquire(deadline=time.monotonic() + 0.05)
+    assert scheduler.stats()["queued"] == 0
+    assert scheduler.stats()["timeouts"] == 1
+
+@pytest.mark.asyncio
+async def test_upstream_scheduler_token_budget():
+    """Test calls wait for the per-minute budget to refill"""
+    scheduler = UpstreamScheduler("chat", max_concurrency=4, tokens_per_minute=6000, timeout=5)
+    await scheduler.acquire(tokens=6000)
+    scheduler.release()
+    
+    started = time.monotonic()
+    await scheduler.acquire(tokens=5)  # 100 tokens/s refill
+    assert time.monotonic() - started >= 0.04
+    scheduler.release()
+
+@pytest.mark.asyncio
+async def test_ready_reports_saturated_upstreams(ai_engine, fake_redis):
+    """Test /ready answers 503 while an upstream queue is full"""
+    from httpx import AsyncClient
+    
+    ai_engine.redis = fake_redis
+    async with AsyncClient(app=ai_engine.app, base_url="http://test") as client:
+        assert (await client.get("/ready")).status_code == 200
+        
+        ai_engine.upstreams["tts"].max_queue = 0
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["saturated"] == ["tts"]
+        
+        ai_engine.redis = None
+        assert (await client.get("/ready")).status_code == 503
+
+def test_create_stt_backend(config, ai_engine):
+    """Test backend selection and fallback when faster-whisper is missing"""
+    assert isinstance(ai_engine.stt_backend, OpenAISTTBackend)
+    with patch.object(main_module, "faster_whisper", None):
+        backend = create_stt_backend({**config, "STT_BACKEND": "faster-whisper"}, Mock(), Mock())
+    assert isinstance(backend, OpenAISTTBackend)
+    with pytest.raises(ValueError):
+        create_stt_backend({**config, "STT_BACKEND": "vosk"}, Mock(), Mock())
+
+def test_whisper_audio_resamples_to_16k():
+    """Test local STT input is converted to 16 kHz float samples"""
+    pcm = (np.sin(np.arange(8000) / 8) * 8000).astype(np.int16)
+    audio = _whisper_audio(pcm_to_wav(pcm, 8000))
+    assert audio.dtype == np.float32
+    assert len(audio) == 16000
+    assert np.abs(audio).max() < 0.3
+
+@pytest.mark.asyncio
+async def test_faster_whisper_backend_batches_concurrent_sessions(monkeypatch):
+    """Test concurrent requests from different sessions share one batch"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    batches = []
+    
+    def fake_batch(items):
+        batches.append(len(items))
+        return [f"{language}:{len(audio)}" for audio, language in items]
+        
+    monkeypatch.setattr(main_module, "faster_whisper", Mock())
+    monkeypatch.setattr(main_module, "_whisper_transcribe_batch", fake_batch)
+    monkeypatch.setattr(main_module, "ProcessPoolExecutor",
+                        lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers))
+    
+    backend = FasterWhisperSTTBackend(workers=1, batch_size=4, batch_window_ms=50)
+    await backend.start()
+    try:
+        texts = await asyncio.gather(*(
+            backend.transcribe(b"x" * size, language) for size, language in ((1, "en-US"), (2, "en-GB"), (3, "fr-FR"))
+        ))
+    finally:
+        await backend.close()
+        
+    assert texts == ["en:1", "en:2", "fr:3"]
+    assert batches == [3]
+    assert backend.stats()["avg_batch_size"] == 3
+
+def test_resample_pcm():
+    """Test polyphase resampling keeps duration and tone"""
+    tone = (np.sin(2 * np.pi * 440 * np.arange(24000) / 24000) * 10000).astype(np.int16)
+    resampled = resample_pcm(tone, 24000, 8000)
+    assert resampled.dtype == np.int16
+    assert len(resampled) == 8000
+    spectrum = np.abs(np.fft.rfft(resampled))
+    assert abs(np.argmax(spectrum) - 440) <= 1
+
+def test_create_tts_backend(config, ai_engine):
+    """Test backend selection and fallback when piper is unavailable"""
+    assert isinstance(ai_engine.tts_backend, OpenAITTSBackend)
+    with patch.object(main_module, "piper", None):
+        backend = create_tts_backend({**config, "TTS_BACKEND": "piper", "TTS_PIPER_MODEL": "voice.onnx"}, Mock(), Mock())
+    assert isinstance(backend, OpenAITTSBackend)
+    with pytest.raises(ValueError):
+        create_tts_backend({**config, "TTS_BACKEND": "espeak"}, Mock(), Mock())
+
+@pytest.mark.asyncio
+async def test_openai_tts_backend_resamples_pcm(ai_engine):
+    """Test linear PCM requests are fetched at 24 kHz and resampled"""
+    with patch.object(ai_engine.openai_client.audio.speech, 'create') as mock_tts:
+        mock_tts.return_value = Mock(content=np.zeros(2400, dtype="<i2").tobytes())
+        pcm = await ai_engine.tts_backend.synthesize("Hello.", audio_format="pcm", sample_rate=8000)
+        wav = await ai_engine.tts_backend.synthesize("Hello.", audio_format="wav", sample_rate=16000)
+        
+    assert mock_tts.call_args.kwargs["response_format"] == "pcm"
+    assert len(pcm) == 800 * 2
+    samples, rate = wav_to_pcm(wav)
+    assert (len(samples), rate) == (1600, 16000)
+
+@pytest.mark.asyncio
+async def test_piper_tts_backend_runs_in_pool(monkeypatch):
+    """Test the local backend synthesizes in its worker pool"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    monkeypatch.setattr(main_module, "piper", Mock())
+    monkeypatch.setattr(main_module, "_piper_synthesize", lambda text, rate: b"\x01\x00" * (rate // 100))
+    monkeypatch.setattr(main_module, "ProcessPoolExecutor",
+                        lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers))
+    
+    backend = PiperTTSBackend("voice.onnx", workers=1, sample_rate=16000)
+    try:
+        assert await backend.synthesize("Hi.", audio_format="pcm", sample_rate=8000) == b"\x01\x00" * 80
+        samples, rate = wav_to_pcm(await backend.synthesize("Hi."))
+        assert (len(samples), rate) == (160, 16000)
+        with pytest.raises(ValueError):
+            await backend.synthesize("Hi.", audio_format="mp3")
+    finally:
+        await backend.close()
+
+@pytest.mark.asyncio
+async def test_stream_speech_pcm_in_sentence_order(ai_engine):
+    """Test streamed PCM is chunked and keeps sentence order"""
+    async def fake_synthesize(text, voice, audio_format, sample_rate, priority):
+        await asyncio.sleep(0.02 if text.startswith("First") else 0)
+        return (b"\x01\x00" if text.startswith("First") else b"\x02\x00") * 240
+        
+    with patch.object(ai_engine.tts_backend, 'synthesize', side_effect=fake_synthesize) as mock_synth:
+        chunks = [chunk async for chunk in ai_engine.stream_speech_pcm("First sentence here. Second one follows.")]
+        
+    assert mock_synth.call_args.args[2:4] == ("pcm", 8000)
+    assert [len(chunk) for chunk in chunks] == [320, 160, 320, 160]
+    assert chunks[0][:2] == b"\x01\x00" and chunks[2][:2] == b"\x02\x00"
+
+@pytest.mark.asyncio
+async def test_synthesize_streaming_endpoint(ai_engine):
+    """Test /synthesize streams raw PCM when asked to"""
+    from httpx import AsyncClient
+    
+    async def fake_stream(text, voice, sample_rate):
+        yield b"\x00\x00" * 160
+        yield b"\x00\x00" * 160
+        
+    with patch.object(ai_engine, 'stream_speech_pcm', side_effect=fake_stream):
+        async with AsyncClient(app=ai_engine.app, base_url="http://test") as client:
+            response = await client.post("/synthesize", json={"text": "Hello.", "stream": True, "sample_rate": 8000})
+            
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("audio/L16; rate=8000")
+    assert len(response.content) == 640
+
+def test_contains_speech():
+    """Test barge-in detection ignores silence and short clicks"""
+    t = np.arange(8000) / 8000
+    speech = (np.sin(2 * np.pi * 220 * t) * 6000).astype(np.int16)
+    quiet = (np.random.default_rng(0).normal(0, 30, 8000)).astype(np.int16)
+    click = quiet.copy()
+    click[:160] = 8000
+    
+    assert contains_speech(speech, 8000)
+    assert not contains_speech(quiet, 8000)
+    assert not contains_speech(click, 8000)
+    assert not contains_speech(speech[:10], 8000)
+
+@pytest.mark.asyncio
+async def test_barge_in_cancels_streaming_turn(ai_engine, fake_redis, sample_session):
+    """Test barge-in stops LLM/TTS work mid-reply and records where it was cut off"""
+    request = ProcessAudioRequest(session_id="test-session-123", audio_data=base64.b64encode(b"audio").decode())
+    sample_session.messages = []
+    first_segment_sent = asyncio.Event()
+    generation_cancelled = asyncio.Event()
+    sent = []
+    
+    async def slow_sentences(session, user_input):
+        yield "First sentence here."
+        try:
+            await asyncio.sleep(10)
+            yield "Never spoken."
+        except asyncio.CancelledError:
+            generation_cancelled.set()
+            raise
+            
+    async def fake_tts(text, **kwargs):
+        return text.encode()
+        
+    async def send(event):
+        sent.append(event)
+        if event["type"] == "audio_segment":
+            first_segment_sent.set()
+            
+    with patch.object(ai_engine, 'redis', new=fake_redis), \
+         patch.object(ai_engine, 'speech_to_text', return_value="What are your hours?"), \
+         patch.object(ai_engine, 'generate_response_stream', side_effect=slow_sentences), \
+         patch.object(ai_engine, 'text_to_speech_bytes', side_effect=fake_tts):
+        await ai_engine.save_conversation_session(sample_session)
+        
+        turn = ai_engine.start_turn("test-session-123", ai_engine.process_audio_stream(request, send))
+        await asyncio.wait_for(first_segment_sent.wait(), 1)
+        result = await ai_engine.barge_in("test-session-123", played_ms=400)
+        
+        assert result["cancelled"] is True
+        assert turn.cancelled()
+        assert generation_cancelled.is_set()
+        assert [event["type"] for event in sent] == ["transcript", "audio_segment"]
+        assert "test-session-123" not in ai_engine.active_turns
+        
+        reply = sample_session.messages[-1]
+        assert (reply["role"], reply["content"], reply["interrupted"], reply["played_ms"]) == \
+            ("assistant", "First sentence here.", True, 400)
+        stored = json.loads(await fake_redis.lindex("session:test-session-123:messages", -1))
+        assert stored["played_ms"] == 400
+
+@pytest.mark.asyncio
+async def test_run_turn_reports_interruption(ai_engine):
+    """Test an HTTP turn cancelled by barge-in answers "interrupted" """
+    async def slow_turn():
+        await asyncio.sleep(10)
+        
+    with patch.object(ai_engine, 'mark_interrupted') as mock_mark:
+        pending = asyncio.create_task(ai_engine.run_turn("s1", slow_turn()))
+        await asyncio.sleep(0)
+        assert (await ai_engine.barge_in("s1"))["cancelled"] is True
+        assert await pending == {"status": "interrupted", "session_id": "s1"}
+        mock_mark.assert_called_once_with("s1", None)
+        assert (await ai_engine.barge_in("s1"))["cancelled"] is False
+
+def test_worker_cpu_sets():
+    """Test WORKER_CPU_AFFINITY parsing and round-robin assignment"""
+    assert worker_cpu_sets("", 3) == [None, None, None]
+    assert worker_cpu_sets("0-1,4", 4) == [{0}, {1}, {4}, {0}]
+    assert all(len(cpus) == 1 for cpus in worker_cpu_sets("auto", 2))
+    
+    with patch.dict("os.environ", {"WORKERS": "4", "WORKER_CPU_AFFINITY": "auto"}):
+        config = load_config()
+    assert (config["WORKERS"], config["WORKER_CPU_AFFINITY"], config["DRAIN_TIMEOUT"]) == (4, "auto", 30.0)
+
+@pytest.mark.asyncio
+async def test_draining_refuses_new_sessions(ai_engine, fake_redis):
+    """Test a draining worker fails readiness and refuses new sessions"""
+    from httpx import AsyncClient
+    
+    ai_engine.redis = fake_redis
+    ai_engine.draining = True
+    async with AsyncClient(app=ai_engine.app, base_url="http://test") as client:
+        response = await client.get("/ready")
+        assert (response.status_code, response.json()["status"]) == (503, "draining")
+        response = await client.post("/session/create", json={"call_id": "c1", "phone_number": "+1"})
+        assert response.status_code == 503
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_open_streams(ai_engine):
+    """Test SIGTERM handling stops listening and waits for open call streams"""
+    server = DrainingServer(main_module.uvicorn.Config(ai_engine.app), ai_engine, drain_timeout=5)
+    listener = Mock()
+    server.servers = [listener]
+    ai_engine.open_streams = 1
+    
+    server.begin_drain()
+    await asyncio.sleep(0.2)
+    assert ai_engine.draining
+    listener.close.assert_called_once()
+    assert not server.should_exit
+    
+    ai_engine.open_streams = 0
+    await server.drain_task
+    assert server.should_exit and not server.force_exit
+    
+    # A second signal skips the drain
+    server.begin_drain()
+    assert server.force_exit
+
+@pytest.mark.asyncio
+async def test_audio_executor_thread_pool_metrics():
+    """Test small payloads stay inline and queued work shows up in the metrics"""
+    executor = AudioExecutor("thread", workers=1, min_offload_bytes=100)
+    await executor.start()
+    try:
+        assert await executor.run(len, b"x" * 10) == 10
+        assert executor.stats()["inline"] == 1
+        
+        results = await asyncio.gather(*(executor.run(lambda data: time.sleep(0.02) or len(data), b"x" * 200) for _ in range(3)))
+        stats = executor.stats()
+        assert results == [200, 200, 200]
+        assert (stats["offloaded"], stats["max_queue_depth"], stats["in_flight"]) == (3, 2, 0)
+        assert stats["avg_wait_ms"] > 0
+    finally:
+        await executor.close()
+
+def slow_copy(data):
+    """Audio task that outlives the caller waiting on it"""
+    time.sleep(0.5)
+    return bytes(data)
+
+def shared_blocks():
+    import os
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+@pytest.mark.asyncio
+async def test_audio_executor_process_pool_shared_memory():
+    """Test process mode passes arrays, frames and byte payloads through shared memory and frees the blocks"""
+    before = shared_blocks()
+    executor = AudioExecutor("process", workers=1, min_offload_bytes=0)
+    await executor.start()
+    try:
+        pcm = (np.sin(np.arange(24000) * 0.05) * 8000).astype(np.int16)
+        resampled = await executor.run(resample_pcm, pcm, 24000, 8000)
+        np.testing.assert_array_equal(resampled, resample_pcm(pcm, 24000, 8000))
+        
+        payload = base64.b64encode(pcm_to_wav(pcm, 24000)).decode()
+        audio_bytes, decoded, sample_rate = await executor.run(decode_audio_payload, payload)
+        assert audio_bytes[:4] == b"RIFF" and sample_rate == 24000
+        np.testing.assert_array_equal(decoded, pcm)
+        
+        frame = decode_audio_frame(encode_audio_frame("s1", 3, "l16", 24000, pcm.tobytes()))
+        wav, decoded, sample_rate = await executor.run(decode_frame_audio, frame)
+        assert wav[:4] == b"RIFF" and sample_rate == 24000
+        np.testing.assert_array_equal(decoded, pcm)
+        assert await executor.run(base64.b64decode, payload) == pcm_to_wav(pcm, 24000)
+    finally:
+        await executor.close()
+    assert shared_blocks() - before == set()
+
+@pytest.mark.asyncio
+async def test_audio_executor_process_pool_task_errors():
+    """Test an error raised in an audio worker process reaches the caller as itself"""
+    before = shared_blocks()
+    executor = AudioExecutor("process", workers=1, min_offload_bytes=0)
+    await executor.start()
+    try:
+        frame = decode_audio_frame(encode_audio_frame("s1", 0, "l16", 16000, b"\x01" * 321))
+        with pytest.raises(ValueError):
+            await executor.run(decode_frame_audio, frame)
+        assert executor.stats()["in_flight"] == 0
+    finally:
+        await executor.close()
+    assert shared_blocks() - before == set()
+
+@pytest.mark.asyncio
+async def test_audio_executor_process_pool_cancelled_task_frees_blocks():
+    """Test the shared blocks of a task whose caller was cancelled are freed once the worker finishes"""
+    before = shared_blocks()
+    executor = AudioExecutor("process", workers=1, min_offload_bytes=0)
+    await executor.start()
+    try:
+        assert await executor.run(len, b"warm up") == 7
+        task = asyncio.create_task(executor.run(slow_copy, b"x" * 4096))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The single worker only takes this once the cancelled task is done
+        assert await executor.run(len, b"after") == 5
+        for _ in range(20):
+            if not shared_blocks() - before:
+                break
+            await asyncio.sleep(0.05)
+        assert shared_blocks() - before == set()
+    finally:
+        await executor.close()
+
+@pytest.mark.asyncio
+async def test_decode_request_audio_offloads_large_payloads(ai_engine):
+    """Test request decoding goes through the audio executor above the threshold"""
+    pcm = np.zeros(16000, dtype=np.int16)
+    request = ProcessAudioRequest(session_id="s1", audio_data=base64.b64encode(pcm_to_wav(pcm, 16000)).decode())
+    
+    ai_engine.audio_executor.min_offload_bytes = 1024
+    audio_bytes, decoded, sample_rate = await ai_engine.decode_request_audio(request)
+    assert sample_rate == 16000 and len(decoded) == 16000
+    assert ai_engine.audio_executor.stats()["offloaded"] == 1
+    
+    frame = decode_audio_frame(encode_audio_frame("s1", 0, "pcmu", 8000, b"\xff" * 160))
+    audio_bytes, decoded, sample_rate = await ai_engine.decode_request_audio(frame)
+    assert audio_bytes[:4] == b"RIFF" and len(decoded) == 160
+    assert ai_engine.audio_executor.stats()["inline"] == 1
+    await ai_engine.audio_executor.close()
+
+def stage_count(stage):
+    return main_module.REGISTRY.get_sample_value("ai_engine_stage_seconds_count", {"stage": stage}) or 0
+
+@pytest.mark.asyncio
+async def test_turn_trace_times_each_stage(ai_engine, sample_session):
+    """Test a turn records decode, Redis, STT, LLM and TTS stages under its trace id"""
+    request = ProcessAudioRequest(session_id="test-session-123", audio_data=base64.b64encode(b"fake_audio").decode())
+    
+    with patch.object(ai_engine, 'get_conversation_session', return_value=sample_session), \
+         patch.object(ai_engine, 'speech_to_text', return_value="Hello"), \
+         patch.object(ai_engine, 'generate_response', return_value="Hi there"), \
+         patch.object(ai_engine, 'text_to_speech_bytes', return_value=b"audio"), \
+         patch.object(ai_engine, 'save_conversation_session'):
+        
+        before = stage_count("turn")
+        with turn_trace("trace-1") as trace:
+            await ai_engine.process_audio_chunk(request)
+            
+    assert trace.trace_id == "trace-1"
+    assert set(trace.stages) == {"redis_get", "decode", "stt", "redis_save", "tts"}
+    assert stage_count("turn") == before + 1
+
+def test_process_endpoint_trace_header_and_metrics(ai_engine):
+    """Test /process/frame echoes the trace id and /metrics exposes the stage histogram"""
+    from fastapi.testclient import TestClient
+    
+    async def process(request, **kwargs):
+        main_module.observe_stage("stt", 0.01)
+        return {"text_response": "Hi", "session_id": request.session_id}
+        
+    with patch.object(ai_engine, 'initialize_redis'), \
+         patch.object(ai_engine, 'process_audio_chunk', side_effect=process):
+        client = TestClient(ai_engine.app)
+        response = client.post(
+            "/process/frame",
+            content=encode_audio_frame("s1", 0, "l16", 8000, b"\x00\x00" * 80),
+            headers={TRACE_HEADER: "call-1-turn-3"}
+        )
+        assert response.status_code == 200
+        assert response.headers[TRACE_HEADER] == "call-1-turn-3"
+        
+        metrics = client.get("/metrics", headers={"Accept": "application/openmetrics-text"})
+        
+    assert 'ai_engine_stage_seconds_bucket{le="0.025",stage="stt"}' in metrics.text
+    assert 'trace_id="call-1-turn-3"' in metrics.text
+
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main([__file__])
+
+@asynccontextmanager
+async def running_workers(tmp_path, **settings):
+    """Two engine workers sharing one Redis, served on their private unix sockets"""
+    from httpx import AsyncClient, AsyncHTTPTransport
+    
+    redis_server = fakeredis.FakeServer()
+    engines, servers, tasks, clients = [], [], [], []
+    for index in range(2):
+        config = {
+            "OPENAI_API_KEY": "test-key", "HOST": "localhost", "PORT": 8081, "DEBUG": False,
+            "TTS_CACHE_PREWARM": False, "SESSION_CACHE_SIZE": 0,
+            "WORKERS": 2, "WORKER_INDEX": index, "WORKER_SOCKET_DIR": str(tmp_path), **settings
+        }
+        engine = AIEngine(config)
+        engine.initialize_redis = AsyncMock()
+        engine.redis = fakeredis.aioredis.FakeRedis(server=redis_server)
+        sock = bind_worker_socket(worker_socket_path(config, index))
+        server = DrainingServer(main_module.uvicorn.Config(engine.app, log_level="warning"), engine, worker_socket=sock)
+        server.install_signal_handlers = lambda: None
+        tasks.append(asyncio.create_task(server.serve(sockets=[sock])))
+        engines.append(engine)
+        servers.append(server)
+        clients.append(AsyncClient(
+            transport=AsyncHTTPTransport(uds=worker_socket_path(config, index)), base_url="http://worker"
+        ))
+    while not all(server.started for server in servers):
+        await asyncio.sleep(0.01)
+    try:
+        yield engines, clients
+    finally:
+        for client in clients:
+            await client.aclose()
+        for server in servers:
+            server.should_exit = True
+        await asyncio.gather(*tasks)
+
+@pytest.mark.asyncio
+async def test_call_spread_over_workers_keeps_vad_and_barge_in(tmp_path):
+    """Test a call whose requests land on both workers is handled by the worker that owns it"""
+    audio = synthetic_call_audio()
+    half = 16000  # mid-utterance
+    stalled = asyncio.Event()
+    
+    async def respond(session, user_input):
+        if user_input == "Hold on":
+            stalled.set()
+            await asyncio.sleep(10)
+        return "Hi there"
+        
+    async with running_workers(tmp_path, VAD_ENABLED=True) as ((owner, other), clients):
+        response = await clients[0].post("/session/create", json={"call_id": "c1", "phone_number": "+1"})
+        session_id = response.json()["session_id"]
+        assert session_owner(session_id, 2) == 0
+        
+        def chunk(pcm):
+            return {"session_id": session_id, "audio_data": base64.b64encode(pcm_to_wav(pcm, 16000)).decode()}
+            
+        with patch.object(owner, 'speech_to_text', return_value="Hello") as owner_stt, \
+             patch.object(other, 'speech_to_text', return_value="Hello") as other_stt, \
+             patch.object(owner, 'generate_response', side_effect=respond), \
+             patch.object(owner, 'text_to_speech_bytes', return_value=b"wav"):
+            
+            # VAD state for the call stays on the owner, whichever worker gets the chunk
+            response = await clients[1].post("/process", json=chunk(audio[:half]))
+            assert response.json()["status"] == "listening"
+            response = await clients[0].post("/process", json=chunk(audio[half:]))
+            assert response.json()["text_response"] == "Hi there"
+            owner_stt.assert_called_once()
+            other_stt.assert_not_called()
+            utterance, _ = wav_to_pcm(owner_stt.call_args[0][0])
+            assert 1.0 <= len(utterance) / 16000 < 1.5
+            assert list(owner.vad_detectors) == [session_id] and not other.vad_detectors
+            
+            # Barge-in sent to the other worker cancels the owner's turn
+            owner_stt.return_value = "Hold on"
+            turn = asyncio.create_task(clients[1].post("/process", json=chunk(audio)))
+            await asyncio.wait_for(stalled.wait(), 5)
+            response = await clients[1].post(f"/session/{session_id}/barge_in", json={"played_ms": 300})
+            assert response.json()["cancelled"] is True
+            assert (await turn).json() == {"status": "interrupted", "session_id": session_id}
+            assert not owner.active_turns
+            
+            response = await clients[1].delete(f"/session/{session_id}")
+            assert response.json()["status"] == "session_ended"
+            assert not owner.vad_detectors
+
+@pytest.mark.asyncio
+async def test_stream_mux_relays_sessions_to_owning_worker(tmp_path):
+    """Test /ws/mux on one worker carries another worker's session and its barge-in through to it"""
+    import websockets
+    
+    stalled = asyncio.Event()
+    
+    async def process(request, encode_audio=True, response_format=None):
+        if request.sequence == 1:
+            stalled.set()
+            await asyncio.sleep(10)
+        return {"text_response": "Hi", "audio_response": b"wav-bytes", "session_id": request.session_id}
+        
+    async with running_workers(tmp_path) as ((owner, other), clients):
+        response = await clients[0].post("/session/create", json={"call_id": "c1", "phone_number": "+1"})
+        session_id = response.json()["session_id"]
+        
+        with patch.object(owner, 'process_audio_chunk', side_effect=process) as owner_process, \
+             patch.object(other, 'process_audio_chunk', side_effect=process) as other_process:
+            async with websockets.unix_connect(worker_socket_path(other.config, 1), uri="ws://worker/ws/mux") as websocket:
+                await websocket.send(json.dumps({"type": "hello", "sessions": [session_id]}))
+                assert json.loads(await websocket.recv())["sessions"] == {session_id: -1}
+                await websocket.send(encode_audio_frame(session_id, 0, "l16", 8000, b"\x00\x00" * 80))
+                
+                reply, acks = None, {}
+                while reply is None or not acks:
+                    message = json.loads(await websocket.recv())
+                    if message["type"] == "ack":
+                        acks.update(message["sessions"])
+                    else:
+                        reply, audio = message, decode_audio_frame(await websocket.recv())
+                        
+                # The next turn is cut off by a barge-in on the same connection
+                await websocket.send(encode_audio_frame(session_id, 1, "l16", 8000, b"\x00\x00" * 80))
+                await asyncio.wait_for(stalled.wait(), 5)
+                await websocket.send(json.dumps({"type": "barge_in", "session_id": session_id, "played_ms": 200}))
+                message = {}
+                while message.get("type") != "barge_in":
+                    message = json.loads(await websocket.recv())
+                assert (message["session_id"], message["cancelled"]) == (session_id, True)
+                assert not owner.active_turns
+                
+    assert (owner_process.call_count, other_process.call_count) == (2, 0)
+    assert (reply["type"], reply["sequence"], reply["data"]["text_response"]) == ("ai_response", 0, "Hi")
+    assert (audio.session_id, audio.payload) == (session_id, b"wav-bytes")
+    assert acks == {session_id: 0}
+    assert list(owner.mux_sequences) == [session_id] and not other.mux_sequences
@@ -1,19 +1,228 @@
 import asyncio
 import websockets
+import websockets.exceptions
 import json
+import base64
+import bisect
+import hashlib
+import io
 import logging
 import os
-from typing import Dict, Optional
+import random
+import socket
+import struct
+import time
+import wave
+from collections import Counter, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 import aiohttp
-from dataclasses import dataclass
+import numpy as np
+import redis.asyncio as aioredis
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE
+from prometheus_client.openmetrics.exposition import generate_latest as generate_openmetrics
+from dataclasses import asdict, dataclass
 from aiohttp import web
+from scipy import signal
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-turn latency, in the same shape as ai-engine's ai_engine_stage_seconds.
+# Each audio chunk gets a trace id that is sent to the engine in TRACE_HEADER,
+# so a slow turn can be followed through both services by the same id.
+TRACE_HEADER = "X-Trace-Id"
+TURN_STAGES = ("ai_engine", "transcode", "ws_send", "turn", "greeting")
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_SECONDS = Histogram(
+    "freeswitch_stage_seconds", "Time spent in each stage of a call turn",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_HISTOGRAMS = {stage: STAGE_SECONDS.labels(stage) for stage in TURN_STAGES}
+
+def new_trace_id(call_id: str) -> str:
+    return f"{call_id}-{os.urandom(4).hex()}"
+
+def observe_stage(stage: str, seconds: float, trace_id: Optional[str] = None):
+    """Record a stage duration, with the turn's trace id as an exemplar"""
+    STAGE_HISTOGRAMS[stage].observe(seconds, {"trace_id": trace_id[:64]} if trace_id else None)
+
+# Binary audio framing, shared with ai-engine. Each frame is a fixed 12-byte
+# header (version, codec, id length, flags, sample rate, sequence) followed by
+# the UTF-8 call/session id and the raw audio payload.
+AUDIO_FRAME_VERSION = 1
+AUDIO_FRAME_HEADER = struct.Struct("!BBBBII")
+AUDIO_FRAME_CONTENT_TYPE = "application/x-audio-frame"
+AUDIO_CODECS = {"l16": 1, "pcmu": 2, "pcma": 3, "opus": 4, "wav": 5, "mp3": 6}
+AUDIO_CODEC_NAMES = {code: name for name, code in AUDIO_CODECS.items()}
+AUDIO_TRANSPORTS = ("binary", "json")
+
 @dataclass
+class AudioFrame:
+    """Decoded binary audio frame; payload is a view into the received message"""
+    call_id: str
+    sequence: int
+    codec: str
+    sample_rate: int
+    payload: memoryview
+
+def encode_audio_frame(call_id: str, sequence: int, codec: str, sample_rate: int, payload: bytes) -> bytes:
+    """Encode raw audio into a binary frame"""
+    stream_id = call_id.encode()
+    if len(stream_id) > 255:
+        raise ValueError("Call id too long for audio frame")
+        
+    header = AUDIO_FRAME_HEADER.pack(
+        AUDIO_FRAME_VERSION, AUDIO_CODECS[codec], len(stream_id), 0, sample_rate, sequence & 0xFFFFFFFF
+    )
+    return b"".join((header, stream_id, payload))
+
+def decode_audio_frame(data: Union[bytes, bytearray, memoryview]) -> AudioFrame:
+    """Parse a binary audio frame without copying the payload"""
+    view = memoryview(data)
+    if len(view) < AUDIO_FRAME_HEADER.size:
+        raise ValueError("Audio frame too short")
+        
+    version, codec, id_length, _flags, sample_rate, sequence = AUDIO_FRAME_HEADER.unpack_from(view)
+    if version != AUDIO_FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version: {version}")
+    if codec not in AUDIO_CODEC_NAMES:
+        raise ValueError(f"Unknown audio codec: {codec}")
+        
+    offset = AUDIO_FRAME_HEADER.size + id_length
+    if len(view) < offset:
+        raise ValueError("Audio frame truncated")
+        
+    return AudioFrame(
+        call_id=str(view[AUDIO_FRAME_HEADER.size:offset], "utf-8"),
+        sequence=sequence,
+        codec=AUDIO_CODEC_NAMES[codec],
+        sample_rate=sample_rate,
+        payload=view[offset:]
+    )
+
+def negotiate_audio_transport(offered) -> str:
+    """Pick the first transport offered by the client that we support"""
+    if isinstance(offered, str):
+        offered = [offered]
+    for transport in offered or []:
+        if transport in AUDIO_TRANSPORTS:
+            return transport
+    return "json"
+
+# Uncompressed codecs whose payloads can be decoded or concatenated directly
+RAW_AUDIO_CODECS = ("l16", "pcmu", "pcma")
+
+# Playback to the call leg: G.711 at 8 kHz or linear PCM (L16) at 16 kHz,
+# sent in 20 ms frames paced in real time
+PLAYBACK_FRAME_MS = 20
+# Frames sent ahead of real time to fill FreeSWITCH's jitter buffer
+PLAYBACK_PREBUFFER_FRAMES = 3
+LEG_SAMPLE_RATES = {"pcmu": 8000, "pcma": 8000, "l16": 16000}
+DEFAULT_GREETING = "Hello! How can I help you today?"
+
+def linear_to_ulaw(pcm: np.ndarray) -> np.ndarray:
+    """Encode 16-bit PCM to G.711 mu-law (vectorized)"""
+    pcm = pcm.astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.minimum(np.abs(pcm), 8159) + 0x21, 0x1FFF)
+    segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    mantissa = (magnitude >> (segment + 1)) & 0x0F
+    return (((segment << 4) | mantissa) ^ mask).astype(np.uint8)
+
+def linear_to_alaw(pcm: np.ndarray) -> np.ndarray:
+    """Encode 16-bit PCM to G.711 A-law (vectorized)"""
+    pcm = pcm.astype(np.int32)
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    magnitude = np.where(pcm >= 0, pcm, -pcm - 1) >> 3
+    segment = np.clip(np.floor(np.log2(np.maximum(magnitude, 1))).astype(np.int32) - 4, 0, 7)
+    mantissa = np.where(segment == 0, magnitude >> 1, magnitude >> segment) & 0x0F
+    return (((segment << 4) | mantissa) ^ mask).astype(np.uint8)
+
+def _build_g711_decode_tables() -> Dict[str, np.ndarray]:
+    """Lookup tables from G.711 bytes to 16-bit PCM"""
+    codes = np.arange(256, dtype=np.int32)
+    
+    ulaw = ~codes & 0xFF
+    exponent = (ulaw >> 4) & 0x07
+    magnitude = ((((ulaw & 0x0F) << 3) + 0x84) << exponent) - 0x84
+    ulaw_pcm = np.where(ulaw & 0x80, -magnitude, magnitude)
+    
+    alaw = codes ^ 0x55
+    segment = (alaw >> 4) & 0x07
+    mantissa = (alaw & 0x0F) << 4
+    magnitude = np.where(segment == 0, mantissa + 8, (mantissa + 0x108) << np.maximum(segment - 1, 0))
+    alaw_pcm = np.where(alaw & 0x80, magnitude, -magnitude)
+    
+    return {"pcmu": ulaw_pcm.astype(np.int16), "pcma": alaw_pcm.astype(np.int16)}
+
+G711_DECODE_TABLES = _build_g711_decode_tables()
+
+def chunk_to_pcm(payload: bytes, codec: str) -> Optional[np.ndarray]:
+    """Decode caller audio (l16, PCMU, PCMA) to int16 samples, or None"""
+    if codec == "l16":
+        return np.frombuffer(payload, dtype="<i2", count=len(payload) // 2)
+    if codec in G711_DECODE_TABLES:
+        return G711_DECODE_TABLES[codec][np.frombuffer(payload, dtype=np.uint8)]
+    return None
+
+def contains_speech(pcm: np.ndarray, sample_rate: int, threshold_db: float = -35.0,
+                    min_speech_ms: int = 120, frame_ms: int = 20) -> bool:
+    """Stateless check for caller speech in one chunk, used to detect barge-in"""
+    frame_size = sample_rate * frame_ms // 1000
+    count = len(pcm) // frame_size if frame_size else 0
+    if not count:
+        return False
+    frames = pcm[:count * frame_size].astype(np.float32).reshape(count, frame_size) / 32768.0
+    levels = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    return int(np.count_nonzero(levels > threshold_db)) * frame_ms >= min_speech_ms
+
+def decode_response_audio(audio: bytes, audio_format: str, sample_rate: Optional[int] = None) -> Optional[tuple]:
+    """Decode AI engine speech to (mono int16 samples, sample rate), or None.
+    
+    Handles 16-bit WAV and headerless little-endian PCM; compressed formats
+    such as MP3 cannot be played and return None.
+    """
+    if audio_format == "wav":
+        try:
+            with wave.open(io.BytesIO(audio), "rb") as wav:
+                if wav.getsampwidth() != 2:
+                    return None
+                samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+                if wav.getnchannels() > 1:
+                    samples = samples.reshape(-1, wav.getnchannels()).mean(axis=1).astype(np.int16)
+                return samples, wav.getframerate()
+        except (wave.Error, EOFError):
+            return None
+    if audio_format in ("pcm", "l16") and sample_rate:
+        return np.frombuffer(audio, dtype="<i2"), sample_rate
+    return None
+
+def transcode_for_leg(pcm: np.ndarray, sample_rate: int, codec: str) -> bytes:
+    """Resample (polyphase) and encode PCM for the call leg's codec"""
+    leg_rate = LEG_SAMPLE_RATES[codec]
+    if sample_rate != leg_rate:
+        pcm = signal.resample_poly(pcm.astype(np.float32), leg_rate, sample_rate)
+        pcm = np.clip(np.round(pcm), -32768, 32767).astype(np.int16)
+    if codec == "pcmu":
+        return linear_to_ulaw(pcm).tobytes()
+    if codec == "pcma":
+        return linear_to_alaw(pcm).tobytes()
+    return pcm.astype("<i2").tobytes()
+
+def playback_frames(audio: bytes, codec: str) -> List[bytes]:
+    """Split encoded audio into 20 ms frames, padding the last with silence"""
+    bytes_per_sample = 2 if codec == "l16" else 1
+    frame_bytes = LEG_SAMPLE_RATES[codec] * PLAYBACK_FRAME_MS // 1000 * bytes_per_sample
+    silence = {"pcmu": b"\xff", "pcma": b"\xd5", "l16": b"\x00"}[codec]
+    frames = [audio[offset:offset + frame_bytes] for offset in range(0, len(audio), frame_bytes)]
+    if frames and len(frames[-1]) < frame_bytes:
+        frames[-1] += silence * (frame_bytes - len(frames[-1]))
+    return frames
+
+@dataclass(slots=True)
 class CallSession:
     """Represents an active call session"""
     call_id: str
@@ -21,6 +230,903 @@ class CallSession:
     start_time: datetime
     status: str = "active"
     ai_engine_session: Optional[str] = None
+    # Codec of the call leg that playback is encoded for
+    codec: str = "pcmu"
+    playback_sequence: int = 0
+    # Event loop time the current reply started playing, None when silent
+    playback_started: Optional[float] = None
+    # perf_counter time of call_start, until the greeting's first frame is sent
+    setup_started: Optional[float] = None
+
+# What to do with an audio chunk when its call's queue is full
+CALL_QUEUE_POLICIES = ("drop_oldest", "coalesce", "reject")
+
+def coalesce_audio_chunks(older: Dict, newer: Dict) -> Optional[Dict]:
+    """Merge two consecutive audio_chunk messages of the same raw format, or None"""
+    first, second = older.get("audio_data"), newer.get("audio_data")
+    if isinstance(first, AudioFrame) and isinstance(second, AudioFrame):
+        if first.codec not in RAW_AUDIO_CODECS or (first.codec, first.sample_rate) != (second.codec, second.sample_rate):
+            return None
+        payload = memoryview(bytes(first.payload) + bytes(second.payload))
+        return {**older, "audio_data": AudioFrame(first.call_id, first.sequence, first.codec, first.sample_rate, payload)}
+    if isinstance(first, str) and isinstance(second, str):
+        if older.get("codec") not in RAW_AUDIO_CODECS or \
+                (older.get("codec"), older.get("sample_rate")) != (newer.get("codec"), newer.get("sample_rate")):
+            return None
+        payload = base64.b64decode(first) + base64.b64decode(second)
+        return {**older, "audio_data": base64.b64encode(payload).decode()}
+    return None
+
+class CallQueue:
+    """Messages for one call in arrival order, drained by the call's own task.
+    
+    Only audio chunks count towards the bound; control messages (call_start,
+    call_end) are always accepted so a call is never left open. When the queue
+    holds max_chunks chunks, a new one is handled by the overflow policy:
+    drop_oldest discards the oldest queued chunk, coalesce appends the audio to
+    the newest queued chunk (falling back to drop_oldest when the formats can't
+    be merged), and reject discards the new chunk.
+    """
+    
+    def __init__(self, call_id: str, websocket, max_chunks: int = 50, policy: str = "drop_oldest"):
+        self.call_id = call_id
+        self.websocket = websocket
+        self.max_chunks = max(1, max_chunks)
+        self.policy = policy
+        self.items: Deque[Tuple[Dict, object]] = deque()
+        self.chunks = 0
+        self.closed = False
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        
+    def put(self, data: Dict, websocket) -> str:
+        """Queue a message and return the outcome: queued, dropped, coalesced or rejected"""
+        outcome = "queued"
+        if data.get("type") == "audio_chunk" and self.chunks >= self.max_chunks:
+            if self.policy == "reject":
+                return "rejected"
+            if self.policy == "coalesce" and self.items and self.items[-1][0].get("type") == "audio_chunk":
+                merged = coalesce_audio_chunks(self.items[-1][0], data)
+                if merged:
+                    self.items[-1] = (merged, self.items[-1][1])
+                    return "coalesced"
+            oldest = next(item for item in self.items if item[0].get("type") == "audio_chunk")
+            self.items.remove(oldest)
+            self.chunks -= 1
+            outcome = "dropped"
+            
+        self.items.append((data, websocket))
+        if data.get("type") == "audio_chunk":
+            self.chunks += 1
+        self.ready.set()
+        return outcome
+        
+    async def get(self) -> Optional[Tuple[Dict, object]]:
+        """Next (message, websocket), or None once closed and drained"""
+        while not self.items:
+            if self.closed:
+                return None
+            self.ready.clear()
+            await self.ready.wait()
+            
+        data, websocket = self.items.popleft()
+        if data.get("type") == "audio_chunk":
+            self.chunks -= 1
+        return data, websocket
+        
+    def close(self, discard_audio: bool = False):
+        """Stop accepting work; with discard_audio, queued chunks are dropped too"""
+        self.closed = True
+        if discard_audio:
+            self.items = deque(item for item in self.items if item[0].get("type") != "audio_chunk")
+            self.chunks = 0
+        self.ready.set()
+
+class ServiceClient:
+    """Long-lived pooled HTTP client for a single upstream service"""
+    
+    def __init__(self, name: str, base_url: str, limit: int = 100, limit_per_host: int = 50,
+                 keepalive_timeout: float = 30.0, timeout: float = 30.0):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.waiting = 0
+        self.waits = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        
+    async def start(self):
+        """Create the pooled session (idempotent)"""
+        if self.session and not self.session.closed:
+            return
+            
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_queued_start.append(self._on_queued_start)
+        trace_config.on_connection_queued_end.append(self._on_queued_end)
+        trace_config.on_connection_create_end.append(self._on_connection_create)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace_config]
+        )
+        logger.info(f"Started HTTP pool for {self.name} ({self.base_url}, limit={self.limit}, per_host={self.limit_per_host})")
+        
+    async def close(self):
+        """Close the pooled session and all idle connections"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        
+    def request(self, method: str, path: str, **kwargs):
+        """Issue a request against the upstream; use as `async with client.request(...)`"""
+        if self.session is None or self.session.closed:
+            raise RuntimeError(f"HTTP client for {self.name} is not started")
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+        
+    def post(self, path: str, **kwargs):
+        return self.request("POST", path, **kwargs)
+        
+    def delete(self, path: str, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+        
+    def stats(self) -> Dict:
+        """Pool statistics used for sizing the connection limits"""
+        in_use = idle = 0
+        if self.session and not self.session.closed:
+            # aiohttp has no public accessors for the pool contents
+            connector = self.session.connector
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            
+        return {
+            "base_url": self.base_url,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "in_use": in_use,
+            "idle": idle,
+            "waiting": self.waiting,
+            "waits_total": self.waits,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused
+        }
+        
+    async def _on_queued_start(self, session, ctx, params):
+        self.waiting += 1
+        self.waits += 1
+        
+    async def _on_queued_end(self, session, ctx, params):
+        self.waiting -= 1
+        
+    async def _on_connection_create(self, session, ctx, params):
+        self.connections_created += 1
+        
+    async def _on_connection_reuse(self, session, ctx, params):
+        self.connections_reused += 1
+
+# Call events for the Rails backend are queued and posted in batches so call
+# handling never waits on it. Batches the backend cannot take are retried,
+# then written to the spool directory and replayed once it is back.
+BACKEND_EVENTS_PATH = "/api/calls/events"
+BACKEND_BULK_EVENTS_PATH = "/api/calls/events/bulk"
+SPOOL_PREFIX = "events-"
+SPOOL_SUFFIX = ".json"
+
+class BackendEventQueue:
+    """Bounded outbound queue of backend events, delivered in the background.
+    
+    publish() never blocks: when the queue is full the oldest event is
+    dropped. Batches go to the bulk endpoint, or one event per request when
+    the backend does not have it. Failures are retried with exponential
+    backoff and full jitter; with a spool directory, batches that still fail
+    (and events left at shutdown) are written to disk and replayed, oldest
+    first, before any newer event is sent. Delivery is at least once, so
+    events carry an event_id for the backend to deduplicate on.
+    """
+    
+    def __init__(self, client: ServiceClient, max_events: int = 10000, batch_size: int = 50,
+                 flush_interval: float = 0.25, max_attempts: int = 5, retry_base: float = 0.5,
+                 retry_max: float = 30.0, spool_dir: Optional[str] = None):
+        self.client = client
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.spool_dir = spool_dir
+        self.events: Deque[Dict] = deque()
+        self.spooled: Deque[str] = deque()
+        self.replay_after = 0.0
+        self.bulk_supported = True
+        self.closing = False
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.counts = Counter()
+        
+    async def start(self):
+        """Pick up batches spooled by a previous run and start delivering"""
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self.spooled = deque(sorted(
+                name for name in os.listdir(self.spool_dir)
+                if name.startswith(SPOOL_PREFIX) and name.endswith(SPOOL_SUFFIX)
+            ))
+            if self.spooled:
+                logger.info(f"Replaying {len(self.spooled)} spooled backend event batches")
+        self.closing = False
+        self.task = asyncio.create_task(self.run())
+        
+    async def close(self, timeout: float = 5.0):
+        """Deliver what is queued within timeout; spool (or drop) the rest"""
+        self.closing = True
+        self.ready.set()
+        if self.task:
+            try:
+                await asyncio.wait_for(self.task, timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.task = None
+            
+        if self.events:
+            remaining = list(self.events)
+            self.events.clear()
+            if self.spool_dir:
+                await self.spool(remaining)
+            else:
+                self.counts["dropped"] += len(remaining)
+                logger.warning(f"Dropped {len(remaining)} undelivered backend events on shutdown")
+                
+    def publish(self, event_type: str, data: Dict):
+        """Queue an event for delivery"""
+        if len(self.events) >= self.max_events:
+            self.events.popleft()
+            self.counts["dropped"] += 1
+            logger.warning("Backend event queue full, dropped the oldest event")
+        self.events.append({
+            "event_id": os.urandom(8).hex(),
+            "event_type": event_type,
+            "timestamp": datetime.now().isoformat(),
+            "data": data
+        })
+        self.counts["published"] += 1
+        if len(self.events) >= self.batch_size:
+            self.ready.set()
+            
+    async def run(self):
+        """Flush every flush_interval, or as soon as a full batch is queued"""
+        while True:
+            try:
+                await asyncio.wait_for(self.ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.ready.clear()
+            
+            try:
+                await self.flush(1 if self.closing else self.max_attempts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing backend events: {e}")
+            if self.closing:
+                return
+                
+    async def flush(self, attempts: int):
+        """Replay spooled batches, then send queued events batch by batch"""
+        if self.spooled and not self.closing and time.monotonic() >= self.replay_after:
+            await self.replay_spool()
+            
+        while self.events:
+            batch = [self.events.popleft() for _ in range(min(self.batch_size, len(self.events)))]
+            if self.spooled:
+                # The backend is still down; keep the spool in order
+                await self.spool(batch)
+                continue
+            try:
+                delivered = await self.deliver(batch, attempts)
+            except asyncio.CancelledError:
+                self.events.extendleft(reversed(batch))
+                raise
+            if not delivered:
+                if self.spool_dir:
+                    await self.spool(batch)
+                else:
+                    self.counts["failed"] += len(batch)
+                    logger.error(f"Dropped {len(batch)} backend events after {attempts} attempts")
+                    
+    async def deliver(self, batch: List[Dict], attempts: int) -> bool:
+        """Send a batch, retrying with backoff; False if it never got through"""
+        for attempt in range(attempts):
+            if attempt:
+                self.counts["retries"] += 1
+                await asyncio.sleep(random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1))))
+            try:
+                await self.post(batch)
+                return True
+            except Exception as e:
+                logger.warning(f"Backend event delivery failed ({len(batch)} events): {e}")
+        return False
+        
+    async def post(self, batch: List[Dict]):
+        """Post a batch; raises on errors worth retrying. Accepted events leave the batch"""
+        if self.bulk_supported:
+            async with self.client.post(BACKEND_BULK_EVENTS_PATH, json={"events": list(batch)}) as response:
+                if response.status in (404, 405):
+                    logger.info("Backend has no bulk event endpoint, sending events one by one")
+                    self.bulk_supported = False
+                elif 200 <= response.status < 300:
+                    # Events the backend failed to apply stay in the batch and are
+                    # sent again; it skips the ones it already has by event_id
+                    rejected = await self.rejected_event_ids(response)
+                    sent = len(batch)
+                    batch[:] = [event for event in batch if event.get("event_id") in rejected]
+                    self.check_status(response.status, sent - len(batch))
+                    if batch:
+                        raise RuntimeError(f"backend could not apply {len(batch)} events")
+                    return
+                else:
+                    self.check_status(response.status, len(batch))
+                    return
+                    
+        while batch:
+            async with self.client.post(BACKEND_EVENTS_PATH, json=batch[0]) as response:
+                self.check_status(response.status, 1)
+            batch.pop(0)
+            
+    @staticmethod
+    async def rejected_event_ids(response) -> set:
+        """Ids the bulk endpoint reports it could not apply"""
+        try:
+            body = await response.json(content_type=None)
+        except (aiohttp.ContentTypeError, ValueError):
+            return set()
+        return set(body.get("rejected") or ()) if isinstance(body, dict) else set()
+        
+    def check_status(self, status: int, count: int):
+        """Count accepted and rejected events; raise for statuses worth retrying"""
+        if 200 <= status < 300:
+            self.counts["delivered"] += count
+        elif 400 <= status < 500 and status not in (408, 429):
+            self.counts["rejected"] += count
+            logger.warning(f"Backend rejected {count} events: {status}")
+        else:
+            raise RuntimeError(f"backend returned {status}")
+            
+    async def spool(self, batch: List[Dict]):
+        """Write a batch to the spool directory for later replay"""
+        name = f"{SPOOL_PREFIX}{time.time_ns():020d}-{os.urandom(2).hex()}{SPOOL_SUFFIX}"
+        await asyncio.to_thread(self._write_spool_file, name, batch)
+        self.spooled.append(name)
+        self.counts["spooled"] += len(batch)
+        
+    async def replay_spool(self):
+        """Send spooled batches oldest first, once each; stop at the first failure"""
+        while self.spooled:
+            name = self.spooled[0]
+            path = os.path.join(self.spool_dir, name)
+            try:
+                batch = await asyncio.to_thread(self._read_spool_file, path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable spooled backend events {name}: {e}")
+                self.spooled.popleft()
+                continue
+            if not await self.deliver(batch, 1):
+                # Leave what was not accepted for the next attempt
+                await asyncio.to_thread(self._write_spool_file, name, batch)
+                self.replay_after = time.monotonic() + self.retry_max
+                return
+            self.spooled.popleft()
+            await asyncio.to_thread(os.remove, path)
+            
+    def _write_spool_file(self, name: str, batch: List[Dict]):
+        path = os.path.join(self.spool_dir, name)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(batch, f)
+        os.replace(f"{path}.tmp", path)
+        
+    @staticmethod
+    def _read_spool_file(path: str) -> List[Dict]:
+        with open(path) as f:
+            return json.load(f)
+            
+    def stats(self) -> Dict:
+        return {
+            "queued": len(self.events),
+            "spooled_batches": len(self.spooled),
+            "bulk": self.bulk_supported,
+            **{outcome: self.counts[outcome] for outcome in
+               ("published", "delivered", "rejected", "retries", "spooled", "failed", "dropped")}
+        }
+
+# Audio to ai-engine travels over a few multiplexed WebSockets per replica
+ENGINE_STREAM_PATH = "/ws/mux"
+
+def engine_stream_url(ai_engine_url: str) -> str:
+    """ws:// (or wss://) URL of the engine's multiplexed stream endpoint"""
+    scheme, _, rest = ai_engine_url.partition("://")
+    return f"{'wss' if scheme == 'https' else 'ws'}://{rest.rstrip('/')}{ENGINE_STREAM_PATH}"
+
+def stream_trace_id(session_id: str, sequence: int) -> str:
+    """Trace id of a chunk sent over the engine stream; ai-engine derives the same one"""
+    return f"{session_id}-{sequence}"
+
+class EngineStream:
+    """Every call's audio to ai-engine over one long-lived WebSocket.
+    
+    Chunks are numbered per AI session and kept until the engine
+    acknowledges them; at most `window` chunks are unacknowledged at once,
+    and send() waits for credit beyond that. The connection is re-opened
+    with jittered backoff when it drops. On reconnect the hello lists every
+    open session, the engine answers with the last sequence it accepted for
+    each, and only the chunks after it are sent again; replies the engine
+    could not deliver meanwhile follow. Replies are handed to on_message in
+    the order they arrive, with the audio frame that follows a message
+    marked "audio". Barge-ins go on the same connection as the session's
+    audio, behind the chunks already sent.
+    """
+    
+    def __init__(self, url: str, on_message: Callable[[Dict, Optional[AudioFrame]], Awaitable[None]],
+                 window: int = 100, streaming: bool = False, response_format: str = "wav",
+                 retry_base: float = 0.5, retry_max: float = 10.0):
+        self.url = url
+        self.on_message = on_message
+        self.window = window
+        self.streaming = streaming
+        self.response_format = response_format
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.websocket = None
+        self.task: Optional[asyncio.Task] = None
+        # Last sequence used, and chunks not yet acknowledged, per AI session
+        self.sequences: Dict[str, int] = {}
+        self.unacked: Dict[str, Deque[Tuple[int, Union[str, bytes]]]] = {}
+        self.in_flight = 0
+        self.credit = asyncio.Event()
+        self.credit.set()
+        self.counts = Counter()
+        
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+        
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+            
+    async def run(self):
+        """Keep the connection open, resuming every session after each reconnect"""
+        delay = self.retry_base
+        while True:
+            try:
+                async with websockets.connect(self.url, max_size=None) as websocket:
+                    await self.resume(websocket)
+                    self.websocket = websocket
+                    delay = self.retry_base
+                    logger.info(f"AI engine stream connected ({self.url}, {len(self.sequences)} sessions)")
+                    await self.read(websocket)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"AI engine stream error: {e}")
+            finally:
+                self.websocket = None
+            self.counts["reconnects"] += 1
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, self.retry_max)
+            
+    async def resume(self, websocket):
+        """Say hello, then resend what the engine did not accept until caught up"""
+        await websocket.send(json.dumps({
+            "type": "hello",
+            "streaming": self.streaming,
+            "response_format": self.response_format,
+            "sessions": list(self.sequences)
+        }))
+        while True:
+            message = await websocket.recv()
+            if isinstance(message, str) and json.loads(message).get("type") == "hello":
+                break
+        self.acknowledge(json.loads(message).get("sessions", {}))
+        
+        # Chunks queued while resending are sent by the next pass; the
+        # connection is handed to send() only once nothing is left behind
+        resent: Dict[str, int] = {}
+        while True:
+            pending = [
+                (session_id, sequence, data) for session_id, chunks in self.unacked.items()
+                for sequence, data in chunks if sequence > resent.get(session_id, -1)
+            ]
+            if not pending:
+                return
+            for session_id, sequence, data in pending:
+                await websocket.send(data)
+                resent[session_id] = sequence
+                self.counts["resent"] += 1
+                
+    async def read(self, websocket):
+        """Dispatch replies in order; acknowledgements release credit"""
+        announced = None
+        async for message in websocket:
+            if isinstance(message, bytes):
+                if announced:
+                    try:
+                        frame = decode_audio_frame(message)
+                    except ValueError as e:
+                        logger.warning(f"Dropping invalid audio frame from AI engine: {e}")
+                        frame = None
+                    await self.dispatch(announced, frame)
+                    announced = None
+                continue
+                
+            data = json.loads(message)
+            if data.get("type") == "ack":
+                self.acknowledge(data["sessions"])
+            elif data.get("audio"):
+                announced = data
+            else:
+                await self.dispatch(data, None)
+                
+    async def dispatch(self, message: Dict, frame: Optional[AudioFrame]):
+        try:
+            await self.on_message(message, frame)
+        except Exception as e:
+            logger.error(f"Error handling AI engine reply: {e}")
+            
+    def acknowledge(self, sessions: Dict[str, int]):
+        """Drop chunks the engine has accepted"""
+        for session_id, accepted in sessions.items():
+            chunks = self.unacked.get(session_id)
+            while chunks and chunks[0][0] <= accepted:
+                chunks.popleft()
+                self.in_flight -= 1
+                self.counts["acked"] += 1
+        if self.in_flight < self.window:
+            self.credit.set()
+            
+    async def send(self, session_id: str, audio_data: Union[str, AudioFrame]) -> int:
+        """Queue a chunk for the session and return its sequence number"""
+        while self.in_flight >= self.window:
+            self.counts["credit_waits"] += 1
+            await self.credit.wait()
+            
+        sequence = self.sequences.get(session_id, -1) + 1
+        self.sequences[session_id] = sequence
+        if isinstance(audio_data, AudioFrame):
+            data = encode_audio_frame(
+                session_id, sequence, audio_data.codec, audio_data.sample_rate, audio_data.payload
+            )
+        else:
+            data = json.dumps({
+                "type": "audio_chunk",
+                "session_id": session_id,
+                "sequence": sequence,
+                "audio_data": audio_data,
+                "format": "base64"
+            })
+        self.unacked.setdefault(session_id, deque()).append((sequence, data))
+        self.in_flight += 1
+        if self.in_flight >= self.window:
+            self.credit.clear()
+        self.counts["sent"] += 1
+        
+        websocket = self.websocket
+        if websocket:
+            try:
+                await websocket.send(data)
+            except websockets.exceptions.ConnectionClosed:
+                # Resent after the reconnect
+                pass
+        return sequence
+        
+    async def barge_in(self, session_id: str, played_ms: Optional[int]) -> bool:
+        """Tell the engine the caller talked over the session's reply; False when not connected"""
+        websocket = self.websocket
+        if not websocket:
+            return False
+        try:
+            await websocket.send(json.dumps({"type": "barge_in", "session_id": session_id, "played_ms": played_ms}))
+        except websockets.exceptions.ConnectionClosed:
+            return False
+        self.counts["barge_ins"] += 1
+        return True
+        
+    def forget(self, session_id: str):
+        """Stop tracking an ended session"""
+        self.sequences.pop(session_id, None)
+        chunks = self.unacked.pop(session_id, None)
+        if chunks:
+            self.in_flight -= len(chunks)
+            if self.in_flight < self.window:
+                self.credit.set()
+                
+    def stats(self) -> Dict:
+        return {
+            "connected": self.websocket is not None,
+            "sessions": len(self.sequences),
+            "in_flight": self.in_flight,
+            "window": self.window,
+            **{outcome: self.counts[outcome] for outcome in ("sent", "acked", "resent", "credit_waits", "reconnects", "barge_ins")}
+        }
+
+class EngineStreamPool:
+    """A few EngineStreams, with every AI session pinned to one of them.
+    
+    Each connection lands on one engine worker, so several spread the calls
+    over the workers, and the engine passes a session's traffic on to the
+    worker that owns it. Hashing the session id keeps all of one session's
+    chunks and barge-ins, in order, on a single connection.
+    """
+    
+    def __init__(self, url: str, on_message: Callable[[Dict, Optional[AudioFrame]], Awaitable[None]],
+                 connections: int = 2, **options):
+        self.streams = [EngineStream(url, on_message, **options) for _ in range(max(1, connections))]
+        self.window = self.streams[0].window
+        
+    def stream_for(self, session_id: str) -> EngineStream:
+        return self.streams[int.from_bytes(hashlib.md5(session_id.encode()).digest()[:8], "big") % len(self.streams)]
+        
+    async def start(self):
+        for stream in self.streams:
+            await stream.start()
+            
+    async def close(self):
+        await asyncio.gather(*(stream.close() for stream in self.streams))
+        
+    async def send(self, session_id: str, audio_data: Union[str, AudioFrame]) -> int:
+        return await self.stream_for(session_id).send(session_id, audio_data)
+        
+    async def barge_in(self, session_id: str, played_ms: Optional[int]) -> bool:
+        return await self.stream_for(session_id).barge_in(session_id, played_ms)
+        
+    def forget(self, session_id: str):
+        self.stream_for(session_id).forget(session_id)
+        
+    def stats(self) -> Dict:
+        """Totals over the connections; "connected" counts the open ones"""
+        stats = [stream.stats() for stream in self.streams]
+        return {"connections": len(stats), **{key: sum(stat[key] for stat in stats) for key in stats[0]}}
+
+# CallSession fields kept in the call registry; playback state is per replica
+CALL_RECORD_FIELDS = ("call_id", "phone_number", "start_time", "status", "ai_engine_session", "codec")
+
+def call_session_to_record(session: CallSession) -> str:
+    record = {field: value for field, value in asdict(session).items() if field in CALL_RECORD_FIELDS}
+    record["start_time"] = session.start_time.isoformat()
+    return json.dumps(record)
+
+def call_session_from_record(data: Union[str, bytes]) -> CallSession:
+    record = json.loads(data)
+    record["start_time"] = datetime.fromisoformat(record["start_time"])
+    return CallSession(**{field: record[field] for field in CALL_RECORD_FIELDS if field in record})
+
+class HashRing:
+    """Consistent hash ring mapping call ids to replicas.
+    
+    Each replica is placed at many points on the ring, so adding or removing
+    one only moves the calls that hashed next to its points.
+    """
+    
+    def __init__(self, nodes, points_per_node: int = 64):
+        ring = sorted(
+            (self._hash(f"{node}#{index}"), node)
+            for node in set(nodes) for index in range(points_per_node)
+        )
+        self.hashes = [point for point, _ in ring]
+        self.nodes = [node for _, node in ring]
+        
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+        
+    def node_for(self, key: str) -> Optional[str]:
+        if not self.nodes:
+            return None
+        index = bisect.bisect(self.hashes, self._hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+class CallRegistry:
+    """Record of live calls, their AI engine sessions and the replica serving each.
+    
+    The default keeps calls in process, which is all a single replica needs.
+    """
+    
+    name = "memory"
+    # Whether other replicas see the same calls
+    shared = False
+    
+    def __init__(self, replica_id: str, replica_url: str):
+        self.replica_id = replica_id
+        self.replica_url = replica_url
+        self.calls: Dict[str, str] = {}
+        
+    async def start(self):
+        pass
+        
+    async def close(self):
+        pass
+        
+    async def register(self, session: CallSession):
+        """Record a call (or its updated state) as served by this replica"""
+        self.calls[session.call_id] = call_session_to_record(session)
+        
+    async def load(self, call_id: str) -> Optional[Tuple[CallSession, str]]:
+        """The recorded call and the replica serving it, if known"""
+        record = self.calls.get(call_id)
+        return (call_session_from_record(record), self.replica_id) if record else None
+        
+    async def claim(self, call_id: str, expected_owner: Optional[str] = None) -> Optional[CallSession]:
+        """Make this replica the owner of a recorded call.
+        
+        With expected_owner, the claim only succeeds if that replica still owns
+        the call, so replicas racing to take over a dead one's calls can't both win.
+        """
+        record = await self.load(call_id)
+        return record[0] if record else None
+        
+    async def remove(self, call_id: str):
+        self.calls.pop(call_id, None)
+        
+    async def heartbeat(self):
+        """Mark this replica as alive"""
+        
+    async def live_replicas(self) -> Dict[str, str]:
+        """Live replica ids and the URLs they advertise"""
+        return {self.replica_id: self.replica_url}
+        
+    async def orphaned_calls(self) -> Dict[str, List[str]]:
+        """Call ids still owned by replicas that stopped heartbeating"""
+        return {}
+
+class RedisCallRegistry(CallRegistry):
+    """Call registry in Redis, shared by every replica.
+    
+    Each call is a hash (`call:{id}`) holding the session record and its owner,
+    and each replica has a set of the calls it owns. Replicas heartbeat into a
+    sorted set; one whose heartbeat is older than replica_ttl is dead and its
+    calls can be claimed by the others.
+    """
+    
+    name = "redis"
+    shared = True
+    
+    def __init__(self, redis, replica_id: str, replica_url: str, replica_ttl: float = 15,
+                 call_ttl: int = 14400, prefix: str = "freeswitch:"):
+        super().__init__(replica_id, replica_url)
+        self.redis = redis
+        self.replica_ttl = replica_ttl
+        self.call_ttl = call_ttl
+        self.prefix = prefix
+        
+    def _call_key(self, call_id: str) -> str:
+        return f"{self.prefix}call:{call_id}"
+        
+    def _owned_key(self, replica_id: str) -> str:
+        return f"{self.prefix}replica:{replica_id}:calls"
+        
+    @property
+    def _replicas_key(self) -> str:
+        return f"{self.prefix}replicas"
+        
+    @property
+    def _urls_key(self) -> str:
+        return f"{self.prefix}replica_urls"
+        
+    async def start(self):
+        await self.heartbeat()
+        
+    async def close(self):
+        # Mark this replica dead at once so its calls are taken over without
+        # waiting for the heartbeat to expire
+        await self.redis.zadd(self._replicas_key, {self.replica_id: 0})
+        await self.redis.aclose()
+        
+    async def register(self, session: CallSession):
+        key = self._call_key(session.call_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"session": call_session_to_record(session), "owner": self.replica_id})
+            pipe.expire(key, self.call_ttl)
+            pipe.sadd(self._owned_key(self.replica_id), session.call_id)
+            await pipe.execute()
+            
+    async def load(self, call_id: str) -> Optional[Tuple[CallSession, str]]:
+        record, owner = await self.redis.hmget(self._call_key(call_id), ["session", "owner"])
+        if not record:
+            return None
+        return call_session_from_record(record), owner.decode()
+        
+    async def claim(self, call_id: str, expected_owner: Optional[str] = None) -> Optional[CallSession]:
+        key = self._call_key(call_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                record, owner = await pipe.hmget(key, ["session", "owner"])
+                owner = owner.decode() if owner else None
+                if not record:
+                    await pipe.unwatch()
+                    if expected_owner:
+                        await self.redis.srem(self._owned_key(expected_owner), call_id)
+                    return None
+                if expected_owner and owner != expected_owner:
+                    await pipe.unwatch()
+                    return None
+                    
+                pipe.multi()
+                pipe.hset(key, "owner", self.replica_id)
+                pipe.expire(key, self.call_ttl)
+                pipe.srem(self._owned_key(owner), call_id)
+                pipe.sadd(self._owned_key(self.replica_id), call_id)
+                await pipe.execute()
+            except aioredis.WatchError:
+                return None
+        return call_session_from_record(record)
+        
+    async def remove(self, call_id: str):
+        owner = await self.redis.hget(self._call_key(call_id), "owner")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._call_key(call_id))
+            pipe.srem(self._owned_key(owner.decode() if owner else self.replica_id), call_id)
+            await pipe.execute()
+            
+    async def heartbeat(self):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._replicas_key, {self.replica_id: time.time()})
+            pipe.hset(self._urls_key, self.replica_id, self.replica_url)
+            await pipe.execute()
+            
+    async def live_replicas(self) -> Dict[str, str]:
+        replicas = await self.redis.zrangebyscore(self._replicas_key, time.time() - self.replica_ttl, "+inf")
+        if not replicas:
+            return {}
+        urls = await self.redis.hmget(self._urls_key, replicas)
+        return {replica.decode(): (url or b"").decode() for replica, url in zip(replicas, urls)}
+        
+    async def orphaned_calls(self) -> Dict[str, List[str]]:
+        dead = await self.redis.zrangebyscore(self._replicas_key, "-inf", f"({time.time() - self.replica_ttl}")
+        orphaned = {}
+        for replica in dead:
+            replica = replica.decode()
+            call_ids = await self.redis.smembers(self._owned_key(replica))
+            if call_ids:
+                orphaned[replica] = sorted(call_id.decode() for call_id in call_ids)
+            else:
+                # Nothing left to take over; forget the replica
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.zrem(self._replicas_key, replica)
+                    pipe.hdel(self._urls_key, replica)
+                    await pipe.execute()
+        return orphaned
+
+CALL_REGISTRIES = {"memory": CallRegistry, "redis": RedisCallRegistry}
+
+def create_call_registry(config: Dict, replica_id: str, replica_url: str) -> CallRegistry:
+    """Build the call registry named by config["call_registry"]"""
+    name = config.get("call_registry", "memory")
+    if name == "redis":
+        return RedisCallRegistry(
+            aioredis.from_url(config.get("redis_url", "redis://localhost:6379")),
+            replica_id,
+            replica_url,
+            replica_ttl=float(config.get("registry_replica_ttl", 15)),
+            call_ttl=int(config.get("call_registry_ttl", 14400))
+        )
+    if name not in CALL_REGISTRIES:
+        logger.warning(f"Unknown call registry {name}, using memory")
+    return CallRegistry(replica_id, replica_url)
 
 class FreeSwitchIntegration:
     """Main class for FreeSWITCH integration with AI engine"""
@@ -36,32 +1142,144 @@ class FreeSwitchIntegration:
         self.server_host = os.getenv("SERVER_HOST", "0.0.0.0")
         self.server_port = int(os.getenv("SERVER_PORT", "8080"))
         
+        # One long-lived keep-alive pool per upstream service
+        pool_limit = int(config.get("http_pool_limit", 100))
+        pool_limit_per_host = int(config.get("http_pool_limit_per_host", 50))
+        keepalive_timeout = float(config.get("http_keepalive_timeout", 30))
+        self.ai_engine_client = ServiceClient(
+            "ai_engine", self.ai_engine_url, pool_limit, pool_limit_per_host, keepalive_timeout
+        )
+        self.backend_client = ServiceClient(
+            "backend_api", self.backend_url, pool_limit, pool_limit_per_host, keepalive_timeout
+        )
+        self.backend_events = BackendEventQueue(
+            self.backend_client,
+            max_events=int(config.get("backend_event_queue_size", 10000)),
+            batch_size=int(config.get("backend_event_batch_size", 50)),
+            flush_interval=float(config.get("backend_event_flush_interval", 0.25)),
+            max_attempts=int(config.get("backend_event_max_attempts", 5)),
+            spool_dir=config.get("backend_event_spool_dir") or None
+        )
+        # Audio and barge-ins go to the engine over a few multiplexed
+        # WebSockets, or with one HTTP request per chunk when
+        # ai_engine_transport is "http"
+        self.ai_engine_transport = config.get("ai_engine_transport", "websocket")
+        self.engine_stream = EngineStreamPool(
+            engine_stream_url(self.ai_engine_url),
+            self.handle_engine_reply,
+            connections=int(config.get("ai_engine_stream_connections", 2)),
+            window=int(config.get("ai_engine_stream_window", 100)),
+            streaming=config.get("ai_engine_streaming", False)
+        ) if self.ai_engine_transport == "websocket" else None
+        # Per AI session: its call, the call's FreeSWITCH connection, and when
+        # each chunk still waiting for a reply was sent
+        self.stream_calls: Dict[str, Tuple[str, object, Dict[int, float]]] = {}
+        # AI session cleanups still running for ended calls
+        self.cleanup_tasks = set()
+        self.runner = None
+        self.ws_server = None
+        # Negotiated audio transport per FreeSWITCH connection
+        self.connection_transports: Dict[object, str] = {}
+        # Leg codec when call_start does not name one, and playback in progress per call
+        self.default_codec = config.get("playback_codec", "pcmu")
+        self.playback_tasks: Dict[str, asyncio.Task] = {}
+        # The greeting is rendered once for every leg codec, so calls start
+        # playing it without a round trip to the AI engine
+        self.greeting_text = config.get("greeting_text", DEFAULT_GREETING)
+        self.greeting_audio_file = config.get("greeting_audio_file") or None
+        self.greeting_frames: Dict[str, List[bytes]] = {}
+        self.greeting_task: Optional[asyncio.Task] = None
+        # AI session creation still running for new calls
+        self.setup_tasks: Dict[str, asyncio.Task] = {}
+        # Caller speech during playback stops the reply (barge-in)
+        self.barge_in_enabled = config.get("barge_in_enabled", True)
+        self.barge_in_threshold_db = float(config.get("barge_in_threshold_db", -35))
+        self.barge_in_min_speech_ms = int(config.get("barge_in_min_speech_ms", 120))
+        self.barge_in_tasks = set()
+        
+        # Each call's messages are handled in order by its own task
+        self.call_queue_size = int(config.get("call_queue_size", 50))
+        self.call_queue_policy = config.get("call_queue_policy", "drop_oldest")
+        if self.call_queue_policy not in CALL_QUEUE_POLICIES:
+            logger.warning(f"Unknown call queue policy {self.call_queue_policy}, using drop_oldest")
+            self.call_queue_policy = "drop_oldest"
+        self.call_queues: Dict[str, CallQueue] = {}
+        self.call_queue_events = Counter()
+        
+        # active_calls holds the calls this replica serves; the registry lets
+        # another replica pick them up, AI engine session included, if it dies
+        self.replica_id = config.get("replica_id") or socket.gethostname()
+        self.replica_url = config.get("replica_url") or f"ws://{self.replica_id}:{self.server_port + 1}"
+        self.call_registry = create_call_registry(config, self.replica_id, self.replica_url)
+        self.registry_heartbeat_interval = float(config.get("registry_heartbeat_interval", 5))
+        self.registry_task: Optional[asyncio.Task] = None
+        
     async def start_server(self):
         """Start the WebSocket server and HTTP health server"""
         logger.info("Starting FreeSWITCH Integration Server")
         
+        await self.ai_engine_client.start()
+        await self.backend_client.start()
+        await self.backend_events.start()
+        await self.call_registry.start()
+        if self.engine_stream:
+            await self.engine_stream.start()
+        self.greeting_task = asyncio.create_task(self.prerender_greeting())
+        if self.call_registry.shared:
+            self.registry_task = asyncio.create_task(self.registry_loop())
+        
         # Start HTTP server for health checks
         app = web.Application()
         app.router.add_get('/health', self.health_check)
         app.router.add_get('/ready', self.readiness_check)
+        app.router.add_get('/stats', self.stats_handler)
+        app.router.add_get('/call/route/{call_id}', self.route_handler)
+        app.router.add_get('/metrics', self.metrics_handler)
         
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(runner, self.server_host, self.server_port)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.server_host, self.server_port)
         await site.start()
         
         # Start WebSocket server for audio streaming on different port
         ws_port = self.server_port + 1
-        start_server = websockets.serve(
+        self.ws_server = await websockets.serve(
             self.handle_audio_stream, 
             self.server_host, 
             ws_port
         )
         
-        await start_server
         logger.info(f"HTTP server started on http://{self.server_host}:{self.server_port}")
         logger.info(f"WebSocket server started on ws://{self.server_host}:{ws_port}")
         
+    async def stop_server(self):
+        """Stop servers and close pooled upstream connections"""
+        if self.ws_server:
+            self.ws_server.close()
+            await self.ws_server.wait_closed()
+            self.ws_server = None
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.registry_task:
+            self.registry_task.cancel()
+            await asyncio.gather(self.registry_task, return_exceptions=True)
+            self.registry_task = None
+        if self.greeting_task:
+            self.greeting_task.cancel()
+            await asyncio.gather(self.greeting_task, return_exceptions=True)
+            self.greeting_task = None
+        if self.setup_tasks or self.cleanup_tasks:
+            await asyncio.gather(*self.setup_tasks.values(), *self.cleanup_tasks, return_exceptions=True)
+            
+        if self.engine_stream:
+            await self.engine_stream.close()
+        await self.backend_events.close()
+        await self.call_registry.close()
+        await self.ai_engine_client.close()
+        await self.backend_client.close()
+        logger.info("FreeSWITCH Integration Server stopped")
+        
     async def health_check(self, request):
         """HTTP health check endpoint"""
         return web.json_response({"status": "healthy", "service": "freeswitch-integration"})
@@ -70,83 +1288,338 @@ class FreeSwitchIntegration:
         """HTTP readiness check endpoint"""
         # Check if we can reach dependent services
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
-                # Check AI Engine
-                try:
-                    async with session.get(f"{self.ai_engine_url}/health") as resp:
-                        ai_healthy = resp.status == 200
-                except:
-                    ai_healthy = False
-                    
-                # Check Backend API  
-                try:
-                    async with session.get(f"{self.backend_url}/health") as resp:
-                        backend_healthy = resp.status == 200
-                except:
-                    backend_healthy = False
-                    
-                ready = ai_healthy and backend_healthy
-                status = "ready" if ready else "not_ready"
+            timeout = aiohttp.ClientTimeout(total=2)
+            
+            # Check AI Engine
+            try:
+                async with self.ai_engine_client.get("/health", timeout=timeout) as resp:
+                    ai_healthy = resp.status == 200
+            except:
+                ai_healthy = False
+                
+            # Check Backend API  
+            try:
+                async with self.backend_client.get("/health", timeout=timeout) as resp:
+                    backend_healthy = resp.status == 200
+            except:
+                backend_healthy = False
                 
-                return web.json_response({
-                    "status": status,
-                    "dependencies": {
-                        "ai_engine": "healthy" if ai_healthy else "unhealthy",
-                        "backend_api": "healthy" if backend_healthy else "unhealthy"
-                    }
-                }, status=200 if ready else 503)
+            ready = ai_healthy and backend_healthy
+            status = "ready" if ready else "not_ready"
+            
+            return web.json_response({
+                "status": status,
+                "dependencies": {
+                    "ai_engine": "healthy" if ai_healthy else "unhealthy",
+                    "backend_api": "healthy" if backend_healthy else "unhealthy"
+                }
+            }, status=200 if ready else 503)
                 
         except Exception as e:
             logger.error(f"Health check error: {e}")
             return web.json_response({"status": "error", "error": str(e)}, status=503)
+            
+    async def stats_handler(self, request):
+        """HTTP endpoint exposing connection pool statistics"""
+        return web.json_response({
+            "active_calls": len(self.active_calls),
+            "replica": {"id": self.replica_id, "call_registry": self.call_registry.name},
+            "call_queues": {
+                "calls": len(self.call_queues),
+                "queued_chunks": sum(queue.chunks for queue in self.call_queues.values()),
+                "max_chunks": self.call_queue_size,
+                "policy": self.call_queue_policy,
+                **{outcome: self.call_queue_events[outcome] for outcome in ("queued", "dropped", "coalesced", "rejected")}
+            },
+            "backend_events": self.backend_events.stats(),
+            "engine_stream": self.engine_stream.stats() if self.engine_stream else None,
+            "http_pools": {
+                self.ai_engine_client.name: self.ai_engine_client.stats(),
+                self.backend_client.name: self.backend_client.stats()
+            }
+        })
+        
+    async def metrics_handler(self, request):
+        """Prometheus metrics, including per-stage turn latency"""
+        if "application/openmetrics-text" in request.headers.get("Accept", ""):
+            body, content_type = generate_openmetrics(REGISTRY), OPENMETRICS_CONTENT_TYPE
+        else:
+            body, content_type = generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+        return web.Response(body=body, headers={"Content-Type": content_type})
+        
+    async def route_handler(self, request):
+        """HTTP endpoint naming the replica a call's audio should be sent to.
+        
+        A registered call stays with its live owner; other calls go to the
+        replica the consistent hash ring assigns among the live ones.
+        """
+        call_id = request.match_info["call_id"]
+        replicas = await self.call_registry.live_replicas()
+        record = await self.call_registry.load(call_id)
+        if record and record[1] in replicas:
+            replica = record[1]
+        else:
+            replica = HashRing(replicas).node_for(call_id)
+        if replica is None:
+            return web.json_response({"error": "no live replicas"}, status=503)
+            
+        return web.json_response({
+            "call_id": call_id,
+            "replica": replica,
+            "url": replicas[replica],
+            "registered": record is not None
+        })
+        
+    async def registry_loop(self):
+        """Heartbeat into the shared registry and take over calls of dead replicas"""
+        while True:
+            try:
+                await self.call_registry.heartbeat()
+                await self.take_over_orphaned_calls()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Call registry error: {e}")
+            await asyncio.sleep(self.registry_heartbeat_interval)
+            
+    async def take_over_orphaned_calls(self) -> List[str]:
+        """Claim the dead replicas' calls that hash to this replica.
+        
+        Every live replica runs this over the same ring, so each orphaned call
+        has exactly one taker and the load spreads across survivors.
+        """
+        orphaned = await self.call_registry.orphaned_calls()
+        if not orphaned:
+            return []
+            
+        ring = HashRing(await self.call_registry.live_replicas())
+        adopted = []
+        for dead_replica, call_ids in orphaned.items():
+            for call_id in call_ids:
+                if ring.node_for(call_id) != self.replica_id:
+                    continue
+                session = await self.call_registry.claim(call_id, expected_owner=dead_replica)
+                if session:
+                    self.active_calls.setdefault(call_id, session)
+                    adopted.append(call_id)
+                    
+        if adopted:
+            logger.info(f"Took over {len(adopted)} calls from {', '.join(orphaned)}")
+        return adopted
+        
+    async def restore_call(self, call_id: str) -> Optional[CallSession]:
+        """Adopt a registered call whose audio has arrived at this replica"""
+        try:
+            session = await self.call_registry.claim(call_id)
+        except Exception as e:
+            logger.error(f"Call registry error restoring {call_id}: {e}")
+            return None
+        if session:
+            logger.info(f"Restored call {call_id} (AI session {session.ai_engine_session}) from the registry")
+            self.active_calls.setdefault(call_id, session)
+        return session
         
     async def handle_audio_stream(self, websocket, path):
-        """Handle incoming audio stream from FreeSWITCH"""
+        """Handle incoming audio stream from FreeSWITCH
+        
+        Audio arrives as base64 inside JSON text messages or as binary audio
+        frames keyed by call id. A "hello" message offering "audio_transport"
+        selects how audio is sent back on this connection (JSON by default).
+        Call messages are only dispatched here; each call's queue task does the
+        work, so a slow AI engine round trip holds up only its own call.
+        """
+        self.connection_transports[websocket] = "json"
         try:
             async for message in websocket:
+                if isinstance(message, bytes):
+                    try:
+                        frame = decode_audio_frame(message)
+                    except ValueError as e:
+                        logger.warning(f"Dropping invalid audio frame: {e}")
+                        continue
+                    self.dispatch_call_message({
+                        "type": "audio_chunk",
+                        "call_id": frame.call_id,
+                        "audio_data": frame
+                    }, websocket)
+                    continue
+                    
                 data = json.loads(message)
                 
-                if data.get("type") == "call_start":
-                    await self.handle_call_start(data, websocket)
-                elif data.get("type") == "audio_chunk":
-                    await self.process_audio_chunk(data, websocket)
-                elif data.get("type") == "call_end":
-                    await self.handle_call_end(data)
+                if data.get("type") == "hello":
+                    transport = negotiate_audio_transport(data.get("audio_transport"))
+                    self.connection_transports[websocket] = transport
+                    await websocket.send(json.dumps({
+                        "type": "hello",
+                        "audio_transport": transport,
+                        "frame_version": AUDIO_FRAME_VERSION
+                    }))
+                elif data.get("type") in ("call_start", "audio_chunk", "call_end", "barge_in"):
+                    self.dispatch_call_message(data, websocket)
                     
         except websockets.exceptions.ConnectionClosed:
             logger.info("WebSocket connection closed")
         except Exception as e:
             logger.error(f"Error handling audio stream: {e}")
+        finally:
+            # Nobody is left to hear queued audio, but call_end must still run
+            queues = [queue for queue in self.call_queues.values() if queue.websocket is websocket]
+            for queue in queues:
+                queue.close(discard_audio=True)
+            await asyncio.gather(*(queue.task for queue in queues), return_exceptions=True)
+            self.connection_transports.pop(websocket, None)
+            
+    def dispatch_call_message(self, data: Dict, websocket):
+        """Hand a call message to its call's queue, starting the queue on call_start.
+        
+        Barge-in is acted on here rather than queued, since the call's task may
+        be waiting on the AI engine while its previous reply is still playing.
+        """
+        call_id = data.get("call_id")
+        if data.get("type") == "barge_in" or (call_id in self.active_calls and self.is_barge_in(self.active_calls[call_id], data)):
+            task = asyncio.create_task(self.handle_barge_in(websocket, call_id))
+            self.barge_in_tasks.add(task)
+            task.add_done_callback(self.barge_in_tasks.discard)
+            if data.get("type") == "barge_in":
+                return
+                
+        queue = self.call_queues.get(call_id)
+        if queue is None:
+            if data.get("type") != "call_start" and call_id not in self.active_calls and not self.call_registry.shared:
+                logger.warning(f"Received {data.get('type')} for unknown call: {call_id}")
+                return
+            queue = CallQueue(call_id, websocket, self.call_queue_size, self.call_queue_policy)
+            queue.task = asyncio.create_task(self.run_call_queue(queue))
+            self.call_queues[call_id] = queue
             
+        outcome = queue.put(data, websocket)
+        self.call_queue_events[outcome] += 1
+        if outcome in ("dropped", "rejected"):
+            logger.warning(f"Call queue full for {call_id}: {outcome} audio chunk ({self.call_queue_policy})")
+            
+    async def run_call_queue(self, queue: CallQueue):
+        """Handle one call's messages in order until call_end or the connection closes"""
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                data, websocket = item
+                try:
+                    if data.get("type") != "call_start" and queue.call_id not in self.active_calls:
+                        # Served by another replica until now, or unknown
+                        if not await self.restore_call(queue.call_id):
+                            logger.warning(f"Received {data.get('type')} for unknown call: {queue.call_id}")
+                            break
+                    if data.get("type") == "call_start":
+                        await self.handle_call_start(data, websocket)
+                    elif data.get("type") == "audio_chunk":
+                        await self.process_audio_chunk(data, websocket)
+                    elif data.get("type") == "call_end":
+                        await self.handle_call_end(data)
+                        break
+                except Exception as e:
+                    logger.error(f"Error handling {data.get('type')} for call {queue.call_id}: {e}")
+        finally:
+            if self.call_queues.get(queue.call_id) is queue:
+                del self.call_queues[queue.call_id]
+                
+
     async def handle_call_start(self, data: Dict, websocket):
-        """Handle new incoming call"""
+        """Handle new incoming call.
+        
+        The pre-rendered greeting starts playing straight away while the AI
+        engine session is created in the background; the call's audio chunks
+        wait for the session in its call queue.
+        """
         call_id = data.get("call_id")
         phone_number = data.get("phone_number", "unknown")
         
         logger.info(f"New call started: {call_id} from {phone_number}")
         
+        codec = str(data.get("codec") or self.default_codec).lower()
+        if codec not in LEG_SAMPLE_RATES:
+            logger.warning(f"Unsupported leg codec {codec} for call {call_id}, using {self.default_codec}")
+            codec = self.default_codec
+            
         # Create call session
         session = CallSession(
             call_id=call_id,
             phone_number=phone_number,
-            start_time=datetime.now()
+            start_time=datetime.now(),
+            codec=codec,
+            setup_started=time.perf_counter()
         )
         self.active_calls[call_id] = session
         
-        # Notify backend about new call
-        await self.notify_backend("call_start", {
+        # Notify backend about new call (queued, never waited on)
+        self.notify_backend("call_start", {
             "call_id": call_id,
             "phone_number": phone_number,
             "timestamp": session.start_time.isoformat()
         })
         
-        # Initialize AI engine session
-        ai_session = await self.initialize_ai_session(call_id, phone_number)
-        session.ai_engine_session = ai_session
+        # Initialize AI engine session, synthesizing the greeting alongside if it is not rendered yet
+        frames = self.greeting_frames.get(codec)
+        task = asyncio.create_task(self.setup_call(session, websocket, greet=not frames))
+        self.setup_tasks[call_id] = task
+        task.add_done_callback(
+            lambda done: self.setup_tasks.pop(call_id, None) if self.setup_tasks.get(call_id) is done else None
+        )
         
         # Send welcome message
-        await self.send_audio_response(websocket, call_id, "Hello! How can I help you today?")
+        if frames:
+            await self.start_playback(websocket, call_id, self.greeting_text, codec, frames)
+            
+    async def setup_call(self, session: CallSession, websocket, greet: bool = False):
+        """Create and register the call's AI engine session"""
+        jobs = [self.initialize_ai_session(session.call_id, session.phone_number)]
+        if greet:
+            jobs.append(self.send_audio_response(websocket, session.call_id, self.greeting_text))
+        session.ai_engine_session, *_ = await asyncio.gather(*jobs)
+        try:
+            await self.call_registry.register(session)
+        except Exception as e:
+            logger.error(f"Call registry error registering {session.call_id}: {e}")
+            
+    async def call_setup_done(self, call_id: str):
+        """Wait for the call's AI session setup, if it is still running"""
+        setup = self.setup_tasks.get(call_id)
+        if setup:
+            # asyncio.wait, unlike gather, leaves the setup running if this waiter is cancelled
+            await asyncio.wait([setup])
+            
+    async def render_greeting(self) -> bool:
+        """Decode the greeting once and encode it for every leg codec"""
+        if self.greeting_audio_file:
+            try:
+                audio = await asyncio.to_thread(self._read_greeting_file)
+            except OSError as e:
+                logger.error(f"Cannot read greeting audio {self.greeting_audio_file}: {e}")
+                audio = None
+        else:
+            audio = await self.synthesize_speech(self.greeting_text)
+        decoded = decode_response_audio(audio, "wav") if audio else None
+        if not decoded:
+            return False
+            
+        self.greeting_frames = {
+            codec: playback_frames(transcode_for_leg(*decoded, codec), codec) for codec in LEG_SAMPLE_RATES
+        }
+        return True
+        
+    async def prerender_greeting(self):
+        """Render the greeting at startup, retrying until the AI engine can synthesize it"""
+        delay = 1.0
+        while not await self.render_greeting():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        logger.info(f"Greeting pre-rendered ({len(self.greeting_frames['l16']) * PLAYBACK_FRAME_MS} ms)")
         
+    def _read_greeting_file(self) -> bytes:
+        with open(self.greeting_audio_file, "rb") as f:
+            return f.read()
+            
     async def process_audio_chunk(self, data: Dict, websocket):
         """Process incoming audio chunk and send to AI engine"""
         call_id = data.get("call_id")
@@ -156,19 +1629,98 @@ class FreeSwitchIntegration:
             logger.warning(f"Received audio for unknown call: {call_id}")
             return
             
+        # Chunks that arrive during call setup wait here, in order, for the AI session
+        await self.call_setup_done(call_id)
         session = self.active_calls[call_id]
+        if self.engine_stream:
+            await self.stream_to_ai_engine(session, audio_data, websocket)
+            return
+        trace_id = new_trace_id(call_id)
+        started = time.perf_counter()
         
         try:
             # Send audio to AI engine for processing
-            response = await self.send_to_ai_engine(session.ai_engine_session, audio_data)
+            response = await self.send_to_ai_engine(session.ai_engine_session, audio_data, trace_id)
+            engine_seconds = time.perf_counter() - started
             
             if response and response.get("text_response"):
-                # Send AI response back as audio
-                await self.send_audio_response(websocket, call_id, response["text_response"])
+                observe_stage("ai_engine", engine_seconds, trace_id)
+                
+                # Play the engine's synthesized reply back to the caller
+                audio = base64.b64decode(response["audio_response"]) if response.get("audio_response") else None
+                await self.send_audio_response(
+                    websocket, call_id, response["text_response"], audio, response.get("audio_format", "wav"), trace_id
+                )
+                
+                total = time.perf_counter() - started
+                observe_stage("turn", total, trace_id)
+                logger.info(f"Turn {trace_id}: {total * 1000:.0f} ms (ai_engine {engine_seconds * 1000:.0f} ms)")
+            else:
+                # Chunks the engine is still buffering are not turns
+                observe_stage("ai_engine", engine_seconds)
                 
         except Exception as e:
             logger.error(f"Error processing audio chunk: {e}")
             
+    def is_barge_in(self, session: CallSession, data: Dict) -> bool:
+        """Whether a chunk is caller speech arriving while a reply is playing.
+        
+        Binary frames carry their codec; JSON chunks are only checked when
+        they name one ("codec", optional "sample_rate").
+        """
+        playback = self.playback_tasks.get(session.call_id)
+        if not self.barge_in_enabled or not playback or playback.done():
+            return False
+            
+        audio_data = data.get("audio_data")
+        if isinstance(audio_data, AudioFrame):
+            codec, sample_rate, payload = audio_data.codec, audio_data.sample_rate, audio_data.payload
+        elif data.get("codec") in RAW_AUDIO_CODECS and isinstance(audio_data, str):
+            codec = data["codec"]
+            sample_rate = int(data.get("sample_rate") or LEG_SAMPLE_RATES[codec])
+            payload = base64.b64decode(audio_data)
+        else:
+            return False
+            
+        pcm = chunk_to_pcm(payload, codec)
+        return pcm is not None and contains_speech(
+            pcm, sample_rate, self.barge_in_threshold_db, self.barge_in_min_speech_ms
+        )
+        
+    async def handle_barge_in(self, websocket, call_id: str):
+        """Stop the reply the caller is talking over, here and in the AI engine"""
+        session = self.active_calls.get(call_id)
+        playback = self.playback_tasks.pop(call_id, None)
+        if not session or not playback:
+            return
+            
+        played_ms = None
+        if session.playback_started is not None:
+            played_ms = int((asyncio.get_running_loop().time() - session.playback_started) * 1000)
+        playback.cancel()
+        await asyncio.gather(playback, return_exceptions=True)
+        session.playback_started = None
+        logger.info(f"Barge-in on call {call_id} after {played_ms} ms of playback")
+        
+        # Drop whatever FreeSWITCH has already buffered
+        try:
+            await websocket.send(json.dumps({"type": "playback_stop", "call_id": call_id}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+            
+        if session.ai_engine_session:
+            # On the session's stream connection, so it follows the audio already sent
+            if self.engine_stream and await self.engine_stream.barge_in(session.ai_engine_session, played_ms):
+                return
+            try:
+                async with self.ai_engine_client.post(
+                    f"/session/{session.ai_engine_session}/barge_in", json={"played_ms": played_ms}
+                ) as response:
+                    if response.status != 200:
+                        logger.warning(f"AI engine barge-in failed: {response.status}")
+            except Exception as e:
+                logger.error(f"Error sending barge-in to AI engine: {e}")
+                
     async def handle_call_end(self, data: Dict):
         """Handle call termination"""
         call_id = data.get("call_id")
@@ -179,91 +1731,252 @@ class FreeSwitchIntegration:
             
             logger.info(f"Call ended: {call_id}")
             
+            playback = self.playback_tasks.pop(call_id, None)
+            if playback:
+                playback.cancel()
+            await self.call_setup_done(call_id)
+            
             # Notify backend about call end
-            await self.notify_backend("call_end", {
+            self.notify_backend("call_end", {
                 "call_id": call_id,
                 "duration": (datetime.now() - session.start_time).total_seconds()
             })
             
-            # Cleanup AI engine session
+            # Cleanup AI engine session in the background
             if session.ai_engine_session:
-                await self.cleanup_ai_session(session.ai_engine_session)
+                self.stream_calls.pop(session.ai_engine_session, None)
+                if self.engine_stream:
+                    self.engine_stream.forget(session.ai_engine_session)
+                task = asyncio.create_task(self.cleanup_ai_session(session.ai_engine_session))
+                self.cleanup_tasks.add(task)
+                task.add_done_callback(self.cleanup_tasks.discard)
                 
             # Remove from active calls
             del self.active_calls[call_id]
+            try:
+                await self.call_registry.remove(call_id)
+            except Exception as e:
+                logger.error(f"Call registry error removing {call_id}: {e}")
             
     async def initialize_ai_session(self, call_id: str, phone_number: str) -> str:
         """Initialize a new AI engine session"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.ai_engine_url}/session/create", json={
-                    "call_id": call_id,
-                    "phone_number": phone_number,
-                    "context": "receptionist"
-                }) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get("session_id")
-                    else:
-                        logger.error(f"Failed to create AI session: {response.status}")
-                        return None
+            async with self.ai_engine_client.post("/session/create", json={
+                "call_id": call_id,
+                "phone_number": phone_number,
+                "context": "receptionist"
+            }) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return result.get("session_id")
+                else:
+                    logger.error(f"Failed to create AI session: {response.status}")
+                    return None
         except Exception as e:
             logger.error(f"Error initializing AI session: {e}")
             return None
             
-    async def send_to_ai_engine(self, session_id: str, audio_data: str) -> Optional[Dict]:
-        """Send audio data to AI engine for processing"""
+    async def send_to_ai_engine(self, session_id: str, audio_data: Union[str, AudioFrame],
+                                trace_id: Optional[str] = None) -> Optional[Dict]:
+        """Send audio data to AI engine for processing
+        
+        Binary frames are forwarded as-is (re-keyed by AI session id); base64
+        strings use the JSON endpoint. trace_id is passed in TRACE_HEADER so
+        the engine's stage timings carry the same id.
+        """
+        headers = {TRACE_HEADER: trace_id} if trace_id else {}
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.ai_engine_url}/process", json={
+            if isinstance(audio_data, AudioFrame):
+                request = self.ai_engine_client.post(
+                    "/process/frame",
+                    data=encode_audio_frame(
+                        session_id, audio_data.sequence, audio_data.codec, audio_data.sample_rate, audio_data.payload
+                    ),
+                    headers={"Content-Type": AUDIO_FRAME_CONTENT_TYPE, **headers},
+                    params={"response_format": "wav"}
+                )
+            else:
+                request = self.ai_engine_client.post("/process", json={
                     "session_id": session_id,
                     "audio_data": audio_data,
-                    "format": "base64"
-                }) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logger.error(f"AI engine request failed: {response.status}")
-                        return None
+                    "format": "base64",
+                    "response_format": "wav"
+                }, headers=headers)
+                
+            async with request as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    logger.error(f"AI engine request failed: {response.status}")
+                    return None
         except Exception as e:
             logger.error(f"Error sending to AI engine: {e}")
             return None
             
-    async def send_audio_response(self, websocket, call_id: str, text: str):
-        """Convert text to speech and send back to caller"""
+    async def stream_to_ai_engine(self, session: CallSession, audio_data: Union[str, AudioFrame], websocket):
+        """Send a chunk over the engine stream; handle_engine_reply plays the answer"""
+        session_id = session.ai_engine_session
+        if not session_id:
+            logger.warning(f"No AI session for call {session.call_id}, dropping audio")
+            return
+        _, _, sent_at = self.stream_calls.setdefault(session_id, (session.call_id, websocket, {}))
+        started = time.perf_counter()
+        sequence = await self.engine_stream.send(session_id, audio_data)
+        sent_at[sequence] = started
+        # Chunks the engine is still buffering get no reply
+        while len(sent_at) > self.engine_stream.window:
+            del sent_at[next(iter(sent_at))]
+            
+    async def handle_engine_reply(self, message: Dict, frame: Optional[AudioFrame]):
+        """Play a reply from the engine stream to the call its session belongs to"""
+        session_id = message.get("session_id")
+        call = self.stream_calls.get(session_id)
+        if not call:
+            return
+        call_id, websocket, sent_at = call
+        sequence = message.get("sequence")
+        trace_id = stream_trace_id(session_id, sequence)
+        started = sent_at.get(sequence)
+        audio, audio_format = (bytes(frame.payload), frame.codec) if frame else (None, "wav")
+        
+        if message.get("type") == "error":
+            logger.error(f"AI engine error for call {call_id}: {message.get('error')}")
+            sent_at.pop(sequence, None)
+        elif message.get("type") == "audio_segment":
+            # Streamed replies play sentence by sentence as they arrive
+            if message.get("segment") == 0 and started is not None:
+                observe_stage("ai_engine", time.perf_counter() - started, trace_id)
+            await self.send_audio_response(websocket, call_id, message.get("text", ""), audio, audio_format, trace_id)
+        elif message.get("type") in ("ai_response", "ai_response_end"):
+            data = message.get("data", {})
+            if message["type"] == "ai_response" and started is not None:
+                observe_stage("ai_engine", time.perf_counter() - started, trace_id)
+            if data.get("text_response") and (message["type"] == "ai_response" or not data.get("segments")):
+                await self.send_audio_response(websocket, call_id, data["text_response"], audio, audio_format, trace_id)
+            # Replies come in order, so earlier chunks will not get one
+            for earlier in [seq for seq in sent_at if seq <= sequence]:
+                del sent_at[earlier]
+            if started is not None:
+                total = time.perf_counter() - started
+                observe_stage("turn", total, trace_id)
+                logger.info(f"Turn {trace_id}: {total * 1000:.0f} ms")
+                
+    async def synthesize_speech(self, text: str) -> Optional[bytes]:
+        """Ask the AI engine to synthesize text (used for prompts with no engine audio)"""
         try:
-            # This would integrate with TTS service
-            response_data = {
-                "type": "audio_response",
-                "call_id": call_id,
-                "text": text,
-                "audio_data": "base64_encoded_audio_data"  # Placeholder
-            }
+            async with self.ai_engine_client.post("/synthesize", json={"text": text, "format": "wav"}) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return base64.b64decode(result["audio_data"])
+                logger.error(f"AI engine synthesis failed: {response.status}")
+        except Exception as e:
+            logger.error(f"Error synthesizing speech: {e}")
+        return None
+        
+    async def send_audio_response(self, websocket, call_id: str, text: str,
+                                  audio: Optional[bytes] = None, audio_format: str = "wav",
+                                  trace_id: Optional[str] = None) -> Optional[asyncio.Task]:
+        """Play speech to the caller in paced 20 ms frames.
+        
+        The audio is transcoded to the call leg's codec and rate, announced with
+        an "audio_response" message, then streamed by a per-call playback task
+        queued behind any reply that is still playing. Returns that task.
+        """
+        try:
+            session = self.active_calls.get(call_id)
+            codec = session.codec if session else self.default_codec
             
-            await websocket.send(json.dumps(response_data))
+            if audio is None:
+                audio, audio_format = await self.synthesize_speech(text), "wav"
+            started = time.perf_counter()
+            decoded = decode_response_audio(audio, audio_format) if audio else None
+            frames = playback_frames(transcode_for_leg(*decoded, codec), codec) if decoded else []
+            observe_stage("transcode", time.perf_counter() - started, trace_id)
+            if audio and not decoded:
+                logger.warning(f"Cannot play {audio_format} audio for call {call_id}, sending text only")
+            return await self.start_playback(websocket, call_id, text, codec, frames, trace_id)
             
         except Exception as e:
             logger.error(f"Error sending audio response: {e}")
+            return None
+            
+    async def start_playback(self, websocket, call_id: str, text: str, codec: str, frames: List[bytes],
+                             trace_id: Optional[str] = None) -> Optional[asyncio.Task]:
+        """Announce encoded frames with an "audio_response" message and queue their playback"""
+        started = time.perf_counter()
+        await websocket.send(json.dumps({
+            "type": "audio_response",
+            "call_id": call_id,
+            "text": text,
+            "codec": codec,
+            "sample_rate": LEG_SAMPLE_RATES[codec],
+            "frame_ms": PLAYBACK_FRAME_MS,
+            "frames": len(frames)
+        }))
+        observe_stage("ws_send", time.perf_counter() - started, trace_id)
+        if not frames:
+            return None
+            
+        previous = self.playback_tasks.get(call_id)
+        task = asyncio.create_task(self.play_frames(websocket, call_id, codec, frames, previous))
+        self.playback_tasks[call_id] = task
+        task.add_done_callback(
+            lambda done: self.playback_tasks.pop(call_id, None) if self.playback_tasks.get(call_id) is done else None
+        )
+        return task
+        
+    async def play_frames(self, websocket, call_id: str, codec: str, frames: List[bytes],
+                          previous: Optional[asyncio.Task] = None):
+        """Send frames on a fixed 20 ms schedule after a short prebuffer burst"""
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
             
-    async def notify_backend(self, event_type: str, data: Dict):
-        """Notify Rails backend about call events"""
+        session = self.active_calls.get(call_id)
+        binary = self.connection_transports.get(websocket) == "binary"
+        sample_rate = LEG_SAMPLE_RATES[codec]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        if session:
+            session.playback_started = started
+        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.backend_url}/api/calls/events", json={
-                    "event_type": event_type,
-                    "data": data
-                }) as response:
-                    if response.status != 200:
-                        logger.warning(f"Backend notification failed: {response.status}")
-        except Exception as e:
-            logger.error(f"Error notifying backend: {e}")
+            for index, frame in enumerate(frames):
+                # Scheduled against the start time, so sleep jitter does not accumulate
+                delay = started + max(0, index - PLAYBACK_PREBUFFER_FRAMES) * PLAYBACK_FRAME_MS / 1000 - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    
+                sequence = session.playback_sequence if session else index
+                if session:
+                    session.playback_sequence += 1
+                if binary:
+                    await websocket.send(encode_audio_frame(call_id, sequence, codec, sample_rate, frame))
+                else:
+                    await websocket.send(json.dumps({
+                        "type": "audio_frame",
+                        "call_id": call_id,
+                        "sequence": sequence,
+                        "audio_data": base64.b64encode(frame).decode()
+                    }))
+                if session and session.setup_started is not None:
+                    # The call's first audio: the greeting
+                    observe_stage("greeting", time.perf_counter() - session.setup_started)
+                    session.setup_started = None
+        except websockets.exceptions.ConnectionClosed:
+            logger.info(f"Connection closed during playback for call {call_id}")
+        finally:
+            if session and session.playback_started == started:
+                session.playback_started = None
+            
+    def notify_backend(self, event_type: str, data: Dict):
+        """Queue a call event for the Rails backend"""
+        self.backend_events.publish(event_type, data)
             
     async def cleanup_ai_session(self, session_id: str):
         """Cleanup AI engine session"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.delete(f"{self.ai_engine_url}/session/{session_id}"):
-                    pass
+            async with self.ai_engine_client.delete(f"/session/{session_id}"):
+                pass
         except Exception as e:
             logger.error(f"Error cleaning up AI session: {e}")
 
@@ -272,14 +1985,44 @@ async def main():
     # Load configuration from environment variables
     config = {
         "ai_engine_url": os.getenv("AI_ENGINE_URL", "http://localhost:8081"),
-        "backend_url": os.getenv("BACKEND_API_URL", "http://localhost:3000")
+        "backend_url": os.getenv("BACKEND_API_URL", "http://localhost:3000"),
+        "http_pool_limit": int(os.getenv("HTTP_POOL_LIMIT", "100")),
+        "http_pool_limit_per_host": int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "50")),
+        "http_keepalive_timeout": float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30")),
+        "playback_codec": os.getenv("PLAYBACK_CODEC", "pcmu"),
+        "barge_in_enabled": os.getenv("BARGE_IN_ENABLED", "true").lower() == "true",
+        "barge_in_threshold_db": float(os.getenv("BARGE_IN_THRESHOLD_DB", "-35")),
+        "barge_in_min_speech_ms": int(os.getenv("BARGE_IN_MIN_SPEECH_MS", "120")),
+        "call_queue_size": int(os.getenv("CALL_QUEUE_SIZE", "50")),
+        "call_queue_policy": os.getenv("CALL_QUEUE_POLICY", "drop_oldest"),
+        "call_registry": os.getenv("CALL_REGISTRY", "memory"),
+        "redis_url": os.getenv("REDIS_URL", "redis://localhost:6379"),
+        "replica_id": os.getenv("REPLICA_ID"),
+        "replica_url": os.getenv("REPLICA_URL"),
+        "registry_heartbeat_interval": float(os.getenv("REGISTRY_HEARTBEAT_INTERVAL", "5")),
+        "registry_replica_ttl": float(os.getenv("REGISTRY_REPLICA_TTL", "15")),
+        "call_registry_ttl": int(os.getenv("CALL_REGISTRY_TTL", "14400")),
+        "backend_event_queue_size": int(os.getenv("BACKEND_EVENT_QUEUE_SIZE", "10000")),
+        "backend_event_batch_size": int(os.getenv("BACKEND_EVENT_BATCH_SIZE", "50")),
+        "backend_event_flush_interval": float(os.getenv("BACKEND_EVENT_FLUSH_INTERVAL", "0.25")),
+        "backend_event_max_attempts": int(os.getenv("BACKEND_EVENT_MAX_ATTEMPTS", "5")),
+        "backend_event_spool_dir": os.getenv("BACKEND_EVENT_SPOOL_DIR", ""),
+        "ai_engine_transport": os.getenv("AI_ENGINE_TRANSPORT", "websocket"),
+        "ai_engine_stream_connections": int(os.getenv("AI_ENGINE_STREAM_CONNECTIONS", "2")),
+        "ai_engine_stream_window": int(os.getenv("AI_ENGINE_STREAM_WINDOW", "100")),
+        "ai_engine_streaming": os.getenv("AI_ENGINE_STREAMING", "false").lower() == "true",
+        "greeting_text": os.getenv("GREETING_TEXT", DEFAULT_GREETING),
+        "greeting_audio_file": os.getenv("GREETING_AUDIO_FILE", "")
     }
     
     integration = FreeSwitchIntegration(config)
     await integration.start_server()
     
-    # Keep the server running
-    await asyncio.Future()  # Run forever
+    try:
+        # Keep the server running
+        await asyncio.Future()  # Run forever
+    finally:
+        await integration.stop_server()
 
 if __name__ == "__main__":
     try:
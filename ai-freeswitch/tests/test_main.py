@@ -1,15 +1,28 @@
 import pytest
 import asyncio
 import json
-from unittest.mock import Mock, AsyncMock, patch
-from src.main import FreeSwitchIntegration, CallSession
+import base64
+import time
+import wave
+import io
+import numpy as np
+import fakeredis
+from unittest.mock import Mock, AsyncMock, MagicMock, patch
+from src.main import (
+    FreeSwitchIntegration, CallSession, ServiceClient, AudioFrame,
+    encode_audio_frame, decode_audio_frame, AUDIO_FRAME_CONTENT_TYPE,
+    linear_to_ulaw, linear_to_alaw, transcode_for_leg, playback_frames, decode_response_audio,
+    chunk_to_pcm, contains_speech, CallQueue, HashRing, RedisCallRegistry, TRACE_HEADER,
+    BackendEventQueue, EngineStream, EngineStreamPool, engine_stream_url
+)
 from datetime import datetime
 
 @pytest.fixture
 def config():
     return {
         "ai_engine_url": "http://ai-engine-service:8081",
-        "backend_url": "http://backend-api-service:3000"
+        "backend_url": "http://backend-api-service:3000",
+        "ai_engine_transport": "http"
     }
 
 @pytest.fixture
@@ -29,6 +42,7 @@ async def test_call_session_creation():
     assert session.phone_number == "+1234567890"
     assert session.status == "active"
     assert session.ai_engine_session is None
+    assert not hasattr(session, "__dict__")
 
 @pytest.mark.asyncio
 async def test_handle_call_start(freeswitch_integration):
@@ -47,6 +61,8 @@ async def test_handle_call_start(freeswitch_integration):
         mock_init_ai.return_value = "ai-session-123"
         
         await freeswitch_integration.handle_call_start(call_data, mock_websocket)
+        # The AI session is created in the background
+        await freeswitch_integration.setup_tasks["test-call-456"]
         
         # Check that call session was created
         assert "test-call-456" in freeswitch_integration.active_calls
@@ -114,7 +130,9 @@ async def test_process_audio_chunk(freeswitch_integration):
     }
     
     mock_ai_response = {
-        "text_response": "Thank you for calling. How may I help you?"
+        "text_response": "Thank you for calling. How may I help you?",
+        "audio_response": base64.b64encode(b"RIFF-audio").decode(),
+        "audio_format": "wav"
     }
     
     with patch.object(freeswitch_integration, 'send_to_ai_engine') as mock_send_ai, \
@@ -124,48 +142,88 @@ async def test_process_audio_chunk(freeswitch_integration):
         
         await freeswitch_integration.process_audio_chunk(audio_data, mock_websocket)
         
-        # Check that audio was sent to AI engine
-        mock_send_ai.assert_called_once_with("ai-session-audio", "base64_encoded_audio")
+        # Check that audio was sent to AI engine with a trace id for the turn
+        session_id, audio, trace_id = mock_send_ai.call_args[0]
+        assert (session_id, audio) == ("ai-session-audio", "base64_encoded_audio")
+        assert trace_id.startswith("test-call-audio-")
         
-        # Check that response was sent back
+        # Check that the engine's audio was played back
         mock_send_audio.assert_called_once_with(
             mock_websocket, 
             "test-call-audio", 
-            "Thank you for calling. How may I help you?"
+            "Thank you for calling. How may I help you?",
+            b"RIFF-audio",
+            "wav",
+            trace_id
         )
 
+def mock_http_response(status, payload=None):
+    """Build an async context manager mimicking an aiohttp response"""
+    response = Mock()
+    response.status = status
+    response.json = AsyncMock(return_value=payload)
+    context = MagicMock()
+    context.__aenter__.return_value = response
+    return context
+
 @pytest.mark.asyncio
 async def test_initialize_ai_session(freeswitch_integration):
     """Test AI session initialization"""
-    with patch('aiohttp.ClientSession') as mock_session:
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value={"session_id": "new-ai-session"})
-        
-        mock_session.return_value.__aenter__.return_value.post.return_value.__aenter__.return_value = mock_response
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post:
+        mock_post.return_value = mock_http_response(200, {"session_id": "new-ai-session"})
         
         session_id = await freeswitch_integration.initialize_ai_session("call-123", "+1333333333")
         
         assert session_id == "new-ai-session"
+        assert mock_post.call_args[0][0] == "/session/create"
 
 @pytest.mark.asyncio
 async def test_send_to_ai_engine(freeswitch_integration):
     """Test sending audio to AI engine"""
-    with patch('aiohttp.ClientSession') as mock_session:
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value={
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post:
+        mock_post.return_value = mock_http_response(200, {
             "text_response": "I understand you need assistance.",
             "confidence": 0.95
         })
         
-        mock_session.return_value.__aenter__.return_value.post.return_value.__aenter__.return_value = mock_response
-        
         result = await freeswitch_integration.send_to_ai_engine("session-123", "audio_data")
         
         assert result["text_response"] == "I understand you need assistance."
         assert result["confidence"] == 0.95
 
+@pytest.mark.asyncio
+async def test_service_client_pool_lifecycle():
+    """Test pooled HTTP client start, stats and close"""
+    client = ServiceClient("ai_engine", "http://ai-engine-service:8081/", limit=10, limit_per_host=5)
+    
+    with pytest.raises(RuntimeError):
+        client.get("/health")
+        
+    await client.start()
+    session = client.session
+    await client.start()  # idempotent
+    assert client.session is session
+    
+    stats = client.stats()
+    assert stats["base_url"] == "http://ai-engine-service:8081"
+    assert stats["limit"] == 10
+    assert stats["limit_per_host"] == 5
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 0
+    assert stats["waits_total"] == 0
+    
+    await client.close()
+    assert client.session is None
+
+@pytest.mark.asyncio
+async def test_stats_endpoint_reports_pools(freeswitch_integration):
+    """Test pool stats are exposed per upstream service"""
+    response = await freeswitch_integration.stats_handler(Mock())
+    body = json.loads(response.body)
+    
+    assert set(body["http_pools"]) == {"ai_engine", "backend_api"}
+    assert body["http_pools"]["backend_api"]["base_url"] == "http://backend-api-service:3000"
+
 @pytest.mark.asyncio
 async def test_unknown_call_audio_chunk(freeswitch_integration):
     """Test handling audio chunk for unknown call"""
@@ -182,5 +240,567 @@ async def test_unknown_call_audio_chunk(freeswitch_integration):
         # Should not send to AI engine for unknown call
         mock_send_ai.assert_not_called()
 
+class FakeWebSocket:
+    """Minimal stand-in for a websockets server connection"""
+    
+    def __init__(self, messages, hold_open=False):
+        self.messages = messages
+        self.sent = []
+        # When set, the connection stays open after the messages until close()
+        self.open = asyncio.Event() if hold_open else None
+        
+    def __aiter__(self):
+        return self._iterate()
+        
+    async def _iterate(self):
+        for message in self.messages:
+            yield message
+        if self.open:
+            await self.open.wait()
+            
+    def close(self):
+        self.open.set()
+            
+    async def send(self, message):
+        self.sent.append(message)
+
+def test_audio_frame_round_trip():
+    """Test binary audio frames keep call id, metadata and payload"""
+    data = encode_audio_frame("call-1", 3, "pcmu", 8000, b"\xff" * 160)
+    frame = decode_audio_frame(data)
+    
+    assert (frame.call_id, frame.sequence, frame.codec, frame.sample_rate) == ("call-1", 3, "pcmu", 8000)
+    assert isinstance(frame.payload, memoryview)
+    assert frame.payload == b"\xff" * 160
+
+@pytest.mark.asyncio
+async def test_handle_audio_stream_binary_frames(freeswitch_integration):
+    """Test hello negotiation and dispatch of binary audio frames"""
+    websocket = FakeWebSocket([
+        json.dumps({"type": "hello", "audio_transport": ["binary", "json"]}),
+        encode_audio_frame("call-bin", 1, "l16", 16000, b"\x00\x00" * 320),
+        b"garbage"
+    ])
+    
+    with patch.object(freeswitch_integration, 'dispatch_call_message') as mock_process:
+        await freeswitch_integration.handle_audio_stream(websocket, "/")
+        
+    assert json.loads(websocket.sent[0])["audio_transport"] == "binary"
+    mock_process.assert_called_once()
+    data = mock_process.call_args[0][0]
+    assert data["call_id"] == "call-bin"
+    assert isinstance(data["audio_data"], AudioFrame)
+    assert freeswitch_integration.connection_transports == {}
+
+@pytest.mark.asyncio
+async def test_send_to_ai_engine_binary_frame(freeswitch_integration):
+    """Test binary frames are forwarded to the AI engine without base64"""
+    frame = decode_audio_frame(encode_audio_frame("call-bin", 9, "l16", 16000, b"\x01\x02" * 4))
+    
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post:
+        mock_post.return_value = mock_http_response(200, {"text_response": "ok"})
+        
+        result = await freeswitch_integration.send_to_ai_engine("ai-session-1", frame)
+        
+    assert result == {"text_response": "ok"}
+    assert mock_post.call_args[0][0] == "/process/frame"
+    assert mock_post.call_args.kwargs["headers"]["Content-Type"] == AUDIO_FRAME_CONTENT_TYPE
+    forwarded = decode_audio_frame(mock_post.call_args.kwargs["data"])
+    assert forwarded.call_id == "ai-session-1"
+    assert forwarded.sequence == 9
+    assert forwarded.payload == b"\x01\x02" * 4
+
+@pytest.mark.asyncio
+async def test_turn_trace_header_and_metrics(freeswitch_integration):
+    """Test a turn's trace id goes to the AI engine and its stages reach /metrics"""
+    freeswitch_integration.active_calls["call-t"] = CallSession(
+        call_id="call-t", phone_number="+1", start_time=datetime.now(), ai_engine_session="ai-t"
+    )
+    
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post, \
+         patch.object(freeswitch_integration, 'send_audio_response', AsyncMock()):
+        mock_post.return_value = mock_http_response(200, {"text_response": "Hi"})
+        await freeswitch_integration.process_audio_chunk({"call_id": "call-t", "audio_data": "AAAA"}, Mock())
+        
+    trace_id = mock_post.call_args.kwargs["headers"][TRACE_HEADER]
+    assert trace_id.startswith("call-t-")
+    
+    request = Mock(headers={"Accept": "application/openmetrics-text"})
+    metrics = (await freeswitch_integration.metrics_handler(request)).body.decode()
+    assert 'freeswitch_stage_seconds_count{stage="ai_engine"}' in metrics
+    assert f'trace_id="{trace_id}"' in metrics
+
+def make_wav(samples, sample_rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+def test_g711_encoders():
+    """Test G.711 encoding of reference values"""
+    pcm = np.array([0, -1, 1000, -1000, 32767, -32768], dtype=np.int16)
+    assert list(linear_to_ulaw(pcm)) == [0xFF, 0x7E, 0xCE, 0x4E, 0x80, 0x00]
+    assert list(linear_to_alaw(pcm)) == [0xD5, 0x55, 0xFA, 0x7A, 0xAA, 0x2A]
+
+def test_transcode_for_leg_resamples():
+    """Test engine audio is resampled to the leg rate and split into 20 ms frames"""
+    tone = (np.sin(2 * np.pi * 440 * np.arange(24000) / 24000) * 8000).astype(np.int16)
+    samples, rate = decode_response_audio(make_wav(tone, 24000), "wav")
+    
+    l16 = transcode_for_leg(samples, rate, "l16")
+    assert len(l16) == 16000 * 2
+    spectrum = np.abs(np.fft.rfft(np.frombuffer(l16, dtype="<i2")))
+    assert abs(np.argmax(spectrum) - 440) <= 1
+    
+    pcmu = transcode_for_leg(samples, rate, "pcmu")
+    assert len(pcmu) == 8000
+    frames = playback_frames(pcmu + pcmu[:50], "pcmu")
+    assert len(frames) == 51
+    assert all(len(frame) == 160 for frame in frames)
+    assert frames[-1].endswith(b"\xff")
+    
+    assert decode_response_audio(b"ID3mp3", "mp3") is None
+
+@pytest.mark.asyncio
+async def test_send_audio_response_paces_frames(freeswitch_integration):
+    """Test replies are sent as paced 20 ms frames in the leg's codec"""
+    websocket = FakeWebSocket([])
+    freeswitch_integration.active_calls["call-play"] = CallSession(
+        call_id="call-play", phone_number="+1", start_time=datetime.now(), codec="pcma"
+    )
+    freeswitch_integration.connection_transports[websocket] = "binary"
+    audio = make_wav(np.full(1600, 1000, dtype=np.int16), 16000)  # 100 ms
+    
+    started = time.monotonic()
+    task = await freeswitch_integration.send_audio_response(websocket, "call-play", "Hello", audio, "wav")
+    await task
+    elapsed = time.monotonic() - started
+    
+    header = json.loads(websocket.sent[0])
+    assert (header["type"], header["codec"], header["sample_rate"], header["frames"]) == ("audio_response", "pcma", 8000, 5)
+    frames = [decode_audio_frame(message) for message in websocket.sent[1:]]
+    assert [frame.sequence for frame in frames] == [0, 1, 2, 3, 4]
+    assert all(frame.codec == "pcma" and len(frame.payload) == 160 for frame in frames)
+    # The prebuffer frames go out at once, the rest on the 20 ms clock
+    assert 0.015 <= elapsed < 0.2
+    assert "call-play" not in freeswitch_integration.playback_tasks
+
+@pytest.mark.asyncio
+async def test_send_audio_response_synthesizes_prompts(freeswitch_integration):
+    """Test prompts without engine audio are synthesized and sent as JSON frames"""
+    websocket = FakeWebSocket([])
+    audio = make_wav(np.zeros(320, dtype=np.int16), 16000)
+    
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post:
+        mock_post.return_value = mock_http_response(200, {"audio_data": base64.b64encode(audio).decode()})
+        task = await freeswitch_integration.send_audio_response(websocket, "call-x", "Hello!")
+        await task
+        
+    assert mock_post.call_args[0][0] == "/synthesize"
+    frame = json.loads(websocket.sent[1])
+    assert frame["type"] == "audio_frame"
+    assert base64.b64decode(frame["audio_data"]) == b"\xff" * 160
+
+def test_barge_in_speech_detection():
+    """Test G.711 decoding and the speech check used for barge-in"""
+    tone = (np.sin(np.arange(1600) * 0.3) * 8000).astype(np.int16)
+    decoded = chunk_to_pcm(linear_to_ulaw(tone), "pcmu")
+    assert np.abs(decoded.astype(np.int32) - tone).max() < 300
+    assert contains_speech(decoded, 8000)
+    assert not contains_speech(np.zeros(1600, dtype=np.int16), 8000)
+    # Too short to count as the caller talking
+    assert not contains_speech(tone[:480], 8000)
+    assert chunk_to_pcm(b"\x00", "opus") is None
+
+@pytest.mark.asyncio
+async def test_barge_in_stops_playback(freeswitch_integration):
+    """Test caller speech during a reply stops playback and notifies the AI engine"""
+    websocket = FakeWebSocket([])
+    session = CallSession(call_id="call-b", phone_number="+1", start_time=datetime.now(), ai_engine_session="sess-b")
+    freeswitch_integration.active_calls["call-b"] = session
+    audio = make_wav(np.full(16000, 1000, dtype=np.int16), 16000)  # 1 s
+    task = await freeswitch_integration.send_audio_response(websocket, "call-b", "Long reply", audio, "wav")
+    await asyncio.sleep(0.05)
+    
+    speech = linear_to_ulaw((np.sin(np.arange(1600) * 0.3) * 8000).astype(np.int16))
+    chunk = {"call_id": "call-b", "audio_data": base64.b64encode(speech).decode(), "codec": "pcmu"}
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post, \
+         patch.object(freeswitch_integration, 'send_to_ai_engine', AsyncMock(return_value=None)):
+        mock_post.return_value = mock_http_response(200, {"status": "interrupted"})
+        freeswitch_integration.dispatch_call_message({"type": "audio_chunk", **chunk}, websocket)
+        await asyncio.gather(*freeswitch_integration.barge_in_tasks)
+        
+    assert task.cancelled()
+    assert "call-b" not in freeswitch_integration.playback_tasks
+    assert json.loads(websocket.sent[-1]) == {"type": "playback_stop", "call_id": "call-b"}
+    assert len(websocket.sent) < 52
+    assert mock_post.call_args[0][0] == "/session/sess-b/barge_in"
+    assert 0 < mock_post.call_args[1]["json"]["played_ms"] < 1000
+    assert session.playback_started is None
+    freeswitch_integration.call_queues["call-b"].close()
+    await freeswitch_integration.call_queues["call-b"].task
+
+@pytest.mark.asyncio
+async def test_call_queues_keep_order_and_run_calls_in_parallel(freeswitch_integration):
+    """Test a slow call doesn't hold up other calls and each call stays in order"""
+    handled = []
+    
+    async def fake_process(data, websocket):
+        await asyncio.sleep(0.2 if data["call_id"] == "slow" else 0)
+        handled.append((data["call_id"], data["audio_data"]))
+        
+    async def fake_start(data, websocket):
+        freeswitch_integration.active_calls[data["call_id"]] = CallSession(
+            call_id=data["call_id"], phone_number="+1", start_time=datetime.now()
+        )
+        
+    messages = [json.dumps({"type": "call_start", "call_id": call_id}) for call_id in ("slow", "fast")]
+    messages += [json.dumps({"type": "audio_chunk", "call_id": call_id, "audio_data": str(n)})
+                 for n in range(3) for call_id in ("slow", "fast")]
+    messages.append(json.dumps({"type": "call_end", "call_id": "fast"}))
+    websocket = FakeWebSocket(messages, hold_open=True)
+    
+    with patch.object(freeswitch_integration, 'handle_call_start', side_effect=fake_start), \
+         patch.object(freeswitch_integration, 'process_audio_chunk', side_effect=fake_process), \
+         patch.object(freeswitch_integration, 'notify_backend', Mock()):
+        reader = asyncio.create_task(freeswitch_integration.handle_audio_stream(websocket, "/"))
+        await asyncio.sleep(0.1)
+        # The fast call has finished, including call_end, while the slow one is on its first chunk
+        assert handled == [("fast", "0"), ("fast", "1"), ("fast", "2")]
+        assert "fast" not in freeswitch_integration.active_calls
+        websocket.close()
+        await reader
+        
+    # Closing the connection drops the slow call's queued chunks
+    assert [item for item in handled if item[0] == "slow"] == [("slow", "0")]
+    assert freeswitch_integration.call_queues == {}
+
+@pytest.mark.asyncio
+async def test_call_queue_overflow_policies():
+    """Test drop_oldest, coalesce and reject when a call's queue is full"""
+    def chunk(payload, codec="pcmu"):
+        return {"type": "audio_chunk", "call_id": "c", "codec": codec, "audio_data": base64.b64encode(payload).decode()}
+        
+    queue = CallQueue("c", None, max_chunks=2, policy="drop_oldest")
+    queue.put({"type": "call_start", "call_id": "c"}, None)
+    outcomes = [queue.put(chunk(bytes([n])), None) for n in range(3)]
+    assert outcomes == ["queued", "queued", "dropped"]
+    assert [item[0].get("audio_data") for item in queue.items] == [None, "AQ==", "Ag=="]
+    
+    queue = CallQueue("c", None, max_chunks=1, policy="coalesce")
+    assert [queue.put(chunk(b"\x01"), None), queue.put(chunk(b"\x02"), None)] == ["queued", "coalesced"]
+    assert base64.b64decode(queue.items[0][0]["audio_data"]) == b"\x01\x02"
+    # Chunks of different formats can't be merged, so the oldest is dropped
+    assert queue.put(chunk(b"\x03", codec="pcma"), None) == "dropped"
+    
+    queue = CallQueue("c", None, max_chunks=1, policy="reject")
+    assert [queue.put(chunk(b"\x01"), None), queue.put(chunk(b"\x02"), None)] == ["queued", "rejected"]
+    # Control messages are never refused
+    assert queue.put({"type": "call_end", "call_id": "c"}, None) == "queued"
+    queue.close(discard_audio=True)
+    assert (await queue.get())[0]["type"] == "call_end"
+    assert await queue.get() is None
+
+def make_replica(server, replica_id, clock=None):
+    """FreeSwitchIntegration sharing a fake Redis call registry with other replicas"""
+    integration = FreeSwitchIntegration({"replica_id": replica_id, "ai_engine_transport": "http"})
+    integration.call_registry = RedisCallRegistry(
+        fakeredis.aioredis.FakeRedis(server=server), replica_id, f"ws://{replica_id}:8081"
+    )
+    return integration
+
+def test_hash_ring_moves_only_a_dead_nodes_keys():
+    """Test consistent hashing keeps call affinity when a replica leaves"""
+    calls = [f"call-{n}" for n in range(300)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b"])
+    
+    owners = {call: before.node_for(call) for call in calls}
+    assert set(owners.values()) == {"a", "b", "c"}
+    assert owners == {call: HashRing(["c", "b", "a"]).node_for(call) for call in calls}
+    assert all(after.node_for(call) == owner for call, owner in owners.items() if owner != "c")
+    assert HashRing([]).node_for("call-1") is None
+
+@pytest.mark.asyncio
+async def test_redis_call_registry_takeover():
+    """Test surviving replicas split a dead replica's calls, each claimed once"""
+    server = fakeredis.FakeServer()
+    replicas = {name: make_replica(server, name) for name in ("a", "b", "c")}
+    for replica in replicas.values():
+        await replica.call_registry.heartbeat()
+        
+    calls = [f"call-{n}" for n in range(40)]
+    for call_id in calls:
+        await replicas["c"].call_registry.register(CallSession(
+            call_id=call_id, phone_number="+1", start_time=datetime.now(), ai_engine_session=f"ai-{call_id}"
+        ))
+    await replicas["c"].call_registry.close()
+    
+    adopted = {name: await replicas[name].take_over_orphaned_calls() for name in ("a", "b")}
+    ring = HashRing(["a", "b"])
+    assert sorted(adopted["a"] + adopted["b"]) == sorted(calls)
+    assert all(ring.node_for(call_id) == name for name, call_ids in adopted.items() for call_id in call_ids)
+    session = replicas["a"].active_calls[adopted["a"][0]]
+    assert session.ai_engine_session == f"ai-{session.call_id}"
+    assert (await replicas["b"].call_registry.load(adopted["a"][0]))[1] == "a"
+    
+    # A claim against a stale owner fails, and the dead replica is forgotten
+    assert await replicas["b"].call_registry.claim(adopted["a"][0], expected_owner="c") is None
+    assert await replicas["a"].call_registry.orphaned_calls() == {}
+    assert set(await replicas["a"].call_registry.live_replicas()) == {"a", "b"}
+
+@pytest.mark.asyncio
+async def test_call_restored_from_registry_on_another_replica():
+    """Test audio for a call started on another replica resumes its AI session"""
+    server = fakeredis.FakeServer()
+    first, second = make_replica(server, "a"), make_replica(server, "b")
+    await first.call_registry.heartbeat()
+    await second.call_registry.heartbeat()
+    
+    with patch.object(first, 'notify_backend', Mock()), \
+         patch.object(first, 'initialize_ai_session', AsyncMock(return_value="ai-1")), \
+         patch.object(first, 'send_audio_response', AsyncMock()):
+        await first.handle_call_start({"call_id": "call-1", "phone_number": "+1", "codec": "pcma"}, FakeWebSocket([]))
+        await first.setup_tasks["call-1"]
+        
+    request = Mock(match_info={"call_id": "call-1"})
+    route = json.loads((await second.route_handler(request)).text)
+    assert (route["replica"], route["url"], route["registered"]) == ("a", "ws://a:8081", True)
+    
+    websocket = FakeWebSocket([json.dumps({"type": "audio_chunk", "call_id": "call-1", "audio_data": "AAAA"})], hold_open=True)
+    with patch.object(second, 'send_to_ai_engine', AsyncMock(return_value=None)) as mock_send:
+        reader = asyncio.create_task(second.handle_audio_stream(websocket, "/"))
+        await asyncio.sleep(0.05)
+        websocket.close()
+        await reader
+        
+    assert mock_send.call_args[0][:2] == ("ai-1", "AAAA")
+    assert second.active_calls["call-1"].codec == "pcma"
+    assert (await second.call_registry.load("call-1"))[1] == "b"
+    
+    with patch.object(second, 'notify_backend', Mock()), patch.object(second, 'cleanup_ai_session', AsyncMock()):
+        await second.handle_call_end({"call_id": "call-1"})
+    assert await first.call_registry.load("call-1") is None
+
+@pytest.mark.asyncio
+async def test_greeting_plays_while_ai_session_is_created(freeswitch_integration):
+    """Test the pre-rendered greeting plays at once and early audio waits for the AI session"""
+    tone = (np.sin(np.arange(8000) / 8) * 3000).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(tone.tobytes())
+        
+    with patch.object(freeswitch_integration, 'synthesize_speech', AsyncMock(return_value=buffer.getvalue())):
+        assert await freeswitch_integration.render_greeting()
+    assert len(freeswitch_integration.greeting_frames["pcmu"]) == 25
+    
+    session_ready = asyncio.Event()
+    
+    async def slow_session(call_id, phone_number):
+        await session_ready.wait()
+        return "ai-1"
+        
+    messages = [
+        json.dumps({"type": "call_start", "call_id": "call-1", "phone_number": "+1"}),
+        json.dumps({"type": "audio_chunk", "call_id": "call-1", "audio_data": "AAAA"})
+    ]
+    websocket = FakeWebSocket(messages, hold_open=True)
+    with patch.object(freeswitch_integration, 'notify_backend', Mock()), \
+         patch.object(freeswitch_integration, 'initialize_ai_session', side_effect=slow_session), \
+         patch.object(freeswitch_integration, 'send_to_ai_engine', AsyncMock(return_value=None)) as mock_send:
+        reader = asyncio.create_task(freeswitch_integration.handle_audio_stream(websocket, "/"))
+        await asyncio.sleep(0.05)
+        
+        # The greeting is playing before the AI session exists, and the chunk is held, not dropped
+        assert json.loads(websocket.sent[0])["text"] == "Hello! How can I help you today?"
+        assert len(websocket.sent) > 1
+        assert freeswitch_integration.active_calls["call-1"].setup_started is None
+        mock_send.assert_not_called()
+        
+        session_ready.set()
+        await asyncio.sleep(0.05)
+        assert mock_send.call_args[0][:2] == ("ai-1", "AAAA")
+        websocket.close()
+        await reader
+        
+    freeswitch_integration.playback_tasks["call-1"].cancel()
+
+@pytest.mark.asyncio
+async def test_backend_events_batched_with_single_fallback(freeswitch_integration):
+    """Test events are posted in batches, one by one when there is no bulk endpoint"""
+    queue = BackendEventQueue(freeswitch_integration.backend_client, batch_size=2)
+    statuses = iter([200, 404, 200])
+    
+    with patch.object(freeswitch_integration.backend_client, 'post') as mock_post:
+        mock_post.side_effect = lambda path, json: mock_http_response(next(statuses))
+        for index in range(3):
+            queue.publish("call_start", {"call_id": f"call-{index}"})
+        await queue.flush(1)
+        
+    paths = [call[0][0] for call in mock_post.call_args_list]
+    assert paths == ["/api/calls/events/bulk", "/api/calls/events/bulk", "/api/calls/events"]
+    assert [event["data"]["call_id"] for event in mock_post.call_args_list[0][1]["json"]["events"]] == ["call-0", "call-1"]
+    assert mock_post.call_args_list[2][1]["json"]["event_type"] == "call_start"
+    assert queue.stats()["delivered"] == 3
+    assert queue.bulk_supported is False
+
+@pytest.mark.asyncio
+async def test_backend_events_rejected_in_bulk_reply_are_retried(freeswitch_integration):
+    """Test events a 200 bulk reply lists as rejected are sent again, and only applied ones count"""
+    queue = BackendEventQueue(freeswitch_integration.backend_client, batch_size=3, retry_base=0.001)
+    for index in range(3):
+        queue.publish("call_start", {"call_id": f"call-{index}"})
+    rejected_id = queue.events[1]["event_id"]
+    replies = iter([
+        mock_http_response(200, {"status": "events_processed", "processed": 2, "rejected": [rejected_id]}),
+        mock_http_response(200, {"status": "events_processed", "processed": 1, "rejected": []})
+    ])
+    
+    with patch.object(freeswitch_integration.backend_client, 'post') as mock_post:
+        mock_post.side_effect = lambda path, json: next(replies)
+        await queue.flush(2)
+        
+    retried = mock_post.call_args_list[1][1]["json"]["events"]
+    assert [event["event_id"] for event in retried] == [rejected_id]
+    stats = queue.stats()
+    assert (stats["delivered"], stats["retries"], stats["failed"]) == (3, 1, 0)
+
+@pytest.mark.asyncio
+async def test_backend_events_spooled_during_outage(freeswitch_integration, tmp_path):
+    """Test undeliverable events survive a restart through the spool"""
+    client = freeswitch_integration.backend_client
+    queue = BackendEventQueue(client, max_attempts=2, retry_base=0.001, spool_dir=str(tmp_path))
+    
+    with patch.object(client, 'post', return_value=mock_http_response(503)) as mock_post:
+        await queue.start()
+        queue.publish("call_start", {"call_id": "call-1"})
+        await queue.flush(2)
+        queue.publish("call_end", {"call_id": "call-1"})
+        await queue.close()
+    assert mock_post.call_count == 2
+    assert queue.stats()["spooled"] == 2
+    assert len(list(tmp_path.iterdir())) == 2
+    
+    restarted = BackendEventQueue(client, spool_dir=str(tmp_path))
+    with patch.object(client, 'post', return_value=mock_http_response(200)) as mock_post:
+        await restarted.start()
+        await restarted.flush(1)
+        await restarted.close()
+    events = [event for call in mock_post.call_args_list for event in call[1]["json"]["events"]]
+    assert [event["event_type"] for event in events] == ["call_start", "call_end"]
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_engine_stream_resumes_after_reconnect():
+    """Test unacknowledged chunks are resent once, from the engine's last accepted sequence"""
+    import websockets
+    
+    received, accepted, replies = [], {}, []
+    
+    async def engine(websocket, path=None):
+        connection = len({number for number, _ in received}) + 1
+        hello = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({
+            "type": "hello", "sessions": {session_id: accepted.get(session_id, -1) for session_id in hello["sessions"]}
+        }))
+        async for message in websocket:
+            frame = decode_audio_frame(message)
+            received.append((connection, frame.sequence))
+            accepted[frame.call_id] = frame.sequence
+            if connection == 1 and frame.sequence == 1:
+                # Drop the connection before acknowledging chunk 1
+                await websocket.close()
+                return
+            await websocket.send(json.dumps({"type": "ack", "sessions": {frame.call_id: frame.sequence}}))
+            await websocket.send(json.dumps({
+                "type": "ai_response", "session_id": frame.call_id, "sequence": frame.sequence, "audio": True
+            }))
+            await websocket.send(encode_audio_frame(frame.call_id, frame.sequence, "wav", 16000, b"RIFF"))
+            
+    async def on_message(message, frame):
+        replies.append((message["sequence"], bytes(frame.payload)))
+        
+    server = await websockets.serve(engine, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    stream = EngineStream(engine_stream_url(f"http://127.0.0.1:{port}"), on_message, window=2, retry_base=0.01)
+    try:
+        await stream.start()
+        chunk = AudioFrame("call-1", 0, "l16", 8000, memoryview(b"\x00\x00" * 80))
+        for _ in range(3):
+            # The third chunk waits for credit until the reconnect reports chunk 1 accepted
+            await asyncio.wait_for(stream.send("ai-session-1", chunk), 5)
+        while len(replies) < 2:
+            await asyncio.sleep(0.01)
+    finally:
+        await stream.close()
+        server.close()
+        await server.wait_closed()
+        
+    assert received == [(1, 0), (1, 1), (2, 2)]
+    assert replies == [(0, b"RIFF"), (2, b"RIFF")]
+    stats = stream.stats()
+    assert stats["in_flight"] == 0
+    assert stats["credit_waits"] >= 1
+    assert stats["reconnects"] >= 1
+
+@pytest.mark.asyncio
+async def test_engine_stream_pool_pins_sessions_and_carries_barge_in(freeswitch_integration):
+    """Test each AI session keeps to one stream connection, which also carries its barge-in"""
+    pool = EngineStreamPool(engine_stream_url("http://ai-engine:8081"), AsyncMock(), connections=3)
+    sessions = [f"ai-session-{index}" for index in range(12)]
+    for session_id in sessions * 2:
+        await pool.send(session_id, "AAAA")
+    assert len({pool.streams.index(pool.stream_for(session_id)) for session_id in sessions}) > 1
+    for stream in pool.streams:
+        assert all(pool.stream_for(session_id) is stream and sequence == 1 for session_id, sequence in stream.sequences.items())
+    assert (pool.stats()["connections"], pool.stats()["sent"]) == (3, 24)
+    
+    stream = pool.stream_for("sess-b")
+    stream.websocket = AsyncMock()
+    freeswitch_integration.engine_stream = pool
+    freeswitch_integration.active_calls["call-b"] = CallSession(
+        call_id="call-b", phone_number="+1", start_time=datetime.now(), ai_engine_session="sess-b"
+    )
+    websocket = FakeWebSocket([])
+    with patch.object(freeswitch_integration.ai_engine_client, 'post') as mock_post:
+        mock_post.return_value = mock_http_response(200, {"status": "interrupted"})
+        freeswitch_integration.playback_tasks["call-b"] = asyncio.create_task(asyncio.sleep(10))
+        await freeswitch_integration.handle_barge_in(websocket, "call-b")
+        mock_post.assert_not_called()
+        assert json.loads(stream.websocket.send.call_args[0][0]) == \
+            {"type": "barge_in", "session_id": "sess-b", "played_ms": None}
+        
+        # Without an open connection it falls back to HTTP
+        stream.websocket = None
+        freeswitch_integration.playback_tasks["call-b"] = asyncio.create_task(asyncio.sleep(10))
+        await freeswitch_integration.handle_barge_in(websocket, "call-b")
+        assert mock_post.call_args[0][0] == "/session/sess-b/barge_in"
+    assert pool.stats()["barge_ins"] == 1
+
+@pytest.mark.asyncio
+async def test_streamed_reply_played_per_segment(freeswitch_integration):
+    """Test engine stream replies are played to the call their session belongs to"""
+    mock_websocket = Mock()
+    freeswitch_integration.stream_calls["ai-session-1"] = ("call-1", mock_websocket, {4: time.perf_counter()})
+    segment = AudioFrame("ai-session-1", 4, "wav", 24000, memoryview(b"RIFF"))
+    
+    with patch.object(freeswitch_integration, 'send_audio_response') as mock_send_audio:
+        await freeswitch_integration.handle_engine_reply({
+            "type": "audio_segment", "session_id": "ai-session-1", "sequence": 4, "segment": 0, "text": "Hello."
+        }, segment)
+        await freeswitch_integration.handle_engine_reply({
+            "type": "ai_response_end", "session_id": "ai-session-1", "sequence": 4,
+            "data": {"text_response": "Hello.", "segments": 1}
+        }, None)
+        
+    mock_send_audio.assert_called_once_with(mock_websocket, "call-1", "Hello.", b"RIFF", "wav", "ai-session-1-4")
+    assert freeswitch_integration.stream_calls["ai-session-1"][2] == {}
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -42,17 +42,7 @@ class CallsController < ApplicationController
 
   # POST /api/calls/events
   def events
-    event_type = params[:event_type]
-    data = params[:data]
-    
-    case event_type
-    when 'call_start'
-      handle_call_start(data)
-    when 'call_end'
-      handle_call_end(data)
-    when 'transfer_request'
-      handle_transfer_request(data)
-    else
+    unless process_event(params[:event_type], params[:data], params[:event_id])
       render json: { error: 'Unknown event type' }, status: :bad_request
       return
     end
@@ -60,6 +50,24 @@ class CallsController < ApplicationController
     render json: { status: 'event_processed' }
   end
 
+  # POST /api/calls/events/bulk
+  def bulk_events
+    events = Array(params[:events])
+    # A bad event is reported back rather than failing (and re-sending) the whole batch
+    rejected = events.reject do |event|
+      process_event(event[:event_type], event[:data], event[:event_id])
+    rescue ActiveRecord::ActiveRecordError => e
+      Rails.logger.error("Call event #{event[:event_id]} failed: #{e.message}")
+      false
+    end
+    
+    render json: {
+      status: 'events_processed',
+      processed: events.size - rejected.size,
+      rejected: rejected.map { |event| event[:event_id] }
+    }
+  end
+
   # POST /api/calls/:id/transfer
   def transfer
     transfer_to = params[:transfer_to]
@@ -98,6 +106,32 @@ class CallsController < ApplicationController
     FreeswitchService.new.setup_call(call)
   end
 
+  # Events are delivered at least once, so one whose event_id was already
+  # processed is acknowledged without being applied again
+  def process_event(event_type, data, event_id = nil)
+    return false unless event_type.in?(%w[call_start call_end transfer_request])
+    return true if event_id.present? && ProcessedCallEvent.exists?(event_id: event_id)
+    
+    ProcessedCallEvent.transaction do
+      ProcessedCallEvent.create!(event_id: event_id, event_type: event_type) if event_id.present?
+      
+      case event_type
+      when 'call_start'
+        handle_call_start(data)
+      when 'call_end'
+        handle_call_end(data)
+      when 'transfer_request'
+        handle_transfer_request(data)
+      end
+    end
+    
+    true
+  rescue ActiveRecord::RecordNotUnique
+    # A concurrent delivery of the same event recorded it first
+    raise unless event_id.present? && ProcessedCallEvent.exists?(event_id: event_id)
+    true
+  end
+
   def handle_call_start(data)
     call = Call.find_or_create_by(
       external_call_id: data['call_id'],
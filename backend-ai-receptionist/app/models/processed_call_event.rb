@@ -0,0 +1,3 @@
+class ProcessedCallEvent < ApplicationRecord
+  validates :event_id, presence: true
+end
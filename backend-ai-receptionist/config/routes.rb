@@ -97,6 +97,7 @@ Rails.application.routes.draw do
 
     # Event handling for external services
     post 'calls/events', to: 'calls#events'
+    post 'calls/events/bulk', to: 'calls#bulk_events'
 
     # Health checks for services
     get 'health/ai_engine', to: 'health#ai_engine'
@@ -0,0 +1,13 @@
+class CreateProcessedCallEvents < ActiveRecord::Migration[8.0]
+  def change
+    # Call events are delivered at least once; the unique event_id lets
+    # redelivered events be recognised and skipped
+    create_table :processed_call_events do |t|
+      t.string :event_id, null: false
+      t.string :event_type
+
+      t.timestamps
+    end
+    add_index :processed_call_events, :event_id, unique: true
+  end
+end
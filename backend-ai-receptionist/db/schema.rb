@@ -10,7 +10,7 @@
 #
 # It's strongly recommended that you check this file into your version control system.
 
-ActiveRecord::Schema[8.0].define(version: 2025_10_06_150605) do
+ActiveRecord::Schema[8.0].define(version: 2025_10_18_000001) do
   create_table "call_transcripts", charset: "utf8mb4", collation: "utf8mb4_0900_ai_ci", force: :cascade do |t|
     t.bigint "phone_number_id", null: false
     t.string "caller_id"
@@ -75,6 +75,14 @@ ActiveRecord::Schema[8.0].define(version: 2025_10_06_150605) do
     t.index ["sip_trunk_username", "sip_trunk_domain"], name: "index_phone_numbers_on_sip_trunk_username_and_domain"
   end
 
+  create_table "processed_call_events", charset: "utf8mb4", collation: "utf8mb4_0900_ai_ci", force: :cascade do |t|
+    t.string "event_id", null: false
+    t.string "event_type"
+    t.datetime "created_at", null: false
+    t.datetime "updated_at", null: false
+    t.index ["event_id"], name: "index_processed_call_events_on_event_id", unique: true
+  end
+
   add_foreign_key "call_transcripts", "phone_numbers"
   add_foreign_key "faqs", "phone_numbers"
   add_foreign_key "phone_numbers", "customers"
@@ -0,0 +1,40 @@
+require "test_helper"
+require "minitest/mock"
+
+class CallsControllerTest < ActionDispatch::IntegrationTest
+  setup do
+    @previous_api_key = ENV["API_KEY"]
+    ENV["API_KEY"] = "test-api-key"
+    @headers = { "X-API-Key" => "test-api-key" }
+  end
+
+  teardown do
+    ENV["API_KEY"] = @previous_api_key
+  end
+
+  test "bulk events posted twice are only applied once" do
+    events = [
+      { event_id: "a1", event_type: "call_end", data: { call_id: "call-1", duration: 30 } },
+      { event_id: "b2", event_type: "transfer_request", data: { call_id: "call-1", transfer_to: "1000" } }
+    ]
+    lookups = 0
+    find_call = ->(*) { lookups += 1; nil }
+
+    Call.stub(:find_by, find_call) do
+      assert_difference("ProcessedCallEvent.count", 2) do
+        post "/api/calls/events/bulk", params: { events: events }, headers: @headers, as: :json
+      end
+      assert_response :success
+      assert_equal 2, response.parsed_body["processed"]
+
+      assert_no_difference("ProcessedCallEvent.count") do
+        post "/api/calls/events/bulk", params: { events: events }, headers: @headers, as: :json
+      end
+      assert_response :success
+      assert_equal 2, response.parsed_body["processed"]
+      assert_empty response.parsed_body["rejected"]
+    end
+
+    assert_equal 2, lookups
+  end
+end